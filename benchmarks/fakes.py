@@ -0,0 +1,185 @@
+"""In-memory stand-ins for the Centaur and Abacus data access classes.
+
+They are the real CCCentaurDA and CC_AbacusDA with only the database cut
+off: rows come from generated frames, and COPY streams are read to the end
+and thrown away, so conforming, transforming and encoding all run the
+production code.
+"""
+
+import pandas as pd
+
+from src.cc_abacus_da import CC_AbacusDA
+from src.cc_centaur_da import CCCentaurDA
+from src.connection_pool import ConnectionPool
+
+
+# udt_name of every column of the ATMP tables as production defines them:
+# amounts and rates are numeric, so the binary COPY runs the same encoders
+ATMP_T17_COLUMN_TYPES = {
+    "working_day": "date",
+    "id_product": "varchar",
+    "amount_past_due": "numeric",
+    "date_since_pd_ol": "date",
+    "days_past_due": "int4",
+    "delinquency_amount_mp": "numeric",
+    "last_unpaid_due_date_mp": "date",
+    "minimum_payment": "numeric",
+    "ol_da": "numeric",
+    "ol_dpd": "int4",
+    "account_number": "varchar",
+    "branch_code": "varchar",
+    "card_number": "varchar",
+    "customer_number": "varchar",
+    "sum_of_payments": "numeric",
+    "last_statement_balance": "numeric",
+    "card_limit": "numeric",
+    "account_code": "varchar",
+    "account_currency": "varchar",
+    "account_sequence": "varchar",
+    "id_product_type": "varchar",
+    "card_expire_date": "date",
+    "card_ccy": "varchar",
+    "next_payment_date": "date",
+    "standart_interest_rate": "numeric",
+    "penalty_interest_rate": "numeric",
+    "cashwithdrawal_interest_rate": "numeric",
+    "number_of_payments_past_due": "int4",
+    "date_since_past_due": "date",
+    "card_balance": "numeric",
+    "dpd_ho": "int4",
+    "is_joint": "int4",
+}
+
+ATMP_T18_COLUMN_TYPES = {
+    "working_day": "date",
+    "id_product": "varchar",
+    "principal_payment_amount": "numeric",
+    "principal_payment_date": "date",
+    "interest_payment_date": "date",
+    "interest_payment_amount": "numeric",
+    "customer_number": "varchar",
+    "minimum_payment": "numeric",
+    "penalty_interest_rate": "numeric",
+    "penalty_interest_amount": "numeric",
+    "period": "int4",
+    "due_date_dlq": "date",
+    "last_sum_of_payment": "numeric",
+    "is_pastdue": "varchar",
+}
+
+
+def pg_types(frame, table_types):
+    """udt_name of the Postgres column each column of frame goes to, from
+    table_types; a column the table doesn't have is an error, as in COPY."""
+    return {column.lower(): table_types[column.lower()] for column in frame.columns}
+
+
+class DiscardingCursor:
+    def __init__(self, connection):
+        self.connection = connection
+        self.rowcount = 0
+        self._rows = []
+
+    def execute(self, query, params=None):
+        # Only the column types lookup of the binary COPY needs an answer
+        self._rows = []
+        if "information_schema.columns" in str(query):
+            self._rows = list(self.connection.column_types[params[1]].items())
+
+    def fetchone(self):
+        return self._rows[0] if self._rows else None
+
+    def fetchall(self):
+        return self._rows
+
+    def copy_expert(self, sql, file, size=8192):
+        # Drained the way psycopg2 sends it, in size pieces
+        while True:
+            data = file.read(size)
+            if not data:
+                break
+            self.connection.bytes_copied += len(data)
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class DiscardingConnection:
+    closed = 0
+
+    def __init__(self, column_types):
+        self.column_types = column_types
+        self.bytes_copied = 0
+
+    def cursor(self):
+        return DiscardingCursor(self)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class FakeCentaurDA(CCCentaurDA):
+    """Serves cc_data (raw vw_CC_AbacusData rows) instead of SQL Server."""
+
+    def __init__(self, cc_data, working_day, chunk_size=0):
+        self.cc_data = cc_data
+        self.working_day = pd.Timestamp(working_day)
+        self.chunk_size = chunk_size
+        self.schema_violations = []
+
+    @property
+    def centaur_working_day(self):
+        return self.working_day
+
+    def get_cc_data(self):
+        return self.apply_cc_data_dtypes(self.cc_data.copy())
+
+    def iter_cc_data(self, chunk_size=None):
+        chunk_size = chunk_size or self.chunk_size
+        rows = self.cc_data.sort_values("ID_PRODUCT", kind="stable")
+        for start in range(0, len(rows), chunk_size):
+            chunk = rows.iloc[start : start + chunk_size].reset_index(drop=True)
+            yield self.apply_cc_data_dtypes(chunk)
+
+
+class FakeAbacusDA(CC_AbacusDA):
+    """CC_AbacusDA on connections that accept every statement and discard
+    what is COPYed to them, with t18_previous as the previous snapshot."""
+
+    def __init__(self, t18_previous, working_day, pool_size=4):
+        self.column_types = {}
+        self.connections = []
+        super().__init__()
+        self.schema_used = "bench"
+        self.WorkingDay = pd.Timestamp(working_day)
+        self.t18_previous = t18_previous
+        self.t18_cache = None
+        self.pool = ConnectionPool(self._connect, max_size=pool_size)
+
+    def _connect(self):
+        conn = DiscardingConnection(self.column_types)
+        self.connections.append(conn)
+        return conn
+
+    @property
+    def bytes_copied(self):
+        return sum(conn.bytes_copied for conn in self.connections)
+
+    def set_not_cc_working_day(self):
+        self.NotCCWorkingDay = None
+        self.NotCCNextWorkingDay = None
+
+    def get_t18_previous_values(self):
+        return self.t18_previous.copy()
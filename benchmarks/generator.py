@@ -0,0 +1,141 @@
+"""Seeded synthetic vw_CC_AbacusData rows and previous-day T18 histories.
+
+The same (cards, seed) always gives the same frames, so timings of
+different commits are measured on identical data.
+"""
+
+import numpy as np
+import pandas as pd
+
+from src.cc_abacus_transform import ATMP_T18_COLUMNS
+from src.cc_centaur_da import CC_DATA_COLUMNS
+
+BRANCHES = [f"{code:03d}" for code in range(1, 41)]
+CURRENCIES = ["ALL", "EUR", "USD"]
+PRODUCT_TYPES = ["CLASSIC", "GOLD", "PLATINUM", "BUSINESS"]
+# Share of cards past due, and how far past due they are
+DELINQUENT_SHARE = 0.3
+DAYS_PAST_DUE = [5, 12, 30, 45, 60, 90, 120, 180]
+# Share of the rows that repeat another card's ID_PRODUCT
+DUPLICATE_SHARE = 0.001
+
+
+def _ids(prefix, numbers, width):
+    return (
+        pd.Series(numbers)
+        .map(lambda n: f"{prefix}{n:0{width}d}")
+        .to_numpy(dtype=object)
+    )
+
+
+def generate_cc_data(cards, working_day, seed=0):
+    """cards rows of vw_CC_AbacusData as the Centaur driver returns them,
+    before CCCentaurDA conforms them to CC_DATA_SCHEMA."""
+    rng = np.random.default_rng(seed)
+    working_day = pd.Timestamp(working_day)
+    numbers = rng.permutation(cards) + 1
+    duplicates = int(cards * DUPLICATE_SHARE)
+    if duplicates:
+        numbers[rng.choice(cards, duplicates, replace=False)] = rng.choice(
+            numbers, duplicates
+        )
+
+    delinquent = rng.random(cards) < DELINQUENT_SHARE
+    days_past_due = np.where(delinquent, rng.choice(DAYS_PAST_DUE, cards), 0)
+    balance = rng.gamma(2.0, 400.0, cards).round(2)
+    minimum = (balance * 0.05).round(2)
+    limit = rng.choice([500.0, 1000.0, 2000.0, 5000.0], cards)
+    currency = rng.choice(CURRENCIES, cards, p=[0.7, 0.25, 0.05])
+    customers = rng.integers(1, max(cards // 2, 2), cards)
+
+    df = pd.DataFrame(
+        {
+            "WORKING_DAY": working_day,
+            "ID_PRODUCT": _ids("CC", numbers, 9),
+            "AMOUNT_PAST_DUE": np.where(delinquent, minimum, 0.0),
+            "DATE_SINCE_PD_OL": np.where(
+                delinquent,
+                working_day - pd.to_timedelta(days_past_due, unit="d"),
+                pd.NaT,
+            ),
+            "DAYS_PAST_DUE": days_past_due,
+            "DELINQUENCY_AMOUNT_MP": np.where(delinquent, minimum, 0.0),
+            "LAST_UNPAID_DUE_DATE_MP": np.where(
+                delinquent,
+                working_day - pd.to_timedelta(days_past_due, unit="d"),
+                pd.NaT,
+            ),
+            "MINIMUM_PAYMENT": minimum,
+            "OL_DA": np.where(delinquent, (balance - limit).clip(0), 0.0),
+            "OL_DPD": np.where(delinquent, days_past_due // 2, 0),
+            "ACCOUNT_NUMBER": _ids("A", customers * 10 + 1, 11),
+            "BRANCH_CODE": rng.choice(BRANCHES, cards),
+            "CARD_NUMBER": _ids("4", numbers, 15),
+            "CUSTOMER_NUMBER": _ids("C", customers, 9),
+            "SUM_OF_PAYMENTS": (balance * rng.uniform(0, 0.2, cards)).round(2),
+            "LAST_STATEMENT_BALANCE": balance,
+            "CARD_LIMIT": limit,
+            "ACCOUNT_CODE": rng.choice(["2101", "2102", "2103"], cards),
+            "ACCOUNT_CURRENCY": currency,
+            "ACCOUNT_SEQUENCE": _ids("", rng.integers(1, 9, cards), 2),
+            "ID_PRODUCT_TYPE": rng.choice(PRODUCT_TYPES, cards),
+            "CARD_EXPIRE_DATE": working_day
+            + pd.to_timedelta(rng.integers(30, 1500, cards), unit="d"),
+            "CARD_CCY": currency,
+            "NEXT_PAYMENT_DATE": working_day
+            + pd.to_timedelta(rng.integers(1, 30, cards), unit="d"),
+            "STANDART_INTEREST_RATE": 0.18,
+            "PENALTY_INTEREST_RATE": 0.02,
+            "CASHWITHDRAWAL_INTEREST_RATE": 0.24,
+            "LAST_BALANCE_SIGN": rng.choice(["0", "1"], cards, p=[0.95, 0.05]),
+            "PERIOD": int(working_day.strftime("%Y%m01")),
+        }
+    )
+    return df[CC_DATA_COLUMNS]
+
+
+def generate_t18_history(cc_data, working_day, seed=0, months=6):
+    """Previous-day t18_cc_payment_schedule rows for the cards of cc_data:
+    most cards have up to months instalments, in period order."""
+    rng = np.random.default_rng(seed + 1)
+    working_day = pd.Timestamp(working_day)
+    products = pd.unique(cc_data["ID_PRODUCT"])
+    counts = rng.integers(0, months + 1, len(products))
+
+    owner = np.repeat(np.arange(len(products)), counts)
+    # Months back from the current period: counts-1, ..., 0 for every card
+    back = (
+        np.repeat(counts, counts)
+        - 1
+        - (np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts))
+    )
+    period_start = working_day.to_period("M").start_time
+    periods = pd.DatetimeIndex(
+        [period_start - pd.DateOffset(months=int(b)) for b in range(months)]
+    )[back]
+    due = periods + pd.Timedelta(days=24)
+    amount = rng.gamma(2.0, 40.0, len(owner)).round(2)
+
+    history = pd.DataFrame(
+        {
+            "WORKING_DAY": working_day - pd.Timedelta(days=1),
+            "ID_PRODUCT": products[owner],
+            "PRINCIPAL_PAYMENT_AMOUNT": amount,
+            "PRINCIPAL_PAYMENT_DATE": due,
+            "INTEREST_PAYMENT_DATE": due,
+            "INTEREST_PAYMENT_AMOUNT": (amount * 0.015).round(2),
+            "CUSTOMER_NUMBER": cc_data.drop_duplicates("ID_PRODUCT")[
+                "CUSTOMER_NUMBER"
+            ].to_numpy()[owner],
+            "MINIMUM_PAYMENT": (amount * 1.05).round(2),
+            "PENALTY_INTEREST_RATE": 0.02,
+            "PENALTY_INTEREST_AMOUNT": 0.0,
+            "PERIOD": periods.strftime("%Y%m01").astype("int64"),
+            "DUE_DATE_DLQ": due,
+            "LAST_SUM_OF_PAYMENT": (amount * rng.uniform(0, 1, len(owner))).round(2),
+            "IS_PASTDUE": rng.choice(["0", "1"], len(owner)),
+        }
+    )
+    # get_t18_previous_values reads the snapshot ordered by period
+    history = history.sort_values("PERIOD", kind="stable").reset_index(drop=True)
+    return history[ATMP_T18_COLUMNS]
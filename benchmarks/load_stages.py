@@ -0,0 +1,264 @@
+"""Stage timings of a CC load on synthetic data, without any database.
+
+Generates vw_CC_AbacusData rows and T18 histories for each size (see
+benchmarks/generator.py) and times every stage of the load on them through
+the real DA code with the database cut off (benchmarks/fakes.py): extract
+(conforming the rows), clean, building the T18 index, transform per engine
+and the ATMP_T17/T18 COPY per format. Each stage runs once to warm up, then
+--repeat times; its peak traced memory is taken from one more run under
+tracemalloc.
+
+    python -m benchmarks.load_stages --cards 10000 100000 1000000
+    python -m benchmarks.load_stages --json before.json
+    python -m benchmarks.load_stages --json after.json --compare before.json
+
+--compare prints the change of every stage's median against an earlier
+--json file and exits with 1 if any stage got slower than --threshold.
+"""
+
+import argparse
+import json
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.fakes import (
+    ATMP_T17_COLUMN_TYPES,
+    ATMP_T18_COLUMN_TYPES,
+    FakeAbacusDA,
+    FakeCentaurDA,
+    pg_types,
+)
+from benchmarks.generator import generate_cc_data, generate_t18_history
+from src.abacus_cc_loader_from_centaur import AbacusCCLoaderFromCentaur
+from src.cc_abacus_da import ATMP_T17_TABLE, ATMP_T18_TABLE
+from src.metrics import peak_rss_bytes
+from src.sharded_transform import shutdown_transform_executors
+
+WORKING_DAY = pd.Timestamp("2024-10-15")
+
+
+class Stage:
+    """prepare() returns fresh arguments for one run(*args), outside the
+    timing; rows is what one run handles."""
+
+    def __init__(self, name, prepare, run, rows):
+        self.name = name
+        self.prepare = prepare
+        self.run = run
+        self.rows = rows
+
+
+def load_stages(cc_data, t18_history, engines, copy_formats, workers):
+    centaur = FakeCentaurDA(cc_data, WORKING_DAY)
+    abacus = FakeAbacusDA(t18_history, WORKING_DAY, pool_size=max(workers, 1))
+    abacus.transform_workers = workers
+
+    conformed = centaur.get_cc_data()
+    clean, _ = AbacusCCLoaderFromCentaur.clean_centaur_cc_data(
+        AbacusCCLoaderFromCentaur.add_required_columns(conformed.copy())
+    )
+    t17 = clean.copy()
+    t18 = abacus.build_atmp_t18_data_table(t17)
+    abacus.drop_atmp_t17_work_columns(t17)
+    abacus.column_types.update({ATMP_T17_TABLE: pg_types(t17, ATMP_T17_COLUMN_TYPES)})
+    abacus.column_types.update({ATMP_T18_TABLE: pg_types(t18, ATMP_T18_COLUMN_TYPES)})
+
+    def clean_cc_data(df):
+        AbacusCCLoaderFromCentaur.add_required_columns(df)
+        return AbacusCCLoaderFromCentaur.clean_centaur_cc_data(df)
+
+    def build_t18_index():
+        abacus._t18_previous_index = None
+        return abacus.get_t18_previous_index()
+
+    stages = [
+        Stage("extract", tuple, centaur.get_cc_data, len(cc_data)),
+        Stage("clean", lambda: (conformed.copy(),), clean_cc_data, len(conformed)),
+        Stage("t18_index", tuple, build_t18_index, len(t18_history)),
+    ]
+
+    for engine in engines:
+
+        def transform(df, engine=engine):
+            abacus.transform_engine = engine
+            return abacus.build_atmp_t18_data_table(df)
+
+        stages.append(
+            Stage(
+                f"transform[{engine}]", lambda: (clean.copy(),), transform, len(clean)
+            )
+        )
+
+    for copy_format in copy_formats:
+        for name, frame, insert in (
+            ("copy_t17", t17, abacus.bulk_insert_atmp_t17),
+            ("copy_t18", t18, abacus.bulk_insert_atmp_t18),
+        ):
+
+            def copy(df, copy_format=copy_format, insert=insert):
+                abacus.copy_format = copy_format
+                return insert(df)
+
+            stages.append(
+                Stage(
+                    f"{name}[{copy_format}]",
+                    lambda frame=frame: (frame.copy(),),
+                    copy,
+                    len(frame),
+                )
+            )
+    return abacus, stages
+
+
+def time_stage(stage, repeat, abacus):
+    stage.run(*stage.prepare())
+
+    timings = []
+    copied = abacus.bytes_copied
+    for _ in range(repeat):
+        args = stage.prepare()
+        started = time.perf_counter()
+        stage.run(*args)
+        timings.append(time.perf_counter() - started)
+    copied = (abacus.bytes_copied - copied) // repeat
+
+    args = stage.prepare()
+    tracemalloc.start()
+    try:
+        stage.run(*args)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    median = statistics.median(timings)
+    return {
+        "stage": stage.name,
+        "repeat": repeat,
+        "median_seconds": round(median, 6),
+        "min_seconds": round(min(timings), 6),
+        "rows": stage.rows,
+        "rows_per_second": round(stage.rows / median, 1) if median else None,
+        "bytes": copied,
+        "peak_traced_bytes": peak,
+    }
+
+
+def run_benchmark(
+    cards=(10_000, 100_000),
+    repeat=3,
+    engines=("vectorized",),
+    copy_formats=("csv", "binary"),
+    workers=1,
+    seed=0,
+    report=print,
+):
+    results = []
+    for size in cards:
+        started = time.perf_counter()
+        cc_data = generate_cc_data(size, WORKING_DAY, seed=seed)
+        t18_history = generate_t18_history(cc_data, WORKING_DAY, seed=seed)
+        report(
+            f"{size} cards, {len(t18_history)} T18 rows generated in "
+            f"{time.perf_counter() - started:.1f}s"
+        )
+
+        abacus, stages = load_stages(
+            cc_data, t18_history, engines, copy_formats, workers
+        )
+        for stage in stages:
+            result = {"cards": size, **time_stage(stage, repeat, abacus)}
+            results.append(result)
+            report(format_result(result))
+
+    if "sharded" in engines:
+        shutdown_transform_executors()
+    return {
+        "seed": seed,
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "peak_rss_bytes": peak_rss_bytes(),
+        "results": results,
+    }
+
+
+def format_result(result):
+    mb_per_second = (
+        f"{result['bytes'] / result['median_seconds'] / 2**20:9.1f}"
+        if result["bytes"] and result["median_seconds"]
+        else f"{'':9}"
+    )
+    return (
+        f"{result['cards']:>9} {result['stage']:22} "
+        f"median {result['median_seconds']:9.4f}s  min {result['min_seconds']:9.4f}s  "
+        f"{result['rows_per_second'] or 0:12.0f} rows/s {mb_per_second} MB/s  "
+        f"peak {result['peak_traced_bytes'] / 2**20:8.1f} MB"
+    )
+
+
+def compare(results, baseline, threshold):
+    """(lines, regressions): the change of every stage's median against
+    baseline, and the stages slower by more than threshold."""
+    before = {(r["cards"], r["stage"]): r for r in baseline["results"]}
+    lines = []
+    regressions = []
+    for result in results["results"]:
+        previous = before.get((result["cards"], result["stage"]))
+        if previous is None or not previous["median_seconds"]:
+            continue
+        change = result["median_seconds"] / previous["median_seconds"] - 1
+        slower = change > threshold
+        if slower:
+            regressions.append(result)
+        lines.append(
+            f"{result['cards']:>9} {result['stage']:22} "
+            f"{previous['median_seconds']:9.4f}s -> {result['median_seconds']:9.4f}s "
+            f"{change:+7.1%}{'  SLOWER' if slower else ''}"
+        )
+    return lines, regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--cards", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument(
+        "--engines",
+        nargs="+",
+        default=["vectorized"],
+        help="transform engines to time: vectorized, sharded, rows (slow)",
+    )
+    parser.add_argument("--formats", nargs="+", default=["csv", "binary"])
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="write the results to this file")
+    parser.add_argument("--compare", help="results of an earlier --json run")
+    parser.add_argument("--threshold", type=float, default=0.10)
+    args = parser.parse_args()
+
+    results = run_benchmark(
+        args.cards, args.repeat, args.engines, args.formats, args.workers, args.seed
+    )
+    if results["peak_rss_bytes"] is not None:
+        print(f"peak RSS {results['peak_rss_bytes'] / 2**20:.1f} MB")
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump(results, file, indent=2)
+
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)
+        lines, regressions = compare(results, baseline, args.threshold)
+        print("\n".join(lines))
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+"""Run-state probe on a synthetic l01_logabacus.
+
+Fills a scratch schema with a multi-million-row log and times the original
+f-string lookups (max(autoid) subquery plus a LOAD_DATE filter, once for
+FIN and once for CC) against the bound, prepared RunState.query every run
+makes, before and after applying
+migrations/0001_l01_logabacus_module_autoid_idx.sql. Then checks from the
+plan that the index serves both log lookups of RunState.query, and exits
+with 1 if it doesn't.
+
+    python -m benchmarks.log_status_lookup --rows 5000000
+
+Needs a Postgres it may create a schema in (AbacusConStr by default). The
+schema is dropped afterwards unless --keep is given.
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+
+import dotenv
+import psycopg2
+
+from src.prepared_statements import execute_prepared
+from src.run_state import RunState
+
+MODULES = ["FIN", "CC", "GL", "LOAN", "DEPOSIT", "COLLATERAL"]
+MIGRATION = (
+    Path(__file__).parent.parent
+    / "migrations"
+    / "0001_l01_logabacus_module_autoid_idx.sql"
+)
+INDEX = "l01_logabacus_module_autoid_idx"
+
+
+def legacy_query(schema, module, day):
+    return f"""
+        SELECT STATUS FROM {schema}.l01_logabacus
+        WHERE LOAD_DATE = '{day.strftime('%Y-%m-%d')}'
+        AND autoid = (SELECT max(autoid) FROM {schema}.l01_logabacus WHERE MODULE = '{module}')
+    """
+
+
+def create_log(cursor, schema, rows):
+    cursor.execute(f"DROP SCHEMA IF EXISTS {schema} CASCADE")
+    cursor.execute(f"CREATE SCHEMA {schema}")
+    cursor.execute(f"""
+        CREATE TABLE {schema}.l01_logabacus (
+            load_date date,
+            module varchar(20),
+            start_time timestamp,
+            end_time timestamp,
+            no_records integer,
+            status varchar(1),
+            error text,
+            autoid bigint
+        )
+    """)
+    # A few hundred log entries per day, spread over the modules
+    cursor.execute(
+        f"""
+        INSERT INTO {schema}.l01_logabacus
+        SELECT date '2015-01-01' + (i / 300)::int,
+            (%s::text[])[1 + i %% %s],
+            now(), now(), i %% 100000, (i %% 2)::text, NULL, i
+        FROM generate_series(1, %s) AS i
+        """,
+        (MODULES, len(MODULES), rows),
+    )
+    cursor.execute(f"VACUUM (ANALYZE) {schema}.l01_logabacus")
+    cursor.execute(f"SELECT max(load_date) FROM {schema}.l01_logabacus")
+    day = cursor.fetchone()[0]
+    # RunState also reads the working days, stored as Y-m-d text
+    cursor.execute(
+        f"""
+        CREATE TABLE {schema}.W01_WORKING_DAY AS
+        SELECT to_char(d, 'YYYY-MM-DD') AS working_day,
+            to_char(d + 1, 'YYYY-MM-DD') AS next_working_day
+        FROM generate_series(date '2015-01-01', %s::date, interval '1 day') AS d
+    """,
+        (day,),
+    )
+    cursor.execute(f"ANALYZE {schema}.W01_WORKING_DAY")
+    return day
+
+
+def migration_statements(schema):
+    """The statements of the index migration, with the schema psql would
+    have substituted for :"schema"."""
+    lines = [
+        line
+        for line in MIGRATION.read_text().splitlines()
+        if not line.lstrip().startswith("--")
+    ]
+    sql = "\n".join(lines).replace(':"schema"', f'"{schema}"')
+    return [statement.strip() for statement in sql.split(";") if statement.strip()]
+
+
+def index_lookups(plan):
+    """Index scans on INDEX in plan (EXPLAIN text lines)."""
+    return [line.strip() for line in plan if f"Index Only Scan using {INDEX}" in line]
+
+
+def time_lookup(lookup, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        lookup()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings), min(timings)
+
+
+def run(conn, schema, repeat, day):
+    cursor = conn.cursor()
+
+    def legacy():
+        for module in ("FIN", "CC"):
+            cursor.execute(legacy_query(schema, module, day))
+            cursor.fetchall()
+
+    def run_state():
+        execute_prepared(conn, cursor, RunState.query(schema), ("FIN", "CC"))
+        cursor.fetchall()
+
+    results = {"legacy": time_lookup(legacy, repeat)}
+    results["run_state"] = time_lookup(run_state, repeat)
+    cursor.close()
+    return results
+
+
+def main():
+    dotenv.load_dotenv()
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--dsn", default=os.getenv("AbacusConStr"))
+    parser.add_argument("--schema", default="bench_log_lookup")
+    parser.add_argument("--rows", type=int, default=5_000_000)
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--keep", action="store_true")
+    args = parser.parse_args()
+
+    conn = psycopg2.connect(args.dsn)
+    # CREATE INDEX CONCURRENTLY and VACUUM can't run in a transaction
+    conn.autocommit = True
+    cursor = conn.cursor()
+    try:
+        started = time.perf_counter()
+        day = create_log(cursor, args.schema, args.rows)
+        print(f"{args.rows} log rows in {time.perf_counter() - started:.1f}s")
+
+        for label in ("without index", "with index"):
+            if label == "with index":
+                for statement in migration_statements(args.schema):
+                    cursor.execute(statement)
+            for name, (median, best) in run(
+                conn, args.schema, args.repeat, day
+            ).items():
+                print(
+                    f"{label:14} {name:9} median {median:8.3f} ms  best {best:8.3f} ms"
+                )
+
+        cursor.execute(
+            "EXPLAIN (ANALYZE, BUFFERS) "
+            + RunState.query(args.schema)
+            .replace("%s", "'FIN'", 1)
+            .replace("%s", "'CC'", 1)
+        )
+        plan = [row[0] for row in cursor.fetchall()]
+        print("\n".join(plan))
+    finally:
+        if not args.keep:
+            cursor.execute(f"DROP SCHEMA IF EXISTS {args.schema} CASCADE")
+        conn.close()
+
+    # One index-only scan for the FIN and one for the CC lookup
+    if len(index_lookups(plan)) < 2:
+        print(f"RunState.query does not use {INDEX} for both log lookups")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
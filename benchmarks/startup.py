@@ -0,0 +1,68 @@
+"""Import time of main, the part of every tick spent before any work.
+
+Runs `python -X importtime -c "import main"` --repeat times in fresh
+processes and prints the median and best cumulative time of main and of
+its slowest imports. Exits with 1 if the median is over --budget seconds.
+
+    python -m benchmarks.startup --repeat 20 --budget 0.25
+
+Which modules an idle tick imports is checked by tests/test_startup.py;
+the time they take depends on the machine, so it is measured here.
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def import_times(module="main"):
+    """Cumulative import time in seconds of module and of everything it
+    imports, by module name, from one fresh process."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    # "import time: self [us] | cumulative | module"
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.split("|")
+        times[name.strip()] = int(cumulative) / 1e6
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("--budget", type=float, help="seconds allowed for main")
+    args = parser.parse_args()
+
+    runs = [import_times() for _ in range(args.repeat)]
+    names = sorted(
+        {name for run in runs for name in run},
+        key=lambda name: -statistics.median(run.get(name, 0) for run in runs),
+    )
+    for name in names[: args.top]:
+        timings = [run.get(name, 0) for run in runs]
+        print(
+            f"{name:40} median {statistics.median(timings) * 1000:8.1f} ms  "
+            f"best {min(timings) * 1000:8.1f} ms"
+        )
+
+    median = statistics.median(run["main"] for run in runs)
+    if args.budget is not None and median > args.budget:
+        print(f"main imports in {median:.3f}s, over the {args.budget}s budget")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,18 @@
+import os
+
 from src.credit_card_abacus_service import CreditCardAbacusService
+from src.daemon import Daemon
 
 if __name__ == "__main__":
     service = CreditCardAbacusService()
 
-    # Start the service, execute the tasks, and finish
-    print("Running CreditCardAbacusService...")
-    service.run()
-    print("CreditCardAbacusService completed.")
+    if os.getenv("RunMode", "once").lower() == "daemon":
+        # Stay resident and run on a schedule until SIGTERM
+        print("Running CreditCardAbacusService as a daemon...")
+        Daemon(service).run()
+        print("CreditCardAbacusService stopped.")
+    else:
+        # Start the service, execute the tasks, and finish
+        print("Running CreditCardAbacusService...")
+        service.run()
+        print("CreditCardAbacusService completed.")
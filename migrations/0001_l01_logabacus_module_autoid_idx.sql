@@ -0,0 +1,13 @@
+-- Latest log entry per module ("latest status for module X on day D") as an
+-- index-only lookup: one backward step on (module, autoid DESC), with
+-- load_date and status read from the index itself.
+--
+-- Run with psql against the Abacus database, outside a transaction because
+-- of CONCURRENTLY:
+--   psql "$AbacusConStr" -v schema="$SchemaUsed" -f migrations/0001_l01_logabacus_module_autoid_idx.sql
+CREATE INDEX CONCURRENTLY IF NOT EXISTS l01_logabacus_module_autoid_idx
+    ON :"schema".l01_logabacus (module, autoid DESC)
+    INCLUDE (load_date, status);
+
+-- Index-only scans need an up-to-date visibility map
+VACUUM (ANALYZE) :"schema".l01_logabacus;
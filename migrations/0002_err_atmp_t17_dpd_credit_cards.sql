@@ -0,0 +1,36 @@
+-- Quarantine for ATMP_T17 rows the load can't write, e.g. every row of a
+-- product Centaur returned more than once. Same columns as ATMP_T17 plus
+-- the AUTOID the rows are paged and corrected by, EDITED for the rows an
+-- operator saved a fix for, and the Centaur columns the T17/T18 transform
+-- still needs when the fixed rows are committed; no primary key, the rows
+-- are duplicates by definition.
+--
+-- Run with psql against the Abacus database:
+--   psql "$AbacusConStr" -v schema="$SchemaUsed" -f migrations/0002_err_atmp_t17_dpd_credit_cards.sql
+CREATE TABLE IF NOT EXISTS :"schema".err_atmp_t17_dpd_credit_cards
+    (LIKE :"schema".atmp_t17_dpd_credit_cards INCLUDING DEFAULTS);
+
+ALTER TABLE :"schema".err_atmp_t17_dpd_credit_cards
+    ADD COLUMN IF NOT EXISTS autoid bigint,
+    ADD COLUMN IF NOT EXISTS last_balance_sign varchar,
+    ADD COLUMN IF NOT EXISTS period integer,
+    ADD COLUMN IF NOT EXISTS edited boolean NOT NULL DEFAULT false;
+
+-- AUTOID comes from a sequence, so a row keeps it from one run to the next
+-- and a saved fix applies to the row it was made on. It starts after the
+-- rows quarantined before this migration.
+\set autoid_seq :schema '.err_atmp_t17_dpd_credit_cards_autoid_seq'
+CREATE SEQUENCE IF NOT EXISTS :"schema".err_atmp_t17_dpd_credit_cards_autoid_seq
+    OWNED BY :"schema".err_atmp_t17_dpd_credit_cards.autoid;
+SELECT setval(:'autoid_seq', max(autoid) + 1, false)
+FROM :"schema".err_atmp_t17_dpd_credit_cards
+HAVING max(autoid) >= (
+    SELECT last_value FROM :"schema".err_atmp_t17_dpd_credit_cards_autoid_seq
+);
+ALTER TABLE :"schema".err_atmp_t17_dpd_credit_cards
+    ALTER COLUMN autoid SET DEFAULT nextval(:'autoid_seq'::regclass);
+
+-- get_error_records_page reads the rows in keyset pages, autoid > last
+-- ORDER BY autoid LIMIT n: one range scan on this index per page
+CREATE INDEX IF NOT EXISTS err_atmp_t17_dpd_credit_cards_autoid_idx
+    ON :"schema".err_atmp_t17_dpd_credit_cards (autoid);
@@ -1,9 +1,14 @@
 import pandas as pd
 from .cc_centaur_da import CCCentaurDA
 from .cc_abacus_da import CC_AbacusDA
+from . import load_gate
+from .metrics import instrumented, metrics
+from .run_log import RunLog
+from .run_state import clear_run_state
 import logging
 
 
+@instrumented("loader")
 class AbacusCCLoaderFromCentaur:
     duplicate_df = None
     atmpT17 = None
@@ -15,17 +20,41 @@ class AbacusCCLoaderFromCentaur:
         FINISHED = "FINISHED"
 
     @staticmethod
-    def load(is_service):
-        start = pd.Timestamp.now()
-
+    def prepare_load():
+        """Opens both sides and warms up what load() needs: the Centaur
+        working day and the previous T18 snapshot for that day."""
         centaur = CCCentaurDA()
         abacus = CC_AbacusDA()
+        abacus.WorkingDay = centaur.centaur_working_day
+        abacus.get_t18_previous_index()
+        return centaur, abacus
+
+    @staticmethod
+    def load(is_service, prepared=None):
+        start = pd.Timestamp.now()
 
+        if prepared is not None:
+            centaur, abacus = prepared
+        else:
+            centaur = CCCentaurDA()
+            # A service run cleared the run state when it started and the
+            # gating checks probed it since; a load of its own probes again
+            abacus = (
+                CC_AbacusDA()
+                if is_service
+                else AbacusCCLoaderFromCentaur.new_run_abacus()
+            )
+
+        run_log = RunLog(abacus.schema_used)
+        abacus.run_log = run_log
         try:
             abacus.start = start
-            working_day = centaur.centaur_working_day()
+            # Read again, a prepared working day may be older than Delinquency;
+            # the T18 snapshot is only reused if the day did not change
+            working_day = centaur.centaur_working_day
 
-            abacus.working_day = working_day
+            abacus.WorkingDay = working_day
+            run_log.load_date = working_day
 
             if not is_service:
                 if abacus.is_load_fin():
@@ -42,29 +71,40 @@ class AbacusCCLoaderFromCentaur:
                 else:
                     return AbacusCCLoaderFromCentaur.LoadStatus.FINISHED
         except Exception:
-            # abacus.write_cc_log_file(start, pd.Timestamp.now(), "0", 0, str(ex))
             return AbacusCCLoaderFromCentaur.LoadStatus.ERROR
+        finally:
+            # Stage timings of the run, written once whatever the outcome
+            run_log.flush()
+
+    @staticmethod
+    def new_run_abacus():
+        """CC_AbacusDA for a call that is a run of its own rather than part
+        of a service run, so it probes the working days and load statuses
+        again instead of reusing those of an earlier call."""
+        clear_run_state()
+        return CC_AbacusDA()
 
     @staticmethod
     def clean_and_load_cc(centaur, abacus, is_service):
-        try:
-            df_atmp_t17 = centaur.get_cc_data()
+        if centaur.chunk_size > 0:
+            return AbacusCCLoaderFromCentaur.clean_and_load_cc_chunked(
+                centaur, abacus, is_service
+            )
 
-            # Add required columns
-            df_atmp_t17["NUMBER_OF_PAYMENTS_PAST_DUE"] = 0
-            df_atmp_t17["DATE_SINCE_PAST_DUE"] = pd.NaT
-            df_atmp_t17["CARD_BALANCE"] = 0.0
-            df_atmp_t17["DPD_HO"] = 0
-            df_atmp_t17["IS_JOINT"] = 0
+        try:
+            with abacus.run_log.stage("extract") as extract:
+                df_atmp_t17 = centaur.get_cc_data()
+                extract.rows = len(df_atmp_t17)
 
-            # # Clean duplicate data
-            # duplicate_df = AbacusCCLoaderFromCentaur.clean_centaur_cc_data(df_atmp_t17)
+            AbacusCCLoaderFromCentaur.add_required_columns(df_atmp_t17)
 
-            # if not duplicate_df.empty:
-            #     duplicate_df['AUTOID'] = range(len(duplicate_df))
-            #     abacus.bulk_insert_err_atmp_t17(duplicate_df, is_service)
+            # Clean duplicate data
+            df_atmp_t17, duplicate_df = AbacusCCLoaderFromCentaur.clean_centaur_cc_data(
+                df_atmp_t17
+            )
 
             if abacus.do_atmp_abacus_cc_job(df_atmp_t17, is_service):
+                AbacusCCLoaderFromCentaur.quarantine_duplicates(abacus, [duplicate_df])
                 # if abacus.do_abacus_cc_job(df_atmp_t17, is_service):
                 #     AbacusCCLoaderFromCentaur.atmpT17 = df_atmp_t17
                 return AbacusCCLoaderFromCentaur.LoadStatus.SUCCESS
@@ -77,10 +117,105 @@ class AbacusCCLoaderFromCentaur:
             raise ex
 
     @staticmethod
-    def get_error_records():
+    def clean_and_load_cc_chunked(centaur, abacus, is_service):
+        try:
+            duplicates = []
+
+            def clean(df_atmp_t17):
+                AbacusCCLoaderFromCentaur.add_required_columns(df_atmp_t17)
+                df_atmp_t17, duplicate_df = (
+                    AbacusCCLoaderFromCentaur.clean_centaur_cc_data(df_atmp_t17)
+                )
+                duplicates.append(duplicate_df)
+                return df_atmp_t17
+
+            chunks = (
+                clean(df_atmp_t17)
+                for df_atmp_t17 in AbacusCCLoaderFromCentaur.regroup_by_product(
+                    AbacusCCLoaderFromCentaur.timed_chunks(
+                        centaur.iter_cc_data(), abacus.run_log
+                    )
+                )
+            )
+            if abacus.do_atmp_abacus_cc_job_chunked(chunks, is_service):
+                AbacusCCLoaderFromCentaur.quarantine_duplicates(abacus, duplicates)
+                return AbacusCCLoaderFromCentaur.LoadStatus.SUCCESS
+            else:
+                return AbacusCCLoaderFromCentaur.LoadStatus.ERROR
+        except Exception as ex:
+            logging.error(f"Error: {str(ex)}")
+            raise ex
+
+    @staticmethod
+    def timed_chunks(chunks, run_log):
+        """chunks, with the time spent reading each one logged as extract."""
+        chunks = iter(chunks)
+        while True:
+            with run_log.stage("extract") as extract:
+                chunk = next(chunks, None)
+                extract.rows = 0 if chunk is None else len(chunk)
+            if chunk is None:
+                return
+            yield chunk
+
+    @staticmethod
+    def regroup_by_product(chunks):
+        """Moves rows at the start of a chunk that belong to the last product
+        of the chunk before into that chunk, so chunks read in ID_PRODUCT
+        order never split a product."""
+        pending = None
+        for chunk in chunks:
+            if pending is None or pending.empty:
+                pending = chunk
+                continue
+            last = pending["ID_PRODUCT"].to_numpy()[-1]
+            head = (chunk["ID_PRODUCT"] == last).to_numpy()
+            if head.any():
+                pending = pd.concat([pending, chunk[head]], ignore_index=True)
+                chunk = chunk[~head].reset_index(drop=True)
+                if chunk.empty:
+                    continue
+            yield pending
+            pending = chunk
+        if pending is not None:
+            yield pending
+
+    @staticmethod
+    def quarantine_duplicates(abacus, duplicate_dfs):
+        """Replaces the quarantined rows with the duplicates of this run once
+        its unique rows are loaded, so a run without any still clears those
+        of the run before; rows an operator has fixed are kept. A failure is
+        logged: the unique rows are loaded either way."""
+        duplicate_dfs = [df for df in duplicate_dfs if not df.empty]
+        duplicate_df = (
+            pd.concat(duplicate_dfs, ignore_index=True)
+            if duplicate_dfs
+            else pd.DataFrame()
+        )
+        if not duplicate_df.empty:
+            logging.warning(
+                f"{len(duplicate_df)} duplicate ID_PRODUCT rows quarantined"
+            )
+        metrics.count("loader.quarantined_rows", len(duplicate_df))
         try:
-            abacus = CC_AbacusDA()
-            return abacus.get_error_records()
+            abacus.bulk_insert_err_atmp_t17(duplicate_df)
+        except Exception as ex:
+            logging.error(f"Quarantining duplicate rows failed: {str(ex)}")
+
+    @staticmethod
+    def add_required_columns(df_atmp_t17):
+        df_atmp_t17["NUMBER_OF_PAYMENTS_PAST_DUE"] = 0
+        df_atmp_t17["DATE_SINCE_PAST_DUE"] = pd.NaT
+        df_atmp_t17["CARD_BALANCE"] = 0.0
+        df_atmp_t17["DPD_HO"] = 0
+        df_atmp_t17["IS_JOINT"] = 0
+        return df_atmp_t17
+
+    @staticmethod
+    def get_error_records(after_autoid=None, page_size=None):
+        try:
+            abacus = AbacusCCLoaderFromCentaur.new_run_abacus()
+            return abacus.get_error_records(after_autoid, page_size)
         except Exception as ex:
             logging.error(f"Error fetching error records: {str(ex)}")
             raise ex
@@ -88,7 +223,7 @@ class AbacusCCLoaderFromCentaur:
     @staticmethod
     def save_error_records(df):
         try:
-            abacus = CC_AbacusDA()
+            abacus = AbacusCCLoaderFromCentaur.new_run_abacus()
             return abacus.save_fixed_errors(df)
         except Exception as ex:
             logging.error(f"Error saving error records: {str(ex)}")
@@ -96,13 +231,15 @@ class AbacusCCLoaderFromCentaur:
 
     @staticmethod
     def commit_fixed_errors_into_t17(df, is_service):
-        duplicates = df.groupby("ID_PRODUCT").filter(lambda x: len(x) > 1)
-        if not duplicates.empty:
+        if df["ID_PRODUCT"].duplicated(keep=False).any():
             return "There are still some duplicates, please fix those first!"
         else:
             try:
-                abacus = CC_AbacusDA()
-                abacus.commit_fixed_errors_into_t17(is_service)
+                abacus = AbacusCCLoaderFromCentaur.new_run_abacus()
+                # The day ATMP was loaded for, the rows are transformed as of it
+                abacus.WorkingDay = CCCentaurDA().centaur_working_day
+                if abacus.commit_fixed_errors_into_t17(is_service) is None:
+                    return "There are still some duplicates, please fix those first!"
                 return "Success"
             except Exception as ex:
                 logging.error(f"Error committing fixed errors: {str(ex)}")
@@ -110,17 +247,15 @@ class AbacusCCLoaderFromCentaur:
 
     @staticmethod
     def clean_centaur_cc_data(df):
-        # Find and remove duplicate rows based on "ID_PRODUCT"
-        duplicates = df.groupby("ID_PRODUCT").filter(lambda x: len(x) > 1)
-
-        # Remove duplicates from the main dataframe and return them
-        df = df.drop_duplicates(subset="ID_PRODUCT", keep=False)
-        return duplicates
+        """Splits df into the rows with a unique ID_PRODUCT and the rows of
+        every product that appears more than once."""
+        duplicated = df["ID_PRODUCT"].duplicated(keep=False).to_numpy()
+        return df[~duplicated].copy(), df[duplicated].copy()
 
     @staticmethod
     def get_cc_logs():
         try:
-            abacus = CC_AbacusDA()
+            abacus = AbacusCCLoaderFromCentaur.new_run_abacus()
             return abacus.get_cc_logs()
         except Exception as ex:
             logging.error(f"Error fetching CC logs: {str(ex)}")
@@ -128,10 +263,8 @@ class AbacusCCLoaderFromCentaur:
 
     @staticmethod
     def is_load_fin():
-        abacus = CC_AbacusDA()
-        return abacus.is_load_fin()
+        return load_gate.is_load_fin()
 
     @staticmethod
     def is_ok_to_call_deliquency():
-        abacus = CC_AbacusDA()
-        return abacus.call_deliquency()
+        return load_gate.is_ok_to_call_deliquency()
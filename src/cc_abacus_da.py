@@ -1,16 +1,46 @@
-import psycopg2
+import logging
 import os
+import re
 from datetime import datetime
 from io import StringIO
 import pandas as pd
 from psycopg2 import sql
 
+from .cc_abacus_delta import (
+    FINGERPRINT_COLUMNS,
+    FINGERPRINT_TABLE,
+    changed_products,
+    fingerprint_products,
+    removed_products,
+)
+from .cc_abacus_transform import (
+    ATMPT18Accumulator,
+    T18PreviousIndex,
+    build_atmp_t17_t18,
+)
+from .connection_pool import abacus_pool
 from .log import Log
+from .metrics import instrumented, metrics
+from .parallel_copy import ParallelCopy, partition_by_product
+from .pg_binary_copy import BinaryCopyStream
+from .run_log import RunLog
+from .run_state import get_run_state
+from .sharded_transform import build_atmp_t17_t18_sharded, default_workers
+from .t18_cache import T18SnapshotCache
+from .pipeline import Pipeline
 import dotenv
 
 dotenv.load_dotenv()
 
+ATMP_T17_TABLE = "atmp_t17_dpd_credit_cards"
+ATMP_T18_TABLE = "atmp_t18_cc_payment_schedule"
+# Quarantine for ATMP_T17 rows that can't be loaded, e.g. duplicate products
+ERR_ATMP_T17_TABLE = "err_atmp_t17_dpd_credit_cards"
 
+
+@instrumented(
+    "abacus", exclude=("connection", "build_data_table_atmp_t18_for_single_product")
+)
 class CC_AbacusDA:
     def __init__(self):
         self.abacus_connection = os.getenv(
@@ -19,43 +49,75 @@ class CC_AbacusDA:
         self.schema_used = os.getenv(
             "SchemaUsed"
         )  # Environment variable or config management
-        self.conn = psycopg2.connect(self.abacus_connection)
+        # Connections are borrowed from the process-wide pool per call
+        self.pool = abacus_pool()
         self.WorkingDay = None
         self.NotCCWorkingDay = None
         self.NotCCNextWorkingDay = None
         self._last_payment_amount = 0.0
+        # "vectorized" (default), "sharded" to spread it over processes or
+        # "rows" for the original row-by-row path
+        self.transform_engine = os.getenv("TransformEngine", "vectorized")
+        # Processes of the sharded transform, all CPUs of the pod by default
+        self.transform_workers = int(os.getenv("TransformWorkers") or default_workers())
+        self._t18_previous_index = None
+        # Local copy of the previous-day T18 snapshot, reused by the retries
+        # of a working day; off unless T18CacheDir is set
+        cache_directory = os.getenv("T18CacheDir")
+        self.t18_cache = (
+            T18SnapshotCache(cache_directory, self.schema_used)
+            if cache_directory
+            else None
+        )
+        # Chunks queued between the pipelined extract/transform/COPY stages,
+        # 0 runs the chunked load one stage after the other
+        self.pipeline_queue_size = int(os.getenv("PipelineQueueSize", "0"))
+        self.pipeline_stats = []
+        # "csv" (default) or "binary" COPY format for bulk_insert_abacus
+        self.copy_format = os.getenv("CopyFormat", "csv")
+        self._column_types = {}
+        # Connections COPYing ATMP_T17/T18 partitions at the same time, capped
+        # by the pool size; 1 keeps a single COPY per table
+        self.copy_concurrency = int(os.getenv("CopyConcurrency", "1"))
+        # "two-phase" PREPAREs every partition before committing any of them
+        self.copy_commit = os.getenv("CopyCommit", "single")
+        # "full" (default) truncates and reloads ATMP_T17/T18 every run,
+        # "incremental" only rewrites the products whose rows changed and
+        # "swap" loads shadow tables and renames them over the live ones
+        self.load_mode = os.getenv("LoadMode", "full")
+        # Where the bulk inserts go, the shadow tables while a swap load runs
+        self.atmp_t17_table = ATMP_T17_TABLE
+        self.atmp_t18_table = ATMP_T18_TABLE
+        self.swap_lock_timeout = os.getenv("SwapLockTimeout", "30s")
+        # Rows per page when reading the error table
+        self.error_page_size = int(os.getenv("ErrorPageSize", "5000"))
+        self._atmp_fingerprints = None
+        self._atmp_seen = []
+        # Stage timings of the run, set by the loader for the run it drives
+        self.run_log = RunLog.disabled()
         self.start = datetime.min
         self.end = datetime.min
 
         # Call the method to set non-CC working day info
         self.set_not_cc_working_day()
 
-    def set_not_cc_working_day(self):
-        cursor = self.conn.cursor()
-        query = f"""
-            SELECT WORKING_DAY, NEXT_WORKING_DAY 
-            FROM {self.schema_used}.W01_WORKING_DAY 
-            WHERE WORKING_DAY = (SELECT MAX(WORKING_DAY) FROM {self.schema_used}.W01_WORKING_DAY)
-        """
+    def connection(self):
+        """Borrows a pooled connection for the duration of a with block."""
+        return self.pool.connection()
 
-        try:
-            self.conn.autocommit = False  # Open connection
-            cursor.execute(query)
-            row = cursor.fetchone()
-            if row:
-                self.NotCCWorkingDay = datetime.strptime(
-                    row[0], "%Y-%m-%d"
-                )  # assuming date format is Y-m-d
-                self.NotCCNextWorkingDay = datetime.strptime(row[1], "%Y-%m-%d")
-        except Exception as ex:
-            raise ex
-        finally:
-            cursor.close()
-            self.conn.close()  # Close the connection
+    def run_state(self):
+        """The run's working days and load statuses, probed in one query the
+        first time any CC_AbacusDA of the run needs them."""
+        return get_run_state(self.schema_used, self.connection)
+
+    def set_not_cc_working_day(self):
+        state = self.run_state()
+        self.NotCCWorkingDay = state.working_day
+        self.NotCCNextWorkingDay = state.next_working_day
 
     # Checks if Abacus has finished for maxWorkingDay
     def is_load_fin(self):
-        return Log.find("FIN", self.schema_used, self.NotCCWorkingDay, self.conn)
+        return self.run_state().is_load_fin()
 
     def call_deliquency(self):
         current_date = datetime.now()
@@ -63,7 +125,7 @@ class CC_AbacusDA:
         return diff <= 0
 
     def is_finished_cc(self):
-        return Log.is_finished_cc("CC", self.schema_used, self.WorkingDay, self.conn)
+        return self.run_state().is_finished_cc(self.WorkingDay)
 
     def do_atmp_abacus_cc_job(self, dt_atmp_t17, is_service):
         try:
@@ -75,31 +137,511 @@ class CC_AbacusDA:
 
             dt_atmp_t18 = self.build_atmp_t18_data_table(dt_atmp_t17)
 
-            self.truncate_atmp_t17_dpd_credit_cards(is_service)
-            self.truncate_atmp_t18_cc_payment_schedule(is_service)
+            self.begin_atmp_load(is_service)
+            self.insert_atmp_chunk(dt_atmp_t17, dt_atmp_t18)
+            self.finish_atmp_load()
 
-            # Remove columns
-            if "PERIOD" in dt_atmp_t17.columns:
-                dt_atmp_t17.drop(columns=["PERIOD"], inplace=True)
-            if "LAST_BALANCE_SIGN" in dt_atmp_t17.columns:
-                dt_atmp_t17.drop(columns=["LAST_BALANCE_SIGN"], inplace=True)
+            return True
 
-            self.bulk_insert_atmp_t17(dt_atmp_t17)
-            self.bulk_insert_atmp_t18(dt_atmp_t18)
+        except Exception as ex:
+            logging.error(f"ATMP load failed, reason: {str(ex)}")
+            self.abort_atmp_load()
+            if is_service:
+                self.update_load_log_cc(
+                    "1", self.WorkingDay.strftime("%d/%m/%Y")
+                )  # set load to true
+            # self.write_cc_log(self.start, datetime.now(), '0', 0, str(ex))
+            return False
+
+    def do_atmp_abacus_cc_job_chunked(self, atmp_t17_chunks, is_service):
+        """Same as do_atmp_abacus_cc_job, but transforms and COPYs one chunk of
+        ATMP_T17 at a time so memory stays bounded by the chunk size."""
+        try:
+            if is_service:
+                self.update_load_log_cc("0", None)  # set load to false
+
+            self.handle_working_day(self.WorkingDay)
+            self.get_t18_previous_index()
+
+            self.begin_atmp_load(is_service)
+
+            if self.pipeline_queue_size > 0:
+                self.run_atmp_pipeline(atmp_t17_chunks)
+            else:
+                for dt_atmp_t17 in atmp_t17_chunks:
+                    dt_atmp_t18 = self.build_atmp_t18_data_table(dt_atmp_t17)
+                    self.insert_atmp_chunk(dt_atmp_t17, dt_atmp_t18)
+
+            self.finish_atmp_load()
 
             return True
 
-        except Exception:
+        except Exception as ex:
+            logging.error(f"Chunked ATMP load failed, reason: {str(ex)}")
+            self.abort_atmp_load()
             if is_service:
                 self.update_load_log_cc(
                     "1", self.WorkingDay.strftime("%d/%m/%Y")
                 )  # set load to true
-            # self.write_cc_log(self.start, datetime.now(), '0', 0, str(ex))
             return False
 
-    def update_load_log_cc(self, status, cc_working_day):
-        cursor = self.conn.cursor()
+    def run_atmp_pipeline(self, atmp_t17_chunks):
+        # Reading chunk N+1 from Centaur overlaps transforming chunk N and
+        # COPYing chunk N-1; the copy stage borrows its own connection
+        def transform(dt_atmp_t17):
+            return dt_atmp_t17, self.build_atmp_t18_data_table(dt_atmp_t17)
+
+        def count_t17_rows(chunk):
+            return len(chunk[0])
+
+        pipeline = Pipeline(self.pipeline_queue_size)
+        pipeline.source("extract", atmp_t17_chunks)
+        pipeline.stage("transform", transform)
+        pipeline.stage(
+            "copy", lambda chunk: self.insert_atmp_chunk(*chunk), count=count_t17_rows
+        )
+        self.pipeline_stats = pipeline.run()
+
+    def begin_atmp_load(self, is_service):
+        """Empties ATMP_T17/T18 for a full load. An incremental load keeps
+        them and reads the fingerprints of the products they hold instead,
+        unless those can't be trusted or belong to another working day, in
+        which case it starts over."""
+        self._atmp_seen = []
+        if self.load_mode == "incremental":
+            self.create_fingerprint_table()
+            if self.atmp_fingerprints_match(self.WorkingDay):
+                self._atmp_fingerprints = self.get_atmp_fingerprints()
+                return
+        else:
+            self._atmp_fingerprints = None
+
+        if self.load_mode == "swap":
+            self.truncate_fingerprints()
+            self.create_atmp_shadow_tables()
+            return
+
+        self.truncate_atmp_t17_dpd_credit_cards(is_service)
+        self.truncate_atmp_t18_cc_payment_schedule(is_service)
+        # A full load makes any stored fingerprints stale
+        self.truncate_fingerprints()
+        if self.load_mode == "incremental":
+            self._atmp_fingerprints = self.get_atmp_fingerprints()
+
+    def finish_atmp_load(self):
+        if self.atmp_t17_table != ATMP_T17_TABLE:
+            return self.swap_atmp_shadow_tables()
+
+        # Drop the products that are no longer in the load
+        if self._atmp_fingerprints is None:
+            return
+        seen = self._atmp_seen[0].append(self._atmp_seen[1:]) if self._atmp_seen else []
+        removed = removed_products(self._atmp_fingerprints, seen)
+        metrics.count("abacus.removed_products", len(removed))
+        if len(removed) > 0:
+            self.replace_atmp_products(removed)
+
+    def insert_atmp_chunk(self, dt_atmp_t17, dt_atmp_t18):
+        if self._atmp_fingerprints is not None:
+            return self.upsert_atmp_chunk(dt_atmp_t17, dt_atmp_t18)
+
+        self.drop_atmp_t17_work_columns(dt_atmp_t17)
+        if self.copy_concurrency > 1:
+            return self.parallel_insert_atmp(dt_atmp_t17, dt_atmp_t18)
+
+        self.bulk_insert_atmp_t17(dt_atmp_t17)
+        if not dt_atmp_t18.empty:
+            self.bulk_insert_atmp_t18(dt_atmp_t18)
+
+    def parallel_insert_atmp(self, dt_atmp_t17, dt_atmp_t18):
+        """COPYs ATMP_T17 and ATMP_T18 at the same time, each split by product
+        into partitions written on their own pooled connection."""
+        workers = min(self.copy_concurrency, self.pool.max_size)
+        t17_partitions = partition_by_product(dt_atmp_t17, workers)
+        t18_partitions = partition_by_product(dt_atmp_t18, workers)
+
+        # Interleaved, so both tables are being written from the start
+        tasks = []
+        for i in range(max(len(t17_partitions), len(t18_partitions))):
+            for partitions, frame, table in (
+                (t17_partitions, dt_atmp_t17, self.atmp_t17_table),
+                (t18_partitions, dt_atmp_t18, self.atmp_t18_table),
+            ):
+                if i < len(partitions):
+                    tasks.append((partitions[i], table, frame.columns.tolist()))
+
+        try:
+            return ParallelCopy(
+                self.pool,
+                self.copy_frame,
+                workers,
+                two_phase=self.copy_commit == "two-phase",
+            ).run(tasks)
+        except Exception as ex:
+            raise Exception(f"Parallel insert of ATMP failed, reason: {str(ex)}")
+
+    @staticmethod
+    def drop_atmp_t17_work_columns(dt_atmp_t17):
+        # Remove columns
+        if "PERIOD" in dt_atmp_t17.columns:
+            dt_atmp_t17.drop(columns=["PERIOD"], inplace=True)
+        if "LAST_BALANCE_SIGN" in dt_atmp_t17.columns:
+            dt_atmp_t17.drop(columns=["LAST_BALANCE_SIGN"], inplace=True)
+
+    def upsert_atmp_chunk(self, dt_atmp_t17, dt_atmp_t18):
+        # Only the new and changed products of the chunk are written; a
+        # product must not be split across chunks
+        self.drop_atmp_t17_work_columns(dt_atmp_t17)
+        fingerprints = fingerprint_products(dt_atmp_t17, dt_atmp_t18)
+        self._atmp_seen.append(fingerprints.index)
+
+        products = changed_products(self._atmp_fingerprints, fingerprints)
+        metrics.count("abacus.changed_products", len(products))
+        if len(products) == 0:
+            return
+        self.replace_atmp_products(
+            products,
+            dt_atmp_t17[dt_atmp_t17["ID_PRODUCT"].isin(products)],
+            dt_atmp_t18[dt_atmp_t18["ID_PRODUCT"].isin(products)],
+            fingerprints[products].reset_index().assign(WORKING_DAY=self.WorkingDay),
+        )
+
+    def replace_atmp_products(
+        self, products, dt_atmp_t17=None, dt_atmp_t18=None, fingerprints=None
+    ):
+        """Deletes every ATMP_T17/T18 row and fingerprint of products and
+        writes the given rows in their place, in one transaction."""
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            try:
+                cursor.execute(
+                    "CREATE TEMP TABLE atmp_cc_delta (id_product varchar) ON COMMIT DROP"
+                )
+                keys = StringIO()
+                pd.Series(products).to_csv(keys, header=False, index=False)
+                keys.seek(0)
+                cursor.copy_expert(
+                    "COPY atmp_cc_delta (id_product) FROM STDIN WITH (FORMAT CSV)", keys
+                )
+
+                for table in (ATMP_T17_TABLE, ATMP_T18_TABLE, FINGERPRINT_TABLE):
+                    cursor.execute(f"""
+                        DELETE FROM {self.schema_used}.{table} t
+                        USING atmp_cc_delta d WHERE t.id_product = d.id_product
+                    """)
+
+                for frame, table in (
+                    (dt_atmp_t17, ATMP_T17_TABLE),
+                    (dt_atmp_t18, ATMP_T18_TABLE),
+                    (fingerprints, FINGERPRINT_TABLE),
+                ):
+                    if frame is not None and not frame.empty:
+                        self.copy_frame(cursor, frame, table, frame.columns.tolist())
+                conn.commit()
+            except Exception as ex:
+                conn.rollback()
+                raise Exception(f"Delta load of ATMP failed, reason: {str(ex)}")
+            finally:
+                cursor.close()
+
+    def abort_atmp_load(self):
+        # A failed swap load leaves the live tables untouched
+        if self.atmp_t17_table == ATMP_T17_TABLE:
+            return
+        self.atmp_t17_table = ATMP_T17_TABLE
+        self.atmp_t18_table = ATMP_T18_TABLE
+        try:
+            self.execute_and_commit(
+                f"DROP TABLE IF EXISTS {self.shadow_table_list('new')}"
+            )
+        except Exception:
+            pass
+
+    def shadow_table_list(self, suffix):
+        return ", ".join(
+            f"{self.schema_used}.{table}_{suffix}"
+            for table in (ATMP_T17_TABLE, ATMP_T18_TABLE)
+        )
+
+    def create_atmp_shadow_tables(self):
+        """Creates empty unlogged copies of ATMP_T17/T18 for the load to COPY
+        into; their indexes are only built once they are full."""
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            try:
+                for table in (ATMP_T17_TABLE, ATMP_T18_TABLE):
+                    # Views bind to the table itself, not its name, so they
+                    # would keep reading the old table after the swap
+                    cursor.execute(
+                        """
+                        SELECT view_schema || '.' || view_name
+                        FROM information_schema.view_table_usage
+                        WHERE table_schema = %s AND table_name = %s
+                        """,
+                        (self.schema_used, table),
+                    )
+                    views = [row[0] for row in cursor.fetchall()]
+                    if views:
+                        raise Exception(f"{table} is used by views {', '.join(views)}")
+                    # LIKE copies neither, the live table would lose them
+                    cursor.execute(
+                        """
+                        SELECT conname FROM pg_constraint
+                        WHERE contype = 'f' AND %s::regclass IN (conrelid, confrelid)
+                        UNION ALL
+                        SELECT tgname FROM pg_trigger
+                        WHERE tgrelid = %s::regclass AND NOT tgisinternal
+                        """,
+                        (f"{self.schema_used}.{table}",) * 2,
+                    )
+                    dependents = [row[0] for row in cursor.fetchall()]
+                    if dependents:
+                        raise Exception(
+                            f"{table} has foreign keys or triggers "
+                            f"{', '.join(dependents)}"
+                        )
+
+                cursor.execute(
+                    f"DROP TABLE IF EXISTS {self.shadow_table_list('new')}, "
+                    f"{self.shadow_table_list('old')}"
+                )
+                for table in (ATMP_T17_TABLE, ATMP_T18_TABLE):
+                    cursor.execute(f"""
+                        CREATE UNLOGGED TABLE {self.schema_used}.{table}_new (
+                            LIKE {self.schema_used}.{table}
+                            INCLUDING DEFAULTS INCLUDING CONSTRAINTS
+                            INCLUDING IDENTITY
+                        )
+                    """)
+                    self.continue_identities(cursor, table)
+                conn.commit()
+            except Exception as ex:
+                conn.rollback()
+                raise Exception(f"Create ATMP shadow tables failed, reason: {str(ex)}")
+            finally:
+                cursor.close()
+
+        self.atmp_t17_table = f"{ATMP_T17_TABLE}_new"
+        self.atmp_t18_table = f"{ATMP_T18_TABLE}_new"
+
+    def swap_atmp_shadow_tables(self):
+        """Makes the loaded shadow tables durable, indexes them and renames
+        them over the live ATMP tables in one short transaction."""
+        self.atmp_t17_table = ATMP_T17_TABLE
+        self.atmp_t18_table = ATMP_T18_TABLE
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            try:
+                renames = []
+                for table in (ATMP_T17_TABLE, ATMP_T18_TABLE):
+                    cursor.execute(
+                        f"ALTER TABLE {self.schema_used}.{table}_new SET LOGGED"
+                    )
+                    renames += self.build_shadow_indexes(cursor, table)
+                    self.copy_table_grants(cursor, table)
+                    # Planned with statistics from its first query on
+                    cursor.execute(f"ANALYZE {self.schema_used}.{table}_new")
+                conn.commit()
+
+                # Readers only wait for the renames, not for the load
+                cursor.execute(f"SET LOCAL lock_timeout = '{self.swap_lock_timeout}'")
+                for table in (ATMP_T17_TABLE, ATMP_T18_TABLE):
+                    cursor.execute(
+                        f"ALTER TABLE {self.schema_used}.{table} RENAME TO {table}_old"
+                    )
+                    cursor.execute(
+                        f"ALTER TABLE {self.schema_used}.{table}_new RENAME TO {table}"
+                    )
+                for rename in renames:
+                    cursor.execute(rename)
+                for table in (ATMP_T17_TABLE, ATMP_T18_TABLE):
+                    self.move_owned_sequences(cursor, table)
+                conn.commit()
+            except Exception as ex:
+                conn.rollback()
+                cursor.close()
+                raise Exception(f"Swap ATMP tables failed, reason: {str(ex)}")
+
+            # The new data is live from here on; an _old table left behind is
+            # dropped by the next swap load
+            try:
+                cursor.execute(f"DROP TABLE {self.shadow_table_list('old')}")
+                conn.commit()
+            except Exception as ex:
+                conn.rollback()
+                logging.warning(f"Dropping the old ATMP tables failed: {str(ex)}")
+            finally:
+                cursor.close()
+            return True
+
+    def continue_identities(self, cursor, table):
+        # An identity column gets a sequence of its own on the shadow table,
+        # which must go on from where the live table's left off
+        cursor.execute(
+            """
+            SELECT attname FROM pg_attribute
+            WHERE attrelid = %s::regclass AND attidentity <> '' AND NOT attisdropped
+            """,
+            (f"{self.schema_used}.{table}",),
+        )
+        for (column,) in cursor.fetchall():
+            cursor.execute(
+                """
+                SELECT setval(pg_get_serial_sequence(%s, %s), last_value)
+                FROM (
+                    SELECT pg_sequence_last_value(
+                        pg_get_serial_sequence(%s, %s)::regclass
+                    ) AS last_value
+                ) live
+                WHERE last_value IS NOT NULL
+                """,
+                (
+                    f"{self.schema_used}.{table}_new",
+                    column,
+                    f"{self.schema_used}.{table}",
+                    column,
+                ),
+            )
+
+    def move_owned_sequences(self, cursor, table):
+        # A serial column's default still calls the sequence owned by the
+        # old table, which could not be dropped while the live one uses it
+        cursor.execute(
+            """
+            SELECT s.oid::regclass::text, a.attname
+            FROM pg_depend d
+            JOIN pg_class s ON s.oid = d.objid AND s.relkind = 'S'
+            JOIN pg_attribute a
+                ON a.attrelid = d.refobjid AND a.attnum = d.refobjsubid
+            WHERE d.refobjid = %s::regclass AND d.deptype = 'a'
+            """,
+            (f"{self.schema_used}.{table}_old",),
+        )
+        for sequence, column in cursor.fetchall():
+            cursor.execute(
+                f"ALTER SEQUENCE {sequence} OWNED BY {self.schema_used}.{table}.{column}"
+            )
+
+    def build_shadow_indexes(self, cursor, table):
+        """Recreates the indexes (and the primary key and unique constraints
+        backed by them) of table on its shadow table, under a _new name.
+
+        Returns the statements that give them the live names after the swap.
+        """
+        cursor.execute(
+            """
+            SELECT i.relname, pg_get_indexdef(i.oid), c.conname, c.contype
+            FROM pg_index x
+            JOIN pg_class i ON i.oid = x.indexrelid
+            LEFT JOIN pg_constraint c
+                ON c.conindid = x.indexrelid AND c.contype IN ('p', 'u')
+            WHERE x.indrelid = %s::regclass
+            """,
+            (f"{self.schema_used}.{table}",),
+        )
+        shadow = f"{self.schema_used}.{table}_new"
+        renames = []
+        for index, definition, constraint, constraint_type in cursor.fetchall():
+            definition = re.sub(
+                r"^CREATE (UNIQUE )?INDEX \S+ ON (ONLY )?\S+",
+                lambda match: f"CREATE {match.group(1) or ''}INDEX {index}_new ON {shadow}",
+                definition,
+            )
+            cursor.execute(definition)
+            if constraint is None:
+                renames += [
+                    f"ALTER INDEX {self.schema_used}.{index} RENAME TO {index}_old",
+                    f"ALTER INDEX {self.schema_used}.{index}_new RENAME TO {index}",
+                ]
+                continue
+
+            kind = "PRIMARY KEY" if constraint_type == "p" else "UNIQUE"
+            cursor.execute(
+                f"ALTER TABLE {shadow} ADD CONSTRAINT {constraint}_new "
+                f"{kind} USING INDEX {index}_new"
+            )
+            # Renaming a constraint renames its index as well; the old table
+            # already carries the _old name when these run
+            renames += [
+                f"ALTER TABLE {self.schema_used}.{table}_old "
+                f"RENAME CONSTRAINT {constraint} TO {constraint}_old",
+                f"ALTER TABLE {self.schema_used}.{table} "
+                f"RENAME CONSTRAINT {constraint}_new TO {constraint}",
+            ]
+        return renames
+
+    def copy_table_grants(self, cursor, table):
+        cursor.execute(
+            """
+            SELECT grantee, string_agg(privilege_type, ', ')
+            FROM information_schema.role_table_grants
+            WHERE table_schema = %s AND table_name = %s AND grantee <> current_user
+            GROUP BY grantee
+            """,
+            (self.schema_used, table),
+        )
+        for grantee, privileges in cursor.fetchall():
+            grantee = grantee if grantee == "PUBLIC" else f'"{grantee}"'
+            cursor.execute(
+                f"GRANT {privileges} ON {self.schema_used}.{table}_new TO {grantee}"
+            )
 
+    def create_fingerprint_table(self):
+        # working_day was added later, tables of earlier runs lack it
+        self.execute_and_commit(f"""
+            CREATE TABLE IF NOT EXISTS {self.schema_used}.{FINGERPRINT_TABLE} (
+                id_product varchar PRIMARY KEY,
+                fingerprint bigint NOT NULL,
+                working_day date
+            );
+            ALTER TABLE {self.schema_used}.{FINGERPRINT_TABLE}
+                ADD COLUMN IF NOT EXISTS working_day date
+        """)
+
+    def truncate_fingerprints(self):
+        # The table only exists once an incremental load has run
+        query = f"""
+            DO $$ BEGIN
+                IF to_regclass('{self.schema_used}.{FINGERPRINT_TABLE}') IS NOT NULL THEN
+                    DELETE FROM {self.schema_used}.{FINGERPRINT_TABLE};
+                END IF;
+            END $$
+        """
+        try:
+            return self.execute_and_commit(query)
+        except Exception as ex:
+            raise Exception(f"Truncate fingerprints failed, reason: {str(ex)}")
+
+    def atmp_fingerprints_match(self, working_day):
+        # Someone else may have reloaded ATMP_T17 since the last incremental
+        # run; then the fingerprints no longer describe its rows. Every row
+        # carries the working day, so on a new day every product changes and
+        # a full reload writes less than a delta of the whole book would
+        query = f"""
+            SELECT
+                (SELECT count(*) FROM {self.schema_used}.{FINGERPRINT_TABLE}),
+                (SELECT count(DISTINCT id_product)
+                 FROM {self.schema_used}.atmp_t17_dpd_credit_cards),
+                (SELECT count(*) FROM {self.schema_used}.{FINGERPRINT_TABLE}
+                 WHERE working_day IS DISTINCT FROM %s)
+        """
+        with self.connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(query, (working_day,))
+                fingerprints, products, other_days = cursor.fetchone()
+        return fingerprints > 0 and fingerprints == products and other_days == 0
+
+    def get_atmp_fingerprints(self):
+        query = f"SELECT id_product, fingerprint FROM {self.schema_used}.{FINGERPRINT_TABLE}"
+        try:
+            with self.connection() as conn:
+                df = pd.read_sql(query, conn)
+            df.columns = FINGERPRINT_COLUMNS
+            return df.set_index("ID_PRODUCT")["FINGERPRINT"].astype("int64")
+        except Exception as ex:
+            raise Exception(f"Failed to fetch ATMP fingerprints: {str(ex)}")
+
+    def update_load_log_cc(self, status, cc_working_day):
         if cc_working_day:
             query = f"""
                 UPDATE {self.schema_used}.load 
@@ -113,41 +655,59 @@ class CC_AbacusDA:
             """
             params = (status,)
 
-        try:
-            cursor.execute(query, params)
-            self.conn.commit()
-        except Exception as ex:
-            self.conn.rollback()  # Rollback in case of failure
-            raise Exception(f"UpdateLoadCC failed, reason: {str(ex)}")
-        finally:
-            cursor.close()
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            try:
+                cursor.execute(query, params)
+                conn.commit()
+            except Exception as ex:
+                conn.rollback()  # Rollback in case of failure
+                raise Exception(f"UpdateLoadCC failed, reason: {str(ex)}")
+            finally:
+                cursor.close()
 
     def handle_working_day(self, centaur_working_day):
         query = (
             f"SELECT * FROM {self.schema_used}.w02_ccworking_day WHERE working_day = %s"
         )
-        cursor = self.conn.cursor()
 
-        try:
-            cursor.execute(query, (self.WorkingDay,))
-            exists = cursor.fetchone() is not None  # Check if any rows are returned
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            try:
+                cursor.execute(query, (self.WorkingDay,))
+                exists = cursor.fetchone() is not None  # Check if any rows are returned
 
-            cursor.close()
-            self.conn.commit()
+                cursor.close()
+                conn.commit()
 
-            if exists:
-                return True
-            else:
-                return self.create_working_day(self.WorkingDay)
-        except Exception:
-            return False
-        finally:
-            cursor.close()
+                if exists:
+                    return True
+                else:
+                    return self.create_working_day(self.WorkingDay)
+            except Exception:
+                return False
+            finally:
+                cursor.close()
 
     def build_atmp_t18_data_table(self, atmp_t17):
-        # Get empty ATMP_T18 DataFrame (equivalent to DataTable)
-        atmp_t18 = self.get_atmp_t18()  # should return always 0 records
-        t18 = self.get_t18_previous_values()
+        with self.run_log.stage("transform", len(atmp_t17)):
+            if self.transform_engine == "rows":
+                return self.build_atmp_t18_data_table_rows(atmp_t17)
+
+            t18_index = self.get_t18_previous_index()
+            try:
+                if self.transform_engine == "sharded":
+                    return build_atmp_t17_t18_sharded(
+                        atmp_t17, t18_index, self.WorkingDay, self.transform_workers
+                    )
+                return build_atmp_t17_t18(atmp_t17, t18_index, self.WorkingDay)
+            except Exception as ex:
+                raise Exception(f"BuildATMP_T18 failed, reason: {str(ex)}")
+
+    def build_atmp_t18_data_table_rows(self, atmp_t17):
+        # Rows of the new ATMP_T18, turned into a DataFrame once at the end
+        atmp_t18 = ATMPT18Accumulator()
+        t18_index = self.get_t18_previous_index()
 
         # Iterate over the rows of ATMP_T17
         for index, row in atmp_t17.iterrows():
@@ -177,18 +737,24 @@ class CC_AbacusDA:
 
             # Handle DAYS_PAST_DUE and matching rows from T18
             if int(row["DAYS_PAST_DUE"]) > 0:
-                t18_rows = t18[t18["ID_PRODUCT"] == row["ID_PRODUCT"]]
+                t18_rows = t18_index.get(row["ID_PRODUCT"])
 
                 try:
                     # Call external method to build T18 data for a single product
                     self.build_data_table_atmp_t18_for_single_product(
                         atmp_t18, t18_rows, row
                     )
+                    # row is a copy, so write the per-card results back
+                    atmp_t17.at[index, "DATE_SINCE_PAST_DUE"] = row[
+                        "DATE_SINCE_PAST_DUE"
+                    ]
+                    atmp_t17.at[index, "NUMBER_OF_PAYMENTS_PAST_DUE"] = row[
+                        "NUMBER_OF_PAYMENTS_PAST_DUE"
+                    ]
                 except Exception as ex:
                     raise Exception(f"BuildATMP_T18 failed, reason: {str(ex)}")
 
-        # Accept changes (this is more relevant for .NET DataTables, in Pandas it's already handled)
-        return atmp_t18
+        return atmp_t18.to_frame()
 
     def get_atmp_t18(self):
         query = (
@@ -197,12 +763,58 @@ class CC_AbacusDA:
 
         try:
             # Using Pandas to fetch the result of the query (which will always be empty since 1<>1)
-            df = pd.read_sql(query, self.conn)
+            with self.connection() as conn:
+                df = pd.read_sql(query, conn)
             return df
         except Exception as ex:
             raise Exception(f"Failed to fetch ATMP_T18 data: {str(ex)}")
 
     def get_t18_previous_values(self):
+        if self.t18_cache is None:
+            return self.read_t18_previous_values()
+
+        try:
+            previous_day, *probe = self.probe_t18_previous()
+        except Exception as ex:
+            logging.warning(f"T18 snapshot probe failed, not caching: {str(ex)}")
+            return self.read_t18_previous_values()
+        if previous_day is None:
+            return self.read_t18_previous_values()
+
+        cached = self.t18_cache.load(previous_day, probe)
+        if cached is not None:
+            return cached
+
+        df = self.read_t18_previous_values()
+        try:
+            return self.t18_cache.store(previous_day, probe, df)
+        except Exception as ex:
+            logging.warning(f"Caching the T18 snapshot failed: {str(ex)}")
+        return df
+
+    def probe_t18_previous(self):
+        """(previous working day, rows, max AUTOID) of the T18 slice
+        get_t18_previous_values reads, in one cheap aggregate."""
+        query = f"""
+            SELECT w.working_day, count(t.working_day), max(t.autoid)
+            FROM (
+                SELECT max(working_day) AS working_day
+                FROM {self.schema_used}.w02_ccworking_day
+                WHERE working_day < %s
+            ) w
+            LEFT JOIN {self.schema_used}.t18_cc_payment_schedule t
+                ON t.working_day = w.working_day
+            GROUP BY w.working_day
+        """
+        with self.connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(query, (self.WorkingDay,))
+                previous_day, rows, max_autoid = cursor.fetchone()
+        if previous_day is None:
+            return None, rows, max_autoid
+        return str(previous_day)[:10], rows, max_autoid
+
+    def read_t18_previous_values(self):
         query = f"""
             SELECT * FROM {self.schema_used}.t18_cc_payment_schedule 
             WHERE {self.schema_used}.t18_cc_payment_schedule.working_day = (
@@ -215,11 +827,22 @@ class CC_AbacusDA:
 
         try:
             # Execute the query and pass the parameter (WorkingDay) using psycopg2 with pandas
-            df = pd.read_sql(query, self.conn, params=(self.WorkingDay,))
+            with self.connection() as conn:
+                df = pd.read_sql(query, conn, params=(self.WorkingDay,))
+            # Postgres folds the column names to lower case
+            df.columns = df.columns.str.upper()
             return df
         except Exception as ex:
             raise Exception(f"Failed to fetch T18 previous values: {str(ex)}")
 
+    def get_t18_previous_index(self):
+        # Loaded once per working day and shared by the rest of the load
+        cached = self._t18_previous_index
+        if cached is None or cached[0] != self.WorkingDay:
+            index = T18PreviousIndex(self.get_t18_previous_values())
+            self._t18_previous_index = (self.WorkingDay, index)
+        return self._t18_previous_index[1]
+
     def build_data_table_atmp_t18_for_single_product(
         self, atmp_t18, t18rows, atmp_t17_row
     ):
@@ -294,8 +917,10 @@ class CC_AbacusDA:
                 )
                 last_sum_of_payment = float(atmp_t18_row.get("LAST_SUM_OF_PAYMENT", 0))
 
-                # Append the new row to ATMP_T18 DataFrame
-                atmp_t18 = atmp_t18.append(atmp_t18_row, ignore_index=True)
+                # Add the new row to the ATMP_T18 buffers
+                atmp_t18.append(atmp_t18_row)
+
+        atmp_t17_row["NUMBER_OF_PAYMENTS_PAST_DUE"] = nr_payments_past_due
 
     def truncate_atmp_t17_dpd_credit_cards(self, is_service):
         try:
@@ -304,12 +929,8 @@ class CC_AbacusDA:
                 if is_service
                 else f"DELETE FROM {self.schema_used}.atmp_t17_dpd_credit_cards"
             )
-            with self.conn.cursor() as cursor:
-                cursor.execute(query)
-            self.conn.commit()
-            return True
+            return self.execute_and_commit(query)
         except Exception as ex:
-            self.conn.rollback()
             raise Exception(f"TruncateATMP_T17 failed, reason: {str(ex)}")
 
     def truncate_atmp_t18_cc_payment_schedule(self, is_service):
@@ -319,14 +940,21 @@ class CC_AbacusDA:
                 if is_service
                 else f"DELETE FROM {self.schema_used}.atmp_t18_cc_payment_schedule"
             )
-            with self.conn.cursor() as cursor:
-                cursor.execute(query)
-            self.conn.commit()
-            return True
+            return self.execute_and_commit(query)
         except Exception as ex:
-            self.conn.rollback()
             raise Exception(f"Truncate ATMP_T18 failed, reason: {str(ex)}")
 
+    def execute_and_commit(self, query, params=None):
+        with self.connection() as conn:
+            try:
+                with conn.cursor() as cursor:
+                    cursor.execute(query, params)
+                conn.commit()
+                return True
+            except Exception:
+                conn.rollback()
+                raise
+
     def bulk_insert_atmp_t17(self, atmp_t17: pd.DataFrame):
         # Extract the column names from the DataFrame
         column_names_atmp_t17 = atmp_t17.columns.tolist()
@@ -336,15 +964,13 @@ class CC_AbacusDA:
             # You can pass the DataFrame, table name, and column names just like in the original code.
             return self.bulk_insert_abacus(
                 atmp_t17,
-                "atmp_t17_dpd_credit_cards",
+                self.atmp_t17_table,
                 column_names_atmp_t17,
                 column_names_atmp_t17,
             )
         except Exception as ex:
             raise Exception(f"Bulk insert ATMP_T17 failed, reason: {str(ex)}")
 
-    import pandas as pd
-
     def bulk_insert_atmp_t18(self, atmp_t18: pd.DataFrame):
         # Extract the column names from the DataFrame
         column_names_atmp_t18 = atmp_t18.columns.tolist()
@@ -353,7 +979,7 @@ class CC_AbacusDA:
             # Assuming BulkInsertAbacus is another method for bulk insertion, we'll call it here.
             return self.bulk_insert_abacus(
                 atmp_t18,
-                "atmp_t18_cc_payment_schedule",
+                self.atmp_t18_table,
                 column_names_atmp_t18,
                 column_names_atmp_t18,
             )
@@ -362,6 +988,202 @@ class CC_AbacusDA:
         except Exception as ex:
             raise Exception(f"Bulk insert ATMP_T18 failed, reason: {str(ex)}")
 
+    def bulk_insert_err_atmp_t17(self, err_atmp_t17: pd.DataFrame):
+        """Replaces the quarantined ATMP_T17 rows no operator has edited with
+        err_atmp_t17, which may be empty. The rows are kept as read from
+        Centaur, work columns included, and only transformed once they are
+        committed. They draw AUTOID from the table's sequence; the products
+        with edited rows are left as they are until those are committed."""
+        table = f"{self.schema_used}.{ERR_ATMP_T17_TABLE}"
+
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            try:
+                cursor.execute(f"DELETE FROM {table} WHERE NOT edited")
+                if not err_atmp_t17.empty:
+                    # What is left are the rows an operator is fixing
+                    cursor.execute(f"SELECT DISTINCT id_product FROM {table}")
+                    edited = [row[0] for row in cursor.fetchall()]
+                    err_atmp_t17 = err_atmp_t17[
+                        ~err_atmp_t17["ID_PRODUCT"].isin(edited)
+                    ]
+                if not err_atmp_t17.empty:
+                    self.copy_frame(
+                        cursor,
+                        err_atmp_t17,
+                        ERR_ATMP_T17_TABLE,
+                        err_atmp_t17.columns.tolist(),
+                    )
+                conn.commit()
+                return True
+            except Exception as ex:
+                conn.rollback()
+                raise Exception(f"Bulk insert ERR_ATMP_T17 failed, reason: {str(ex)}")
+            finally:
+                cursor.close()
+
+    def get_error_records(self, after_autoid=None, page_size=None):
+        """One page of quarantined ATMP_T17 rows in AUTOID order, starting
+        after after_autoid; every row when page_size is not given."""
+        if page_size is not None:
+            return self.get_error_records_page(after_autoid, page_size)
+        pages = list(self.iter_error_records(after_autoid))
+        if not pages:
+            return self.get_error_records_page(after_autoid, 0)
+        return pd.concat(pages, ignore_index=True)
+
+    def iter_error_records(self, after_autoid=None, page_size=None):
+        page_size = page_size or self.error_page_size
+        while True:
+            page = self.get_error_records_page(after_autoid, page_size)
+            if page.empty:
+                return
+            yield page
+            if len(page) < page_size:
+                return
+            after_autoid = int(page["AUTOID"].iloc[-1])
+
+    def get_error_records_page(self, after_autoid, page_size):
+        # Keyset paging, every page is one index range scan on AUTOID
+        query = f"""
+            SELECT * FROM {self.schema_used}.{ERR_ATMP_T17_TABLE}
+            WHERE %s IS NULL OR autoid > %s
+            ORDER BY autoid
+            LIMIT %s
+        """
+        try:
+            with self.connection() as conn:
+                df = pd.read_sql(
+                    query, conn, params=(after_autoid, after_autoid, page_size)
+                )
+            df.columns = df.columns.str.upper()
+            return df
+        except Exception as ex:
+            raise Exception(f"Failed to fetch error records: {str(ex)}")
+
+    def save_fixed_errors(self, df: pd.DataFrame):
+        """Replaces the quarantined rows with the corrected rows of df, matched
+        on AUTOID: COPYed into a temp table and applied in one transaction.
+        The saved rows are marked EDITED, later runs keep them."""
+        columns = [column for column in df.columns if column.upper() != "EDITED"]
+        column_list = ", ".join(columns)
+        table = f"{self.schema_used}.{ERR_ATMP_T17_TABLE}"
+
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            try:
+                cursor.execute(f"""
+                    CREATE TEMP TABLE fixed_err_atmp_t17
+                    (LIKE {table}) ON COMMIT DROP
+                """)
+                output = StringIO()
+                df[columns].to_csv(output, sep="\t", header=False, index=False)
+                output.seek(0)
+                cursor.copy_expert(
+                    f"COPY fixed_err_atmp_t17 ({column_list}) "
+                    "FROM STDIN WITH (FORMAT CSV, DELIMITER '\t')",
+                    output,
+                )
+                cursor.execute(f"""
+                    DELETE FROM {table} e
+                    USING fixed_err_atmp_t17 f WHERE e.autoid = f.autoid
+                """)
+                cursor.execute(f"""
+                    INSERT INTO {table} ({column_list}, edited)
+                    SELECT {column_list}, true FROM fixed_err_atmp_t17
+                """)
+                saved = cursor.rowcount
+                conn.commit()
+                return saved
+            except Exception as ex:
+                conn.rollback()
+                raise Exception(f"Save fixed errors failed, reason: {str(ex)}")
+            finally:
+                cursor.close()
+
+    def commit_fixed_errors_into_t17(self, is_service):
+        """Runs the quarantined rows through the ATMP_T17/T18 transform of
+        WorkingDay, the way a load would have, and COPYs both results while
+        emptying the error table, in one transaction. Nothing is committed,
+        and None returned, while a product is still quarantined more than
+        once or is already in ATMP_T17."""
+        clear = (
+            f"TRUNCATE TABLE {self.schema_used}.{ERR_ATMP_T17_TABLE}"
+            if is_service
+            else f"DELETE FROM {self.schema_used}.{ERR_ATMP_T17_TABLE}"
+        )
+        # Read before the transaction, the transform below must not borrow
+        # a second connection while it is open
+        self.get_t18_previous_index()
+
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            try:
+                # No fixes saved and no rows loaded while this one is checked
+                # and committed
+                cursor.execute(
+                    f"LOCK TABLE {self.schema_used}.{ERR_ATMP_T17_TABLE} "
+                    "IN EXCLUSIVE MODE"
+                )
+                cursor.execute(
+                    f"LOCK TABLE {self.schema_used}.{ATMP_T17_TABLE} IN SHARE MODE"
+                )
+                cursor.execute(f"""
+                    SELECT * FROM {self.schema_used}.{ERR_ATMP_T17_TABLE}
+                    ORDER BY autoid
+                """)
+                columns = [column[0].upper() for column in cursor.description]
+                atmp_t17 = pd.DataFrame(cursor.fetchall(), columns=columns)
+                atmp_t17 = atmp_t17.drop(columns=["AUTOID", "EDITED"])
+
+                duplicates = self.uncommittable_products(cursor, atmp_t17)
+                if duplicates:
+                    conn.rollback()
+                    logging.warning(
+                        f"Not committing the fixed errors, duplicate products: "
+                        f"{', '.join(duplicates)}"
+                    )
+                    return None
+
+                atmp_t18 = self.build_atmp_t18_data_table(atmp_t17)
+                self.drop_atmp_t17_work_columns(atmp_t17)
+                self.copy_frame(
+                    cursor, atmp_t17, ATMP_T17_TABLE, atmp_t17.columns.tolist()
+                )
+                if not atmp_t18.empty:
+                    self.copy_frame(
+                        cursor, atmp_t18, ATMP_T18_TABLE, atmp_t18.columns.tolist()
+                    )
+                cursor.execute(clear)
+                conn.commit()
+                return len(atmp_t17)
+            except Exception as ex:
+                conn.rollback()
+                raise Exception(
+                    f"Commit fixed errors into ATMP_T17 failed, reason: {str(ex)}"
+                )
+            finally:
+                cursor.close()
+
+    def uncommittable_products(self, cursor, atmp_t17):
+        """The products of atmp_t17 that appear in it more than once or are
+        already in ATMP_T17, sorted."""
+        products = atmp_t17["ID_PRODUCT"]
+        duplicates = set(products[products.duplicated()])
+        cursor.execute(
+            f"""
+            SELECT DISTINCT id_product FROM {self.schema_used}.{ATMP_T17_TABLE}
+            WHERE id_product = ANY(%s)
+            """,
+            (products.unique().tolist(),),
+        )
+        duplicates.update(row[0] for row in cursor.fetchall())
+        return sorted(duplicates)
+
+    def get_cc_logs(self):
+        with self.connection() as conn:
+            return Log.get_all(conn, self.schema_used)
+
     def bulk_insert_abacus(
         self,
         source_table: pd.DataFrame,
@@ -369,12 +1191,6 @@ class CC_AbacusDA:
         source_columns: list,
         destination_columns: list,
     ):
-        # Ensure the connection is open
-        if self.conn.closed:
-            self.conn = psycopg2.connect(self.abacus_connection)
-
-        cursor = self.conn.cursor()
-
         # Match source and destination columns
         if source_columns and destination_columns:
             if (
@@ -387,28 +1203,83 @@ class CC_AbacusDA:
                     destination_columns  # Rename columns to match destination
                 )
 
-        try:
-            # Convert the DataFrame to CSV format for the COPY command
-            output = StringIO()
-            source_table.to_csv(output, sep="\t", header=False, index=False)
-            output.seek(0)
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            try:
+                self.copy_frame(
+                    cursor, source_table, destination_table_name, destination_columns
+                )
+                conn.commit()
+
+                return True
+            except Exception as ex:
+                conn.rollback()
+                raise Exception(
+                    f"Bulk insert into {destination_table_name} failed, reason: {str(ex)}"
+                )
+            finally:
+                cursor.close()
 
-            # Construct the SQL COPY command
-            copy_command = f"COPY {self.schema_used}.{destination_table_name} ({', '.join(destination_columns)}) FROM STDIN WITH (FORMAT CSV, DELIMITER '\t')"
+    def copy_frame(self, cursor, source_table, destination_table_name, columns):
+        with self.run_log.stage(
+            self.copy_stage(destination_table_name), len(source_table)
+        ) as copy:
+            if self.copy_format == "binary":
+                copy.bytes = self.copy_binary(
+                    cursor, source_table, destination_table_name, columns
+                )
+            else:
+                copy.bytes = self.copy_csv(
+                    cursor, source_table, destination_table_name, columns
+                )
 
-            # Execute the bulk insert using COPY
-            cursor.copy_expert(copy_command, output)
-            self.conn.commit()
+    @staticmethod
+    def copy_stage(destination_table_name):
+        # Run log stage of a COPY into ATMP_T17/T18 or their shadow tables,
+        # other tables aren't timed
+        if destination_table_name.startswith(ATMP_T17_TABLE):
+            return "copy_t17"
+        if destination_table_name.startswith(ATMP_T18_TABLE):
+            return "copy_t18"
+        return None
 
-            return True
-        except Exception as ex:
-            self.conn.rollback()
-            raise Exception(
-                f"Bulk insert into {destination_table_name} failed, reason: {str(ex)}"
+    def copy_csv(self, cursor, source_table, destination_table_name, columns):
+        # Convert the DataFrame to CSV format for the COPY command
+        output = StringIO()
+        source_table.to_csv(output, sep="\t", header=False, index=False)
+        size = output.tell()
+        output.seek(0)
+
+        # Construct the SQL COPY command
+        copy_command = f"COPY {self.schema_used}.{destination_table_name} ({', '.join(columns)}) FROM STDIN WITH (FORMAT CSV, DELIMITER '\t')"
+
+        # Execute the bulk insert using COPY
+        cursor.copy_expert(copy_command, output)
+        return size
+
+    def copy_binary(self, cursor, source_table, destination_table_name, columns):
+        # Encodes straight from the column buffers, a block of rows at a time,
+        # instead of rendering the whole frame to text first
+        column_types = self.get_column_types(cursor, destination_table_name)
+        pg_types = [column_types[column.lower()] for column in columns]
+        stream = BinaryCopyStream(source_table, pg_types)
+
+        copy_command = f"COPY {self.schema_used}.{destination_table_name} ({', '.join(columns)}) FROM STDIN WITH (FORMAT BINARY)"
+        cursor.copy_expert(copy_command, stream, size=1024 * 1024)
+        return stream.bytes_written
+
+    def get_column_types(self, cursor, table_name):
+        # Binary COPY needs the exact type of every destination column
+        if table_name not in self._column_types:
+            cursor.execute(
+                """
+                SELECT column_name, udt_name FROM information_schema.columns
+                WHERE table_schema = %s AND table_name = %s
+                """,
+                (self.schema_used, table_name),
             )
-        finally:
-            cursor.close()
-            self.conn.close()
+            self._column_types[table_name] = dict(cursor.fetchall())
+        return self._column_types[table_name]
 
     def create_working_day(self, working_day):
         query = sql.SQL("""
@@ -417,13 +1288,6 @@ class CC_AbacusDA:
         """).format(schema=sql.Identifier(self.schema_used))
 
         try:
-            with self.conn.cursor() as cursor:
-                cursor.execute(query, (working_day,))
-            self.conn.commit()
-            return True
+            return self.execute_and_commit(query, (working_day,))
         except Exception as ex:
-            self.conn.rollback()
             raise Exception(f"CreateWorkingDay failed, reason: {str(ex)}")
-        finally:
-            if self.conn and not self.conn.closed:
-                self.conn.close()
@@ -0,0 +1,66 @@
+import numpy as np
+import pandas as pd
+
+# Fingerprints of the products currently held in ATMP_T17/ATMP_T18
+FINGERPRINT_TABLE = "atmp_cc_fingerprint"
+FINGERPRINT_COLUMNS = ["ID_PRODUCT", "FINGERPRINT"]
+
+
+def _row_hashes(frame, tag):
+    """Stable 64-bit hash of every row, salted with the row's position
+    within its product and with tag, so equal rows of different products,
+    positions or tables hash differently."""
+    position = frame.groupby("ID_PRODUCT", sort=False).cumcount()
+    salted = frame.assign(_POSITION=position.to_numpy(), _TABLE=tag)
+    # Stable for a given pandas version and column dtypes; a pandas upgrade
+    # at worst makes the next incremental run rewrite every product once
+    return pd.util.hash_pandas_object(salted, index=False).to_numpy()
+
+
+def fingerprint_products(atmp_t17, atmp_t18):
+    """One fingerprint per ID_PRODUCT over its ATMP_T17 and ATMP_T18 rows.
+
+    Returns an int64 Series indexed by product (int64 so it fits a bigint
+    column). Any change to a product's rows, including their order, changes
+    its fingerprint.
+    """
+    products = [atmp_t17["ID_PRODUCT"].to_numpy()]
+    hashes = [_row_hashes(atmp_t17, "T17")]
+    if not atmp_t18.empty:
+        products.append(atmp_t18["ID_PRODUCT"].to_numpy())
+        hashes.append(_row_hashes(atmp_t18, "T18"))
+    products = np.concatenate(products)
+    hashes = np.concatenate(hashes)
+
+    if len(products) == 0:
+        return pd.Series(
+            [], index=pd.Index([], name="ID_PRODUCT"), dtype="int64", name="FINGERPRINT"
+        )
+
+    # Sum the row hashes of every product, wrapping around at 2**64
+    codes, uniques = pd.factorize(products, use_na_sentinel=False)
+    order = np.argsort(codes, kind="stable")
+    starts = np.flatnonzero(np.r_[True, np.diff(codes[order]) != 0])
+    sums = np.add.reduceat(hashes[order], starts)
+    return pd.Series(
+        sums.view("int64"),
+        index=pd.Index(uniques[codes[order][starts]], name="ID_PRODUCT"),
+        name="FINGERPRINT",
+    )
+
+
+def changed_products(previous, current):
+    """Products of current that are new or whose fingerprint differs from
+    previous."""
+    locs = previous.index.get_indexer(current.index)
+    new = locs < 0
+    previous_values = (
+        previous.to_numpy()[np.where(new, 0, locs)] if len(previous) else 0
+    )
+    changed = new | (previous_values != current.to_numpy())
+    return current.index[changed]
+
+
+def removed_products(previous, seen):
+    """Products of previous that are no longer in the load."""
+    return previous.index[~previous.index.isin(seen)]
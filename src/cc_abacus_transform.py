@@ -0,0 +1,213 @@
+import numpy as np
+import pandas as pd
+
+# Columns of atmp_t18_cc_payment_schedule, in the order they are written
+ATMP_T18_COLUMNS = [
+    "WORKING_DAY",
+    "ID_PRODUCT",
+    "PRINCIPAL_PAYMENT_AMOUNT",
+    "PRINCIPAL_PAYMENT_DATE",
+    "INTEREST_PAYMENT_DATE",
+    "INTEREST_PAYMENT_AMOUNT",
+    "CUSTOMER_NUMBER",
+    "MINIMUM_PAYMENT",
+    "PENALTY_INTEREST_RATE",
+    "PENALTY_INTEREST_AMOUNT",
+    "PERIOD",
+    "DUE_DATE_DLQ",
+    "LAST_SUM_OF_PAYMENT",
+    "IS_PASTDUE",
+]
+
+# Columns copied as-is from the previous T18 snapshot into ATMP_T18
+T18_CARRIED_COLUMNS = ATMP_T18_COLUMNS[1:12]
+
+# Columns of ATMP_T17 that build_atmp_t17_t18 (re)writes
+T17_DERIVED_COLUMNS = [
+    "LAST_STATEMENT_BALANCE",
+    "CARD_BALANCE",
+    "NUMBER_OF_PAYMENTS_PAST_DUE",
+    "DPD_HO",
+    "IS_JOINT",
+    "DATE_SINCE_PAST_DUE",
+]
+
+
+def to_float(values):
+    """Column equivalent of the float() casts in the row path: values that
+    can't be parsed become 0, missing values stay NaN."""
+    if pd.api.types.is_numeric_dtype(values.dtype):
+        # Already typed when read from Centaur, nothing to parse
+        return values.astype("float64")
+    numbers = pd.to_numeric(values, errors="coerce")
+    unparsed = numbers.isna() & values.notna()
+    return numbers.mask(unparsed, 0.0).astype("float64")
+
+
+def to_int(values):
+    """Column equivalent of int(): truncates towards zero."""
+    numbers = pd.to_numeric(values).to_numpy(dtype="float64", na_value=np.nan)
+    return pd.Series(np.trunc(numbers).astype("int64"), index=values.index)
+
+
+class ATMPT18Accumulator:
+    """Column buffers for ATMP_T18 rows that are built one at a time.
+
+    Appending a row is O(1); the DataFrame is created once, with one
+    allocation per column, when the schedule is complete.
+    """
+
+    def __init__(self):
+        self._columns = {column: [] for column in ATMP_T18_COLUMNS}
+        self._rows = 0
+
+    def __len__(self):
+        return self._rows
+
+    def append(self, row):
+        for column, values in self._columns.items():
+            values.append(row.get(column))
+        self._rows += 1
+
+    def to_frame(self):
+        return pd.DataFrame(self._columns, columns=ATMP_T18_COLUMNS)
+
+
+class T18PreviousIndex:
+    """Previous-day T18 snapshot indexed by ID_PRODUCT.
+
+    The snapshot is stable-sorted by product once, so every product's rows
+    are one contiguous slice (still in snapshot order) found with a hash
+    lookup instead of a scan of the whole frame.
+    """
+
+    def __init__(self, t18_previous):
+        if t18_previous["ID_PRODUCT"].is_monotonic_increasing and (
+            t18_previous.index.equals(pd.RangeIndex(len(t18_previous)))
+        ):
+            # Already sorted, e.g. a memory-mapped snapshot from the cache
+            self.frame = t18_previous
+        else:
+            self.frame = t18_previous.sort_values("ID_PRODUCT", kind="stable")
+            self.frame = self.frame.reset_index(drop=True)
+
+        groups = self.frame.groupby("ID_PRODUCT", sort=False).indices
+        self._products = pd.Index(list(groups.keys()))
+        self._starts = np.array([rows[0] for rows in groups.values()], dtype="int64")
+        self._stops = np.array(
+            [rows[-1] + 1 for rows in groups.values()], dtype="int64"
+        )
+
+    def __len__(self):
+        return len(self.frame)
+
+    def __contains__(self, product):
+        return product in self._products
+
+    def get(self, product):
+        """Rows of a single product, empty if it has no history."""
+        loc = self._products.get_indexer([product])[0]
+        if loc < 0:
+            return self.frame.iloc[0:0]
+        return self.frame.iloc[self._starts[loc] : self._stops[loc]]
+
+    def take(self, products):
+        """Positions of the history rows of many products at once.
+
+        Returns (owner, rows): owner[i] is the position in products that
+        frame row rows[i] belongs to, grouped by owner in products order.
+        """
+        if len(self._products) == 0:
+            return np.empty(0, dtype="int64"), np.empty(0, dtype="int64")
+        locs = self._products.get_indexer(products)
+        found = locs >= 0
+        safe_locs = np.where(found, locs, 0)
+        starts = np.where(found, self._starts[safe_locs], 0)
+        lengths = np.where(found, self._stops[safe_locs] - starts, 0)
+
+        owner = np.repeat(np.arange(len(locs)), lengths)
+        # Ragged arange: starts[owner] + running offset within each group
+        group_offsets = np.repeat(np.cumsum(lengths) - lengths, lengths)
+        rows = np.repeat(starts, lengths) + np.arange(lengths.sum()) - group_offsets
+        return owner, rows
+
+
+def build_atmp_t17_t18(atmp_t17, t18_previous, working_day):
+    """Vectorized version of CC_AbacusDA.build_atmp_t18_data_table.
+
+    Updates the derived columns of atmp_t17 in place and returns the new
+    ATMP_T18 payment schedule built from the previous T18 snapshot of every
+    delinquent card. t18_previous is either the snapshot frame or a
+    T18PreviousIndex over it.
+    """
+    return build_atmp_t17_t18_with_cards(atmp_t17, t18_previous, working_day)[0]
+
+
+def build_atmp_t17_t18_with_cards(atmp_t17, t18_previous, working_day):
+    """build_atmp_t17_t18, also returning the position in atmp_t17 of the
+    card every ATMP_T18 row belongs to."""
+    if not isinstance(t18_previous, T18PreviousIndex):
+        t18_previous = T18PreviousIndex(t18_previous)
+    working_day = pd.Timestamp(working_day)
+
+    # Read the source values before any of them get overwritten
+    lsb = to_float(atmp_t17["LAST_STATEMENT_BALANCE"])
+    sop = to_float(atmp_t17["SUM_OF_PAYMENTS"])
+    negative = (atmp_t17["LAST_BALANCE_SIGN"] != "0").to_numpy()
+    days_past_due = pd.to_numeric(atmp_t17["DAYS_PAST_DUE"]).to_numpy(
+        dtype="float64", na_value=np.nan
+    )
+    delinquent = days_past_due > 0
+
+    lsb = lsb.where(~negative, -1 * lsb)
+
+    atmp_t17["LAST_STATEMENT_BALANCE"] = lsb
+    atmp_t17["CARD_BALANCE"] = lsb - sop
+    atmp_t17["NUMBER_OF_PAYMENTS_PAST_DUE"] = 0
+    atmp_t17["DPD_HO"] = 0
+    atmp_t17["IS_JOINT"] = 0
+
+    if not delinquent.any():
+        return pd.DataFrame(columns=ATMP_T18_COLUMNS), np.empty(0, dtype="int64")
+
+    delinquent_days = np.trunc(days_past_due[delinquent]).astype("int64")
+    atmp_t17.loc[delinquent, "DATE_SINCE_PAST_DUE"] = working_day - pd.to_timedelta(
+        delinquent_days, unit="d"
+    )
+
+    # One row per (delinquent card, history row), in ATMP_T17 order and then
+    # snapshot order, like the row path
+    positions = np.flatnonzero(delinquent)
+    owner, rows = t18_previous.take(atmp_t17["ID_PRODUCT"].to_numpy()[positions])
+    schedule = t18_previous.frame.iloc[rows][
+        T18_CARRIED_COLUMNS + ["LAST_SUM_OF_PAYMENT"]
+    ].reset_index(drop=True)
+    schedule = schedule.rename(
+        columns={"LAST_SUM_OF_PAYMENT": "T18_LAST_SUM_OF_PAYMENT"}
+    )
+    cards = positions[owner]
+    schedule["T17_PERIOD"] = atmp_t17["PERIOD"].to_numpy()[cards]
+    schedule["T17_SUM_OF_PAYMENTS"] = atmp_t17["SUM_OF_PAYMENTS"].to_numpy()[cards]
+
+    same_period = (
+        to_int(schedule["PERIOD"]).to_numpy()
+        == to_int(schedule["T17_PERIOD"]).to_numpy()
+    )
+    due = (pd.to_datetime(schedule["PRINCIPAL_PAYMENT_DATE"]) < working_day).to_numpy()
+
+    schedule["WORKING_DAY"] = working_day
+    schedule["LAST_SUM_OF_PAYMENT"] = np.where(
+        same_period,
+        to_float(schedule["T17_SUM_OF_PAYMENTS"]),
+        to_float(schedule["T18_LAST_SUM_OF_PAYMENT"]),
+    )
+    schedule["IS_PASTDUE"] = np.where(same_period & ~due, "0", "1")
+
+    # Count the past-due instalments of every card and write them back
+    past_due = (schedule["IS_PASTDUE"] == "1").to_numpy()
+    counts = np.bincount(owner, weights=past_due, minlength=len(positions))
+    atmp_t17.iloc[
+        positions, atmp_t17.columns.get_loc("NUMBER_OF_PAYMENTS_PAST_DUE")
+    ] = counts.astype("int64")
+
+    return schedule[ATMP_T18_COLUMNS], cards
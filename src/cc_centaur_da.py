@@ -1,16 +1,161 @@
+import logging
 import os
-import pymssql
+import numpy as np
 import pandas as pd
 from datetime import datetime
 import dotenv
 
+from .connection_pool import centaur_pool
+from .metrics import instrumented, metrics
+
 dotenv.load_dotenv()
 
+# Columns of vw_CC_AbacusData, in the order get_cc_data selects them
+CC_DATA_COLUMNS = [
+    "WORKING_DAY",
+    "ID_PRODUCT",
+    "AMOUNT_PAST_DUE",
+    "DATE_SINCE_PD_OL",
+    "DAYS_PAST_DUE",
+    "DELINQUENCY_AMOUNT_MP",
+    "LAST_UNPAID_DUE_DATE_MP",
+    "MINIMUM_PAYMENT",
+    "OL_DA",
+    "OL_DPD",
+    "ACCOUNT_NUMBER",
+    "BRANCH_CODE",
+    "CARD_NUMBER",
+    "CUSTOMER_NUMBER",
+    "SUM_OF_PAYMENTS",
+    "LAST_STATEMENT_BALANCE",
+    "CARD_LIMIT",
+    "ACCOUNT_CODE",
+    "ACCOUNT_CURRENCY",
+    "ACCOUNT_SEQUENCE",
+    "ID_PRODUCT_TYPE",
+    "CARD_EXPIRE_DATE",
+    "CARD_CCY",
+    "NEXT_PAYMENT_DATE",
+    "STANDART_INTEREST_RATE",
+    "PENALTY_INTEREST_RATE",
+    "CASHWITHDRAWAL_INTEREST_RATE",
+    "LAST_BALANCE_SIGN",
+    "PERIOD",
+]
+
+# Declared type of every column of vw_CC_AbacusData. Applied as the data is
+# read, so every chunk comes out with the same compact types no matter which
+# values (or NULLs) it happens to contain, and nothing downstream has to
+# parse values again
+CC_DATA_SCHEMA = {
+    "WORKING_DAY": "datetime64[ns]",
+    "ID_PRODUCT": "object",
+    "AMOUNT_PAST_DUE": "float64",
+    "DATE_SINCE_PD_OL": "datetime64[ns]",
+    "DAYS_PAST_DUE": "Int32",
+    "DELINQUENCY_AMOUNT_MP": "float64",
+    "LAST_UNPAID_DUE_DATE_MP": "datetime64[ns]",
+    "MINIMUM_PAYMENT": "float64",
+    "OL_DA": "float64",
+    "OL_DPD": "Int32",
+    "ACCOUNT_NUMBER": "object",
+    "BRANCH_CODE": "category",
+    "CARD_NUMBER": "object",
+    "CUSTOMER_NUMBER": "object",
+    "SUM_OF_PAYMENTS": "float64",
+    "LAST_STATEMENT_BALANCE": "float64",
+    "CARD_LIMIT": "float64",
+    "ACCOUNT_CODE": "category",
+    "ACCOUNT_CURRENCY": "category",
+    "ACCOUNT_SEQUENCE": "object",
+    "ID_PRODUCT_TYPE": "category",
+    "CARD_EXPIRE_DATE": "datetime64[ns]",
+    "CARD_CCY": "category",
+    "NEXT_PAYMENT_DATE": "datetime64[ns]",
+    "STANDART_INTEREST_RATE": "float64",
+    "PENALTY_INTEREST_RATE": "float64",
+    "CASHWITHDRAWAL_INTEREST_RATE": "float64",
+    "LAST_BALANCE_SIGN": "category",
+    "PERIOD": "Int32",
+}
+
+SCHEMA_VIOLATION_COLUMNS = ["COLUMN", "ROW", "ID_PRODUCT", "VALUE", "EXPECTED"]
+
+
+def _to_dtype(values, dtype):
+    if dtype == "float64":
+        return pd.to_numeric(values, errors="coerce").astype("float64")
+    if dtype == "Int32":
+        numbers = pd.to_numeric(values, errors="coerce").to_numpy(
+            dtype="float64", na_value=np.nan
+        )
+        # Fractions and values out of the int32 range don't fit either
+        fits = (np.trunc(numbers) == numbers) & (np.abs(numbers) < 2**31)
+        return pd.Series(
+            pd.array(np.where(fits, numbers, np.nan), dtype="Float64"),
+            index=values.index,
+        ).astype("Int32")
+    if dtype == "datetime64[ns]":
+        return pd.to_datetime(values, errors="coerce").astype("datetime64[ns]")
+    return values.astype(dtype)
+
+
+def conform_cc_data(df):
+    """Converts df to CC_DATA_SCHEMA in one pass per column.
+
+    Values that don't fit their column's type become NULL instead of raising
+    halfway through; they are returned together as a violations frame with
+    SCHEMA_VIOLATION_COLUMNS.
+    """
+    violations = []
+    columns = {}
+    for column in df.columns:
+        values = df[column]
+        dtype = CC_DATA_SCHEMA.get(column)
+        if dtype is None or values.dtype == dtype:
+            columns[column] = values
+            continue
+
+        converted = _to_dtype(values, dtype)
+        lost = (converted.isna() & values.notna()).to_numpy()
+        if lost.any():
+            rows = np.flatnonzero(lost)
+            violations.append(
+                pd.DataFrame(
+                    {
+                        "COLUMN": column,
+                        "ROW": rows,
+                        "ID_PRODUCT": df["ID_PRODUCT"].to_numpy()[rows]
+                        if "ID_PRODUCT" in df.columns
+                        else None,
+                        "VALUE": values.to_numpy()[rows],
+                        "EXPECTED": dtype,
+                    }
+                )
+            )
+        columns[column] = converted
+
+    conformed = pd.DataFrame(columns, index=df.index)
+    if violations:
+        return conformed, pd.concat(violations, ignore_index=True)
+    return conformed, pd.DataFrame(columns=SCHEMA_VIOLATION_COLUMNS)
+
 
+@instrumented("centaur", exclude=("connection", "parse_crown_date"))
 class CCCentaurDA:
     def __init__(self):
         # Connection string fetched from environment variable or config
         self.connection_string = os.getenv("CentaurConStr")
+        # Rows per chunk when streaming vw_CC_AbacusData, 0 reads it in one go
+        self.chunk_size = int(os.getenv("CentaurChunkSize", "0"))
+        # Both queries of a run share one pooled session instead of leaking one each
+        self.pool = centaur_pool()
+        # Values of vw_CC_AbacusData that didn't fit CC_DATA_SCHEMA, per read
+        self.schema_violations = []
+
+    def connection(self):
+        """Borrows a pooled Centaur connection for the duration of a with block."""
+        return self.pool.connection()
 
     @property
     def centaur_working_day(self):
@@ -21,13 +166,11 @@ class CCCentaurDA:
         """Equivalent to the GetDelinquecyWorkingDay method in C#."""
         sql_query = "SELECT * FROM vw_CC_LastDLQ"
         try:
-            # Use pyodbc to connect to SQL Server
-            conn = pymssql.connect(self.connection_string)
-            with conn.cursor() as cursor:
+            with self.connection() as conn, conn.cursor(as_dict=True) as cursor:
                 cursor.execute(sql_query)
                 row = cursor.fetchone()
                 if row:
-                    working_day = self.parse_crown_date(str(row.FILE_DATE))
+                    working_day = self.parse_crown_date(str(row["FILE_DATE"]))
                     return working_day
                 else:
                     raise Exception("Delinquency date not OK!")
@@ -36,23 +179,58 @@ class CCCentaurDA:
 
     def get_cc_data(self):
         """Equivalent to the GetCCData method in C#."""
-        sql_query = """
-        SELECT WORKING_DAY, ID_PRODUCT, AMOUNT_PAST_DUE, DATE_SINCE_PD_OL, DAYS_PAST_DUE, DELINQUENCY_AMOUNT_MP,
-               LAST_UNPAID_DUE_DATE_MP, MINIMUM_PAYMENT, OL_DA, OL_DPD, ACCOUNT_NUMBER, BRANCH_CODE, CARD_NUMBER, 
-               CUSTOMER_NUMBER, SUM_OF_PAYMENTS, LAST_STATEMENT_BALANCE, CARD_LIMIT, ACCOUNT_CODE, ACCOUNT_CURRENCY, 
-               ACCOUNT_SEQUENCE, ID_PRODUCT_TYPE, CARD_EXPIRE_DATE, CARD_CCY, NEXT_PAYMENT_DATE, 
-               STANDART_INTEREST_RATE, PENALTY_INTEREST_RATE, CASHWITHDRAWAL_INTEREST_RATE, 
-               LAST_BALANCE_SIGN, PERIOD 
-        FROM vw_CC_AbacusData
-        """
+        sql_query = self.cc_data_query()
         try:
-            # Use pyodbc to fetch the data and convert it to a pandas DataFrame
-            conn = pymssql.connect(self.connection_string)
-            df_cc_data = pd.read_sql(sql_query, conn)
-            return df_cc_data
+            # Fetch the data and convert it to a pandas DataFrame
+            with self.connection() as conn:
+                df_cc_data = pd.read_sql(sql_query, conn)
+            return self.apply_cc_data_dtypes(df_cc_data)
         except Exception as ex:
             raise Exception(f"get_cc_data() failed, reason: {str(ex)}")
 
+    def iter_cc_data(self, chunk_size=None):
+        """Streams vw_CC_AbacusData as DataFrames of at most chunk_size rows."""
+        chunk_size = chunk_size or self.chunk_size
+        if chunk_size <= 0:
+            raise ValueError("iter_cc_data() needs a positive chunk size")
+
+        try:
+            # The connection stays borrowed until the last chunk is read
+            with self.connection() as conn, conn.cursor() as cursor:
+                # Ordered, so the loader can keep every product in one chunk
+                cursor.execute(self.cc_data_query(order_by_product=True))
+                # pymssql reads the result set off the wire as it is fetched, so
+                # only one chunk of rows is held in memory at a time
+                while True:
+                    rows = cursor.fetchmany(chunk_size)
+                    if not rows:
+                        break
+                    chunk = pd.DataFrame.from_records(rows, columns=CC_DATA_COLUMNS)
+                    yield self.apply_cc_data_dtypes(chunk)
+        except Exception as ex:
+            raise Exception(f"iter_cc_data() failed, reason: {str(ex)}")
+
+    @staticmethod
+    def cc_data_query(order_by_product=False):
+        order_by = "ORDER BY ID_PRODUCT" if order_by_product else ""
+        return f"""
+        SELECT {", ".join(CC_DATA_COLUMNS)}
+        FROM vw_CC_AbacusData
+        {order_by}
+        """
+
+    def apply_cc_data_dtypes(self, df):
+        df, violations = conform_cc_data(df)
+        if not violations.empty:
+            self.schema_violations.append(violations)
+            metrics.count("centaur.schema_violations", len(violations))
+            counts = violations["COLUMN"].value_counts()
+            logging.warning(
+                f"{len(violations)} values of vw_CC_AbacusData did not match the "
+                f"schema and were loaded as NULL: {counts.to_dict()}"
+            )
+        return df
+
     def parse_crown_date(self, value):
         """Equivalent to the ParseCrownDate method in C#."""
         try:
@@ -0,0 +1,54 @@
+import os
+import threading
+
+import dotenv
+
+dotenv.load_dotenv()
+
+# Timeouts of the Centaur SOAP operations, in seconds
+TRANSFER_PAYLINK_TIMEOUT = 120  # 2 minutes
+PROCESS_DELIQUENCY_TIMEOUT = 900  # 15 minutes
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def create_centaur_client(wsdl):
+    """Builds a zeep client for the Centaur ASMX service.
+
+    The WSDL and its imports are cached: in memory by default, or across
+    runs in the SQLite file named by CentaurWsdlCache. CentaurWsdlFile can
+    point at a snapshot of the WSDL on disk to skip the download entirely.
+    """
+    # zeep and requests are only imported once a SOAP call is made
+    from requests import Session
+    from zeep import Client
+    from zeep.cache import InMemoryCache, SqliteCache
+    from zeep.transports import Transport
+
+    cache_path = os.getenv("CentaurWsdlCache")
+    if cache_path:
+        cache_timeout = int(os.getenv("CentaurWsdlCacheTimeout", "86400"))
+        cache = SqliteCache(path=cache_path, timeout=cache_timeout)
+    else:
+        cache = InMemoryCache()
+
+    # One keep-alive session for the WSDL download and every operation
+    transport = Transport(session=Session(), cache=cache)
+    return Client(wsdl=os.getenv("CentaurWsdlFile") or wsdl, transport=transport)
+
+
+def centaur_client(wsdl):
+    """Process-wide client for wsdl; the WSDL is parsed once per process.
+
+    Operation timeouts are set per call with client.transport.settings().
+    """
+    with _clients_lock:
+        if wsdl not in _clients:
+            _clients[wsdl] = create_centaur_client(wsdl)
+        return _clients[wsdl]
+
+
+def clear_centaur_clients():
+    with _clients_lock:
+        _clients.clear()
@@ -0,0 +1,64 @@
+import numpy as np
+import pandas as pd
+
+
+def _text_column(series):
+    """utf-8 bytes of a column of strings, as a fixed-width array plus a null
+    mask; None if the column holds anything else."""
+    if pd.api.types.infer_dtype(series, skipna=True) not in ("string", "empty"):
+        return None
+    values = series.to_numpy(dtype=object)
+    mask = pd.isna(values)
+    nulls = values[mask]
+    if all(value is None for value in nulls):
+        null = None
+    elif all(isinstance(value, float) for value in nulls):
+        null = np.nan
+    else:
+        return None
+    text = np.where(mask, "", values).astype(str)
+    encoded = np.char.encode(text, "utf-8")
+    if encoded.dtype.itemsize == 0:
+        encoded = encoded.astype("S1")
+    return {"kind": "text", "null": null}, [encoded, mask]
+
+
+def encode_column(series):
+    """(layout, arrays) of a column: how to rebuild it and the arrays that go
+    into shared memory or files. Columns with no fixed-width layout are pickled."""
+    dtype = series.dtype
+    if isinstance(dtype, pd.CategoricalDtype):
+        layout = {"kind": "category", "categories": dtype.categories}
+        layout["ordered"] = dtype.ordered
+        return layout, [series.cat.codes.to_numpy()]
+    if isinstance(series.array, pd.api.extensions.ExtensionArray) and hasattr(
+        dtype, "numpy_dtype"
+    ):
+        # Int32, Float64, boolean, ...: values plus a mask of the NAs
+        mask = series.isna().to_numpy()
+        data = series.to_numpy(dtype=dtype.numpy_dtype, na_value=0)
+        return {"kind": "masked", "dtype": dtype}, [data, mask]
+    if isinstance(dtype, np.dtype) and dtype.kind in "biufcmM":
+        return {"kind": "array"}, [series.to_numpy()]
+    if dtype == object:
+        text = _text_column(series)
+        if text is not None:
+            return text
+    return {"kind": "pickled", "values": series.array}, []
+
+
+def decode_column(layout, arrays):
+    kind = layout["kind"]
+    if kind == "array":
+        return arrays[0]
+    if kind == "category":
+        return pd.Categorical.from_codes(
+            arrays[0], categories=layout["categories"], ordered=layout["ordered"]
+        )
+    if kind == "masked":
+        return layout["dtype"].construct_array_type()(arrays[0], arrays[1])
+    if kind == "text":
+        values = np.char.decode(arrays[0], "utf-8").astype(object)
+        values[arrays[1]] = layout["null"]
+        return values
+    return layout["values"]
@@ -0,0 +1,203 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import dotenv
+import psycopg2
+
+dotenv.load_dotenv()
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+class ConnectionPool:
+    """Thread-safe pool of database connections.
+
+    connection() lends a connection for the duration of a with block and
+    takes it back afterwards, rolling back anything left uncommitted. The
+    checkout is re-entrant per thread: nested with blocks in the same thread
+    share the outer block's connection, so a sequential run keeps reusing one
+    connection while concurrent threads each get their own.
+
+    Connections that sat idle for longer than ping_interval seconds are
+    checked with ping before being lent out again, and dropped if it fails.
+    """
+
+    def __init__(
+        self,
+        connect,
+        max_size=4,
+        is_healthy=None,
+        reset=None,
+        close=None,
+        ping=None,
+        ping_interval=30,
+        checkout_timeout=60,
+    ):
+        self._connect = connect
+        self.max_size = max_size
+        self._is_healthy = is_healthy or (lambda conn: True)
+        self._reset = reset or (lambda conn: conn.rollback())
+        self._close = close or (lambda conn: conn.close())
+        self._ping = ping
+        self.ping_interval = ping_interval
+        self.checkout_timeout = checkout_timeout
+
+        self._idle = []
+        self._size = 0
+        self._available = threading.Condition()
+        self._local = threading.local()
+        self._closed = False
+        self.connects = 0
+
+    @contextmanager
+    def connection(self):
+        held = getattr(self._local, "held", None)
+        if held is not None:
+            self._local.depth += 1
+            try:
+                yield held
+            finally:
+                self._local.depth -= 1
+            return
+
+        conn = self._checkout()
+        self._local.held, self._local.depth = conn, 1
+        try:
+            yield conn
+        finally:
+            # A generator holding a connection may be closed from another thread
+            if getattr(self._local, "held", None) is conn:
+                self._local.held = None
+            self._checkin(conn)
+
+    def _checkout(self):
+        deadline = time.monotonic() + self.checkout_timeout
+        with self._available:
+            while True:
+                while self._idle:
+                    conn, returned_at = self._idle.pop()
+                    if self._is_usable(conn, returned_at):
+                        return conn
+                    self._discard(conn)
+                if self._size < self.max_size:
+                    self._size += 1
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise PoolTimeout(
+                        f"No connection available within {self.checkout_timeout}s"
+                    )
+                self._available.wait(remaining)
+
+        try:
+            conn = self._connect()
+            self.connects += 1
+            return conn
+        except Exception:
+            with self._available:
+                self._size -= 1
+                self._available.notify()
+            raise
+
+    def _is_usable(self, conn, returned_at):
+        try:
+            if not self._is_healthy(conn):
+                return False
+            if self._ping and time.monotonic() - returned_at > self.ping_interval:
+                self._ping(conn)
+            return True
+        except Exception:
+            return False
+
+    def _checkin(self, conn):
+        try:
+            healthy = self._is_healthy(conn)
+            if healthy:
+                self._reset(conn)
+        except Exception:
+            healthy = False
+
+        with self._available:
+            if healthy and not self._closed:
+                self._idle.append((conn, time.monotonic()))
+            else:
+                self._discard(conn)
+            self._available.notify()
+
+    def _discard(self, conn):
+        self._size -= 1
+        try:
+            self._close(conn)
+        except Exception:
+            pass
+
+    def close_all(self):
+        """Closes the idle connections; borrowed ones are closed on return."""
+        with self._available:
+            self._closed = True
+            while self._idle:
+                self._discard(self._idle.pop()[0])
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(name, factory):
+    """Process-wide pool registered under name, created by factory on first use."""
+    with _pools_lock:
+        if name not in _pools:
+            _pools[name] = factory()
+        return _pools[name]
+
+
+def close_pools():
+    with _pools_lock:
+        for pool in _pools.values():
+            pool.close_all()
+        _pools.clear()
+
+
+def select_one(conn):
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT 1")
+        cursor.fetchone()
+
+
+def abacus_pool():
+    def create():
+        connection_string = os.getenv("AbacusConStr")
+        return ConnectionPool(
+            lambda: psycopg2.connect(connection_string),
+            max_size=int(os.getenv("AbacusPoolSize", "4")),
+            is_healthy=lambda conn: conn.closed == 0,
+            # A resident process may keep a connection idle between runs
+            ping=select_one,
+        )
+
+    return get_pool("abacus", create)
+
+
+def centaur_pool():
+    def create():
+        # Only a run that reads Centaur loads the driver
+        import pymssql
+
+        connection_string = os.getenv("CentaurConStr")
+        login_timeout = int(os.getenv("CentaurLoginTimeout", "60"))
+        # 0 lets a query run as long as it needs
+        query_timeout = int(os.getenv("CentaurQueryTimeout", "0"))
+
+        return ConnectionPool(
+            lambda: pymssql.connect(
+                connection_string, login_timeout=login_timeout, timeout=query_timeout
+            ),
+            max_size=int(os.getenv("CentaurPoolSize", "2")),
+            ping=select_one,
+        )
+
+    return get_pool("centaur", create)
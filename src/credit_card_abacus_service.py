@@ -1,17 +1,38 @@
 import logging
 import os
-
-from zeep import Client
-from zeep.transports import Transport
-from requests import Session
-from src.abacus_cc_loader_from_centaur import (
-    AbacusCCLoaderFromCentaur,
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from src import load_gate
+from src.centaur_client import (
+    PROCESS_DELIQUENCY_TIMEOUT,
+    TRANSFER_PAYLINK_TIMEOUT,
+    centaur_client,
 )
+from src.metrics import emit_run_metrics, instrumented, metrics
+from src.run_state import clear_run_state
+
+# Held while a run is going, so a process never runs two loads at once
+_run_lock = threading.Lock()
+
+
+def loader():
+    """AbacusCCLoaderFromCentaur, imported the first time a run gets past
+    the gating checks: it brings in pandas, pymssql and the DAs, which a
+    tick with nothing to load never needs."""
+    from src.abacus_cc_loader_from_centaur import AbacusCCLoaderFromCentaur
 
+    return AbacusCCLoaderFromCentaur
 
+
+@instrumented("service")
 class CreditCardAbacusService:
     def __init__(self):
         self.centaur_url = os.getenv("CentaurServiceUrl")
+        # "async" runs ProcessDeliquency in the background while the load is prepared
+        self.delinquency_mode = os.getenv("DelinquencyMode", "sync").lower()
+        self.delinquency_poll_interval = int(os.getenv("DelinquencyPollInterval", "30"))
 
         # Setup logger for event logging (simulating event log in Python)
         logging.basicConfig(
@@ -23,24 +44,35 @@ class CreditCardAbacusService:
         self.logger.info("CreditCardAbacusService initialized.")
 
     def run(self):
-        """Run the main tasks of the service when triggered."""
-        self.logger.info("CreditCardAbacusService started by EKS CronJob.")
-        self.transfer_paylink_file()
-        self.do_load()
+        """Run the main tasks of the service when triggered. Returns False
+        without doing anything while another run of the process is going."""
+        if not _run_lock.acquire(blocking=False):
+            self.logger.warning("Previous run still in progress, skipping this one.")
+            return False
+        try:
+            self.logger.info("CreditCardAbacusService started by EKS CronJob.")
+            # Working days and load statuses are probed once per run
+            clear_run_state()
+            metrics.reset()
+            try:
+                self.transfer_paylink_file()
+                self.do_load()
+            finally:
+                emit_run_metrics(self.logger)
+        finally:
+            _run_lock.release()
 
         self.logger.info("CreditCardAbacusService run completed.")
+        return True
 
     def transfer_paylink_file(self):
         try:
-            # Create a session and transport with a timeout of 2 minutes (120 seconds)
-            session = Session()
-            transport = Transport(session=session, timeout=120)  # Timeout of 2 minutes
-
-            # Create a zeep client using the WSDL URL and custom transport
-            client = Client(wsdl=self.centaur_url, transport=transport)
+            # Shared client, the WSDL is only fetched and parsed once
+            client = centaur_client(self.centaur_url)
 
             # Call the transfer_paylink_file method from the SOAP service
-            result = client.service.TransferPaylinkFile()
+            with client.transport.settings(timeout=TRANSFER_PAYLINK_TIMEOUT):
+                result = client.service.TransferPaylinkFile()
             if result:
                 self.logger.info("Pay link file transferred!")
             else:
@@ -51,30 +83,24 @@ class CreditCardAbacusService:
     def do_load(self):
         """Mimics the DoLoad method from C#."""
         try:
-            if AbacusCCLoaderFromCentaur.is_load_fin():
+            if load_gate.is_load_fin():
                 self.logger.info(
                     "Abacus Finished for max working day, Starting Delinquency..."
                 )
 
-                if AbacusCCLoaderFromCentaur.is_ok_to_call_deliquency():
+                if load_gate.is_ok_to_call_deliquency():
                     self.logger.info(
                         "Abacus Finished for this day, Starting Delinquency..."
                     )
 
-                    session = Session()
+                    delinquency_processed, prepared = self.process_delinquency()
 
-                    transport = Transport(
-                        session=session, timeout=900
-                    )  # Timeout of 15 minutes
-
-                    client = Client(wsdl=self.centaur_url, transport=transport)
-
-                    centaur_service = client.service
-
-                    if centaur_service.ProcessDeliquency():
+                    if delinquency_processed:
                         self.logger.info("Delinquency Finished, Starting Load...")
+                        AbacusCCLoaderFromCentaur = loader()
                         try:
-                            load_status = AbacusCCLoaderFromCentaur.load(True)
+                            load_status = AbacusCCLoaderFromCentaur.load(True, prepared)
+                            metrics.count(f"service.load_status.{load_status}")
                             if (
                                 load_status
                                 == AbacusCCLoaderFromCentaur.LoadStatus.WAITING_FOR_FIN
@@ -115,3 +141,40 @@ class CreditCardAbacusService:
                 self.logger.info("Waiting for Abacus! Trying again later.")
         except Exception as ex:
             self.logger.error(f"Error during load: {str(ex)}")
+
+    def process_delinquency(self):
+        """Calls ProcessDeliquency, returns its result and the prepared load
+        (None unless DelinquencyMode is async)."""
+        if self.delinquency_mode == "async":
+            return self.process_delinquency_async()
+        return self.call_process_delinquency(), None
+
+    def call_process_delinquency(self):
+        client = centaur_client(self.centaur_url)
+        with client.transport.settings(timeout=PROCESS_DELIQUENCY_TIMEOUT):
+            return client.service.ProcessDeliquency()
+
+    def process_delinquency_async(self):
+        started = time.monotonic()
+        with ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="delinquency"
+        ) as executor:
+            delinquency = executor.submit(self.call_process_delinquency)
+
+            # Get the Abacus side ready while Centaur is busy
+            prepared = None
+            try:
+                prepared = loader().prepare_load()
+                self.logger.info("Load prepared, waiting for Delinquency...")
+            except Exception as ex:
+                self.logger.warning(f"Could not prepare the load: {str(ex)}")
+
+            while True:
+                try:
+                    result = delinquency.result(timeout=self.delinquency_poll_interval)
+                    return result, prepared
+                except TimeoutError:
+                    self.logger.info(
+                        "Delinquency still running after "
+                        f"{time.monotonic() - started:.0f}s..."
+                    )
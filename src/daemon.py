@@ -0,0 +1,110 @@
+import logging
+import os
+import random
+import signal
+import sys
+import threading
+import time
+
+from .centaur_client import clear_centaur_clients
+from .connection_pool import close_pools
+
+
+class Daemon:
+    """Keeps the service resident and runs it every interval seconds, each
+    run delayed by a random 0 to jitter seconds, until stop() is called or
+    the process receives SIGTERM (or SIGINT).
+
+    Runs never overlap: the next one is scheduled only once the previous has
+    returned, and ticks missed while a long load ran are skipped instead of
+    run back to back. A signal lets the current run finish and stops before
+    the next one. Whatever the service keeps per process (the connection
+    pools, the zeep client, prepared statements, transform workers) stays
+    warm between runs; the working day and load statuses are still probed
+    anew by every run.
+    """
+
+    def __init__(self, service, interval=None, jitter=None, clock=time.monotonic):
+        self.service = service
+        # Defaults to the 20 minutes of the CronJob it replaces
+        self.interval = float(
+            interval if interval is not None else os.getenv("DaemonInterval", "1200")
+        )
+        self.jitter = float(
+            jitter if jitter is not None else os.getenv("DaemonJitter", "60")
+        )
+        self.runs = 0
+        self._clock = clock
+        self._random = random.Random()
+        self._stop = threading.Event()
+        self.logger = logging.getLogger("CreditCardAbacusService")
+
+    def stop(self):
+        self._stop.set()
+
+    @property
+    def stopping(self):
+        return self._stop.is_set()
+
+    def _on_signal(self, signum, frame):
+        self.logger.info(
+            f"Received {signal.Signals(signum).name}, stopping after the current run."
+        )
+        self._stop.set()
+
+    def run(self):
+        """Serves until stopped, with SIGTERM and SIGINT handled, then closes
+        the pools, the zeep client and the transform workers. Must be called
+        from the main thread."""
+        previous = {
+            signum: signal.signal(signum, self._on_signal)
+            for signum in (signal.SIGTERM, signal.SIGINT)
+        }
+        try:
+            self.serve()
+        finally:
+            for signum, handler in previous.items():
+                signal.signal(signum, handler)
+            close_pools()
+            clear_centaur_clients()
+            # Loaded with the first load; importing it here would bring
+            # pandas into a daemon that never loaded anything
+            sharded_transform = sys.modules.get(f"{__package__}.sharded_transform")
+            if sharded_transform is not None:
+                sharded_transform.shutdown_transform_executors()
+
+    def serve(self):
+        self.logger.info(
+            f"CreditCardAbacusService daemon started, running every "
+            f"{self.interval:g}s (+0-{self.jitter:g}s)."
+        )
+        tick = self._clock()
+        while True:
+            delay = tick - self._clock() + self._random.uniform(0, self.jitter)
+            if self._stop.wait(max(delay, 0)):
+                break
+            self.run_once()
+            tick = self.next_tick(tick)
+        self.logger.info("CreditCardAbacusService daemon stopped.")
+
+    def run_once(self):
+        self.runs += 1
+        try:
+            self.service.run()
+        except Exception as ex:
+            # One failed run must not stop the daemon
+            self.logger.error(f"Error during run: {str(ex)}")
+
+    def next_tick(self, tick):
+        """The first tick after now on the interval grid starting at tick."""
+        now = self._clock()
+        tick += self.interval
+        skipped = 0
+        while tick <= now:
+            tick += self.interval
+            skipped += 1
+        if skipped:
+            self.logger.warning(
+                f"Run took longer than the interval, skipping {skipped} tick(s)."
+            )
+        return tick
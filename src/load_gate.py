@@ -0,0 +1,26 @@
+import os
+from datetime import datetime
+
+from .connection_pool import abacus_pool
+from .run_state import get_run_state
+
+# The checks a run makes before it moves any data. They only need psycopg2
+# and the standard library, so a tick that finds nothing to do exits without
+# importing pandas, pymssql or the DAs.
+
+
+def abacus_run_state():
+    """The run's RunState of the SchemaUsed schema, probed once per run."""
+    return get_run_state(os.getenv("SchemaUsed"), abacus_pool().connection)
+
+
+def is_load_fin():
+    """Whether Abacus has finished FIN for its latest working day."""
+    return abacus_run_state().is_load_fin()
+
+
+def is_ok_to_call_deliquency():
+    """Whether Abacus' next working day hasn't passed yet, same as
+    CC_AbacusDA.call_deliquency."""
+    next_working_day = abacus_run_state().next_working_day
+    return (datetime.now().date() - next_working_day.date()).days <= 0
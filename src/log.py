@@ -1,4 +1,7 @@
+import os
+
 import pandas as pd
+from psycopg2.extras import execute_values
 
 
 class Log:
@@ -13,24 +16,16 @@ class Log:
 
     def write(self, con, schema_used):
         cursor = con.cursor()
-        command_text = f"""
-            INSERT INTO {schema_used}.l01_logabacus (LOAD_DATE, MODULE, START_TIME, END_TIME, NO_RECORDS, STATUS, ERROR, AUTOID) 
-            VALUES (%s, %s, %s, %s, %s, %s, %s, nextval('{schema_used}.
-            '))
-        """
 
         try:
+            sequence = Log.sequence(cursor, schema_used)
+            command_text = f"""
+                INSERT INTO {schema_used}.l01_logabacus (LOAD_DATE, MODULE, START_TIME, END_TIME, NO_RECORDS, STATUS, ERROR, AUTOID) 
+                VALUES (%s, %s, %s, %s, %s, %s, %s, nextval('{sequence}'))
+            """
             cursor.execute(
                 command_text,
-                (
-                    self.LOAD_DATE,
-                    self.MODULE,
-                    self.START,
-                    self.END,
-                    self.NO_RECORDS,
-                    self.STATUS,
-                    self.ERROR,
-                ),
+                self.as_tuple(),
             )
             con.commit()
             rows_affected = cursor.rowcount
@@ -39,11 +34,60 @@ class Log:
         except Exception as ex:
             con.rollback()
             raise Exception(f"Failed to write log: {str(ex)}")
+
+    def as_tuple(self):
+        return (
+            self.LOAD_DATE,
+            self.MODULE,
+            self.START,
+            self.END,
+            self.NO_RECORDS,
+            self.STATUS,
+            self.ERROR,
+        )
+
+    @staticmethod
+    def write_many(con, schema_used, logs):
+        """Writes logs with a single multi-row INSERT and commits."""
+        cursor = con.cursor()
+        command_text = f"""
+            INSERT INTO {schema_used}.l01_logabacus (LOAD_DATE, MODULE, START_TIME, END_TIME, NO_RECORDS, STATUS, ERROR, AUTOID)
+            VALUES %s
+        """
+
+        try:
+            sequence = Log.sequence(cursor, schema_used)
+            template = f"(%s, %s, %s, %s, %s, %s, %s, nextval('{sequence}'))"
+            execute_values(
+                cursor,
+                command_text,
+                [log.as_tuple() for log in logs],
+                template=template,
+                page_size=max(len(logs), 1),
+            )
+            con.commit()
+            return cursor.rowcount
+        except Exception as ex:
+            con.rollback()
+            raise Exception(f"Failed to write logs: {str(ex)}")
         finally:
-            if con is not None and con.closed == 0:
-                con.close()
+            cursor.close()
 
-    def write_to_file(self, file_name):
+    @staticmethod
+    def sequence(cursor, schema_used):
+        """The sequence the AUTOID of l01_logabacus is drawn from: the one
+        the column owns, else LogSequence (default logabacus_seq) of
+        schema_used."""
+        cursor.execute(
+            "SELECT pg_get_serial_sequence(%s, 'autoid')",
+            (f"{schema_used}.l01_logabacus",),
+        )
+        row = cursor.fetchone()
+        if row and row[0]:
+            return row[0]
+        return f"{schema_used}.{os.getenv('LogSequence', 'logabacus_seq')}"
+
+    def write_to_file(self, file_name, mode="w"):
         lines_log = [
             "Log:",
             f"Load Date: {self.LOAD_DATE}",
@@ -55,55 +99,14 @@ class Log:
             f"Error Text: {self.ERROR}",
         ]
         try:
-            with open(file_name, "w") as file:
+            with open(file_name, mode) as file:
                 file.write("\n".join(lines_log))
+                if mode == "a":
+                    file.write("\n\n")
             return True
         except Exception as ex:
             raise Exception(f"Failed to write log to file: {str(ex)}")
 
-    @staticmethod
-    def find(module_name, schema_used, working_day, con):
-        cursor = con.cursor()
-        try:
-            cursor.execute(Log.is_load(module_name, schema_used, working_day))
-            status = cursor.fetchone()[0]
-
-            if con.closed == 0:
-                con.close()
-
-            if status is not None and status != "":
-                return status == "1"
-            return False
-        except Exception as ex:
-            raise Exception(f"Failed to find log: {str(ex)}")
-        finally:
-            cursor.close()
-
-    @staticmethod
-    def is_finished_cc(module_name, schema_used, working_day, con):
-        cursor = con.cursor()
-        try:
-            cursor.execute(Log.is_load(module_name, schema_used, working_day))
-            status = cursor.fetchone()[0]
-
-            if con.closed == 0:
-                con.close()
-
-            return status is not None
-        except Exception as ex:
-            raise Exception(f"Failed to check if finished: {str(ex)}")
-        finally:
-            cursor.close()
-
-    @staticmethod
-    def is_load(module_name, schema_used, working_day):
-        query = f"""
-            SELECT STATUS FROM {schema_used}.l01_logabacus
-            WHERE LOAD_DATE = '{working_day.strftime('%Y-%m-%d')}'
-            AND autoid = (SELECT max(autoid) FROM {schema_used}.l01_logabacus WHERE MODULE = '{module_name}')
-        """
-        return query
-
     @staticmethod
     def get_all(con, schema_used):
         query = f"SELECT * FROM {schema_used}.l01_logabacus WHERE MODULE = 'CC' ORDER BY START_TIME DESC"
@@ -0,0 +1,296 @@
+import functools
+import inspect
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+PROMETHEUS_PREFIX = "cc_abacus"
+
+
+class Sample:
+    """Rows and bytes handled by one timed call, settable inside the with
+    block."""
+
+    def __init__(self, rows=0, bytes=0):
+        self.rows = rows
+        self.bytes = bytes
+
+
+class TimerStats:
+    def __init__(self, name):
+        self.name = name
+        self.calls = 0
+        self.errors = 0
+        self.seconds = 0.0
+        self.rows = 0
+        self.bytes = 0
+
+    @property
+    def rows_per_second(self):
+        return self.rows / self.seconds if self.seconds else 0.0
+
+    @property
+    def bytes_per_second(self):
+        return self.bytes / self.seconds if self.seconds else 0.0
+
+    def as_dict(self):
+        return {
+            "timer": self.name,
+            "calls": self.calls,
+            "errors": self.errors,
+            "seconds": round(self.seconds, 3),
+            "rows": self.rows,
+            "bytes": self.bytes,
+            "rows_per_second": round(self.rows_per_second, 1),
+            "bytes_per_second": round(self.bytes_per_second, 1),
+        }
+
+
+def peak_rss_bytes():
+    """Peak resident set size of the process so far, None if unknown."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+class Metrics:
+    """Timers and counters of one run, shared by every thread of it.
+
+    A timer adds up the calls, seconds, errors, rows and bytes of everything
+    timed under its name; seconds are wall-clock and include whatever the
+    timed call itself calls.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._timers = {}
+            self._counters = {}
+            self.started = datetime.now()
+            self._started_counter = time.perf_counter()
+
+    @contextmanager
+    def timer(self, name, rows=0, bytes=0):
+        """Times the with block under name (not recorded if name is None)."""
+        sample = Sample(rows, bytes)
+        counter = time.perf_counter()
+        try:
+            yield sample
+        except BaseException:
+            self._add(name, sample, time.perf_counter() - counter, failed=True)
+            raise
+        self._add(name, sample, time.perf_counter() - counter, failed=False)
+
+    def _add(self, name, sample, seconds, failed):
+        if name is None:
+            return
+        with self._lock:
+            stats = self._timers.get(name)
+            if stats is None:
+                stats = self._timers[name] = TimerStats(name)
+            stats.calls += 1
+            stats.errors += failed
+            stats.seconds += seconds
+            stats.rows += int(sample.rows or 0)
+            stats.bytes += int(sample.bytes or 0)
+
+    def count(self, name, value=1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def timers(self):
+        with self._lock:
+            return sorted(self._timers.values(), key=lambda stats: -stats.seconds)
+
+    def counters(self):
+        with self._lock:
+            return dict(self._counters)
+
+    def summary(self):
+        return {
+            "started": self.started.isoformat(timespec="seconds"),
+            "duration_seconds": round(time.perf_counter() - self._started_counter, 3),
+            "peak_rss_bytes": peak_rss_bytes(),
+            "timers": [stats.as_dict() for stats in self.timers()],
+            "counters": self.counters(),
+        }
+
+    def prometheus_text(self):
+        """The summary in the Prometheus text format, as gauges of the last
+        run."""
+        summary = self.summary()
+        lines = []
+
+        def gauge(name, help_text, samples):
+            lines.append(f"# HELP {PROMETHEUS_PREFIX}_{name} {help_text}")
+            lines.append(f"# TYPE {PROMETHEUS_PREFIX}_{name} gauge")
+            for labels, value in samples:
+                lines.append(f"{PROMETHEUS_PREFIX}_{name}{labels} {value}")
+
+        gauge(
+            "run_start_timestamp_seconds",
+            "Start of the last run.",
+            [("", self.started.timestamp())],
+        )
+        gauge(
+            "run_duration_seconds",
+            "Duration of the last run.",
+            [("", summary["duration_seconds"])],
+        )
+        if summary["peak_rss_bytes"] is not None:
+            gauge(
+                "peak_rss_bytes",
+                "Peak resident memory of the last run.",
+                [("", summary["peak_rss_bytes"])],
+            )
+
+        timers = self.timers()
+        for field, help_text in (
+            ("seconds", "Seconds spent in each timer during the last run."),
+            ("calls", "Calls of each timer during the last run."),
+            ("errors", "Calls of each timer that raised during the last run."),
+            ("rows", "Rows handled under each timer during the last run."),
+            ("bytes", "Bytes handled under each timer during the last run."),
+        ):
+            gauge(
+                f"timer_{field}",
+                help_text,
+                [
+                    (f'{{timer="{_label(stats.name)}"}}', getattr(stats, field))
+                    for stats in timers
+                ],
+            )
+        gauge(
+            "counter",
+            "Counters of the last run.",
+            [
+                (f'{{counter="{_label(name)}"}}', value)
+                for name, value in sorted(self.counters().items())
+            ],
+        )
+        return "\n".join(lines) + "\n"
+
+    def write_json(self, file_name):
+        _write_atomically(file_name, json.dumps(self.summary(), indent=2))
+
+    def write_prometheus(self, file_name):
+        # The node exporter may read the file at any time, so it is replaced
+        # in one step rather than written in place
+        _write_atomically(file_name, self.prometheus_text())
+
+
+def _label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _write_atomically(file_name, text):
+    directory = os.path.dirname(os.path.abspath(file_name))
+    fd, temp_name = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as file:
+            file.write(text)
+        os.chmod(temp_name, 0o644)
+        os.replace(temp_name, file_name)
+    except BaseException:
+        os.unlink(temp_name)
+        raise
+
+
+# The metrics of the current run
+metrics = Metrics()
+
+
+def emit_run_metrics(logger):
+    """Logs the run's summary as one JSON line and writes it to MetricsFile
+    and, in the Prometheus text format, to MetricsTextfile when they are
+    set."""
+    logger.info(f"Run metrics: {json.dumps(metrics.summary())}")
+    for variable, write in (
+        ("MetricsFile", metrics.write_json),
+        ("MetricsTextfile", metrics.write_prometheus),
+    ):
+        file_name = os.getenv(variable)
+        if not file_name:
+            continue
+        try:
+            write(file_name)
+        except Exception as ex:
+            logger.error(f"Writing {variable} {file_name} failed: {str(ex)}")
+
+
+def _rows(result):
+    # pandas is not imported here: if nothing imported it yet, result can't
+    # be a DataFrame
+    pd = sys.modules.get("pandas")
+    if pd is not None and isinstance(result, pd.DataFrame):
+        return len(result)
+    return 0
+
+
+def _timed(name, func):
+    if inspect.isgeneratorfunction(func):
+        # Time each step, not the generator's whole life (which includes the
+        # consumer's time between steps)
+        @functools.wraps(func)
+        def generator(*args, **kwargs):
+            steps = func(*args, **kwargs)
+            try:
+                while True:
+                    with metrics.timer(name) as sample:
+                        try:
+                            item = next(steps)
+                        except StopIteration:
+                            return
+                        sample.rows = _rows(item)
+                    yield item
+            finally:
+                steps.close()
+
+        return generator
+
+    @functools.wraps(func)
+    def timed(*args, **kwargs):
+        with metrics.timer(name) as sample:
+            result = func(*args, **kwargs)
+            sample.rows = _rows(result)
+            return result
+
+    return timed
+
+
+def instrumented(prefix, exclude=()):
+    """Class decorator timing every public method (and property) of the
+    class as "<prefix>.<method>". Methods called once per row or product
+    belong in exclude."""
+
+    def decorate(cls):
+        for attribute, value in list(vars(cls).items()):
+            if attribute.startswith("_") or attribute in exclude:
+                continue
+            name = f"{prefix}.{attribute}"
+            if isinstance(value, staticmethod):
+                setattr(cls, attribute, staticmethod(_timed(name, value.__func__)))
+            elif isinstance(value, classmethod):
+                setattr(cls, attribute, classmethod(_timed(name, value.__func__)))
+            elif isinstance(value, property) and value.fget is not None:
+                setattr(cls, attribute, value.getter(_timed(name, value.fget)))
+            elif inspect.isfunction(value):
+                setattr(cls, attribute, _timed(name, value))
+        return cls
+
+    return decorate
@@ -0,0 +1,122 @@
+import logging
+import queue
+import threading
+import uuid
+
+import numpy as np
+import pandas as pd
+
+
+def partition_by_product(frame, partitions):
+    """Splits frame into partitions by a hash of ID_PRODUCT, so all rows of a
+    product land in the same partition. Row order is kept within each one."""
+    if partitions <= 1 or frame.empty:
+        return [frame]
+    hashes = pd.util.hash_array(frame["ID_PRODUCT"].to_numpy())
+    codes = (hashes % np.uint64(partitions)).astype("int64")
+    return [frame[codes == partition] for partition in range(partitions)]
+
+
+class ParallelCopy:
+    """COPYs a list of (frame, table, columns) tasks on several pooled
+    connections at once and commits them all or none.
+
+    Each worker borrows one connection and takes tasks from a shared queue
+    until it is empty, keeping its transaction open. Once every worker is
+    done they all commit, or all roll back if any of them failed. With
+    two_phase the transactions are PREPAREd before the first commit, so a
+    failure while committing can't leave part of the load behind (this needs
+    max_prepared_transactions > 0 on the server).
+    """
+
+    def __init__(self, pool, copy, workers, two_phase=False, logger=None):
+        self.pool = pool
+        self.copy = copy
+        self.workers = workers
+        self.two_phase = two_phase
+        self.logger = logger or logging.getLogger("ParallelCopy")
+
+    def run(self, tasks):
+        work = queue.SimpleQueue()
+        for task in tasks:
+            if not task[0].empty:
+                work.put(task)
+
+        workers = min(self.workers, work.qsize())
+        if workers == 0:
+            return True
+
+        gtrid = f"atmp-{uuid.uuid4().hex}"
+        errors = []
+        # Everybody has copied (or failed) before anybody commits; the
+        # outcome is decided once, by the last worker to arrive
+        outcome = []
+        copied = threading.Barrier(workers, action=lambda: outcome.append(not errors))
+        threads = [
+            threading.Thread(
+                target=self._work,
+                args=(work, copied, outcome, errors, gtrid, str(worker)),
+                name=f"parallel-copy-{worker}",
+                daemon=True,
+            )
+            for worker in range(workers)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        if errors:
+            raise errors[0]
+        return True
+
+    def _work(self, work, copied, outcome, errors, gtrid, bqual):
+        try:
+            with self.pool.connection() as conn:
+                self._copy(conn, work, errors, gtrid, bqual)
+                try:
+                    copied.wait()
+                    succeeded = outcome[0]
+                except threading.BrokenBarrierError:
+                    succeeded = False
+                self._finish(conn, succeeded, errors)
+        except Exception as ex:
+            # Could not even get a connection; release the others
+            errors.append(ex)
+            copied.abort()
+
+    def _copy(self, conn, work, errors, gtrid, bqual):
+        try:
+            if self.two_phase:
+                conn.tpc_begin(conn.xid(0, gtrid, bqual))
+            cursor = conn.cursor()
+            try:
+                while not errors:
+                    try:
+                        frame, table, columns = work.get_nowait()
+                    except queue.Empty:
+                        break
+                    self.copy(cursor, frame, table, columns)
+            finally:
+                cursor.close()
+            if self.two_phase:
+                conn.tpc_prepare()
+        except Exception as ex:
+            errors.append(ex)
+
+    def _finish(self, conn, succeeded, errors):
+        try:
+            if succeeded and self.two_phase:
+                conn.tpc_commit()
+            elif succeeded:
+                conn.commit()
+            elif self.two_phase:
+                conn.tpc_rollback()
+            else:
+                conn.rollback()
+        except Exception as ex:
+            if succeeded and not self.two_phase:
+                self.logger.error(
+                    f"Commit failed after the vote, load is partial: {ex}"
+                )
+            errors.append(ex)
@@ -0,0 +1,381 @@
+import io
+from decimal import Decimal
+
+import numpy as np
+import pandas as pd
+
+# PostgreSQL binary COPY format, see the "Binary Format" section of the COPY docs
+HEADER = b"PGCOPY\n\xff\r\n\x00" + (0).to_bytes(4, "big") + (0).to_bytes(4, "big")
+TRAILER = (-1).to_bytes(2, "big", signed=True)
+
+PG_EPOCH = np.datetime64("2000-01-01T00:00:00", "us")
+
+_FIXED_WIDTH_TYPES = {
+    "bool": "u1",
+    "int2": ">i2",
+    "int4": ">i4",
+    "int8": ">i8",
+    "float4": ">f4",
+    "float8": ">f8",
+}
+_TEXT_TYPES = {"text", "varchar", "bpchar", "name", "char"}
+# What boolean input accepts in text COPY, any case and unique prefixes
+_TRUE = {"t", "tr", "tru", "true", "y", "ye", "yes", "on", "1"}
+_FALSE = {"f", "fa", "fal", "fals", "false", "n", "no", "of", "off", "0"}
+_NUMERIC_SIGN = {0: 0x0000, 1: 0x4000}
+_NUMERIC_NAN = 0xC000
+# Integers at or above this may not be exact as float64
+_NUMERIC_EXACT_LIMIT = 2**53
+# Base-10000 digits of the largest int64
+_NUMERIC_DIGITS = 5
+# Base-10000 digits after the decimal point the vectorised path handles
+_NUMERIC_FRACTION_DIGITS = 4
+# Most decimals tried for a float, as many as repr shows for small values
+_NUMERIC_MAX_SCALE = 15
+
+
+class EncodedColumn:
+    """Binary COPY fields of one column: the length of every field (-1 for
+    NULL) and the bytes of all non-NULL values, concatenated in row order."""
+
+    def __init__(self, lengths, data):
+        self.lengths = lengths
+        self.data = data
+
+
+def encode_column(values, pg_type):
+    """Encodes a Series as binary COPY fields of the given Postgres type
+    (its udt_name, e.g. int4, numeric, varchar, timestamp)."""
+    nulls = pd.isna(values).to_numpy()
+    present = values[~nulls]
+
+    if pg_type in _FIXED_WIDTH_TYPES:
+        dtype = np.dtype(_FIXED_WIDTH_TYPES[pg_type])
+        if pg_type == "bool":
+            numbers = _booleans(present)
+        elif dtype.kind == "i":
+            numbers = _integers(present, dtype, pg_type)
+        else:
+            numbers = pd.to_numeric(present).to_numpy()
+        data = numbers.astype(dtype).view(np.uint8)
+        return _fixed_width(nulls, dtype.itemsize, data)
+
+    if pg_type == "date":
+        days = pd.to_datetime(present).to_numpy(dtype="datetime64[D]")
+        days = (days - PG_EPOCH.astype("datetime64[D]")).astype(">i4")
+        return _fixed_width(nulls, 4, days.view(np.uint8))
+
+    if pg_type in ("timestamp", "timestamptz"):
+        stamps = pd.to_datetime(present)
+        if getattr(stamps.dt, "tz", None) is not None:
+            stamps = stamps.dt.tz_convert("UTC").dt.tz_localize(None)
+        micros = stamps.to_numpy(dtype="datetime64[us]") - PG_EPOCH
+        return _fixed_width(nulls, 8, micros.astype(">i8").view(np.uint8))
+
+    if pg_type == "numeric":
+        return _numerics(nulls, present)
+    if pg_type in _TEXT_TYPES:
+        return _texts(nulls, present)
+    raise ValueError(f"Binary COPY does not support column type {pg_type}")
+
+
+def _booleans(present):
+    # Same values as the CSV path loads: to_csv writes True/False, 1/0 or the
+    # string as it is, and Postgres parses that text
+    if pd.api.types.is_bool_dtype(present.dtype):
+        return present.to_numpy(dtype=bool)
+    values = []
+    for value in present.tolist():
+        text = str(value).strip().lower()
+        if text not in _TRUE and text not in _FALSE:
+            raise ValueError(f"invalid input syntax for type boolean: {value!r}")
+        values.append(text in _TRUE)
+    return np.array(values, dtype=bool)
+
+
+def _integers(present, dtype, pg_type):
+    # Text COPY rejects 1.7 rather than truncating it; whole floats are taken,
+    # a nullable integer column may come as float
+    numbers = pd.to_numeric(present).to_numpy()
+    if numbers.dtype.kind == "f":
+        whole = np.isfinite(numbers) & (numbers == np.trunc(numbers))
+        if not whole.all():
+            value = present.iloc[int(np.argmin(whole))]
+            raise ValueError(f"invalid input syntax for type {pg_type}: {value!r}")
+    elif numbers.dtype.kind not in "iub":
+        raise ValueError(f"invalid input syntax for type {pg_type}")
+    info = np.iinfo(dtype)
+    if len(numbers) and (numbers.min() < info.min or numbers.max() > info.max):
+        raise ValueError(f"value out of range for type {pg_type}")
+    return numbers
+
+
+def _fixed_width(nulls, width, data):
+    lengths = np.where(nulls, -1, width).astype("int64")
+    return EncodedColumn(lengths, data)
+
+
+def _numerics(nulls, present):
+    # Floats and integers are written as the decimal to_csv would print for
+    # them, worked out for the whole column at once; Decimals and the values
+    # that don't fit int64 go through _numeric_bytes one by one
+    if not (
+        pd.api.types.is_float_dtype(present.dtype)
+        or pd.api.types.is_integer_dtype(present.dtype)
+    ) or pd.api.types.is_bool_dtype(present.dtype):
+        encoded = [_numeric_bytes(value) for value in present.tolist()]
+        return _variable_width(nulls, encoded)
+
+    values = present.to_numpy(dtype="float64", copy=False)
+    if pd.api.types.is_integer_dtype(present.dtype):
+        integers = present.to_numpy(dtype="int64")
+        scales = np.zeros(len(values), dtype="int64")
+        fits = np.ones(len(values), dtype=bool)
+    else:
+        integers, scales, fits = _shortest_decimals(values)
+        _repr_decimals(values, integers, scales, fits)
+
+    # Base-10000 digits, least significant first: the fraction padded to
+    # _NUMERIC_FRACTION_DIGITS of them, then the integer part
+    magnitude = np.abs(np.where(fits, integers, 0))
+    unit = 10 ** np.where(fits, scales, 0)
+    fraction = magnitude % unit * 10 ** (4 * _NUMERIC_FRACTION_DIGITS - scales)
+    places = 10000 ** np.arange(_NUMERIC_DIGITS)
+    digits = np.concatenate(
+        [
+            (fraction[:, None] // places[:_NUMERIC_FRACTION_DIGITS]) % 10000,
+            (magnitude[:, None] // unit[:, None] // places) % 10000,
+        ],
+        axis=1,
+    )
+    nonzero = digits != 0
+    present_digits = nonzero.any(axis=1)
+    slots = digits.shape[1]
+    highest = slots - 1 - np.argmax(nonzero[:, ::-1], axis=1)
+    lowest = np.argmax(nonzero, axis=1)
+    ndigits = np.where(present_digits, highest - lowest + 1, 0)
+    weight = np.where(present_digits, highest - _NUMERIC_FRACTION_DIGITS, 0)
+    sign = np.where(present_digits & (integers < 0), _NUMERIC_SIGN[1], 0)
+
+    # Header and digits (most significant first) of every value in one
+    # row-major matrix, masked to each value's nonzero span
+    width = 4 + slots
+    fields = np.empty((len(values), width), dtype=">i2")
+    fields[:, 0] = ndigits
+    fields[:, 1] = weight
+    fields[:, 2] = sign.astype("uint16").view("int16")
+    fields[:, 3] = scales
+    fields[:, 4:] = digits[:, ::-1]
+    slot = np.arange(slots)[::-1]
+    used = np.ones((len(values), width), dtype=bool)
+    used[:, 4:] = (slot >= lowest[:, None]) & (slot <= highest[:, None])
+    used[:, 4:] &= present_digits[:, None]
+
+    used &= fits[:, None]
+    data = fields[used].view(np.uint8)
+    field_lengths = np.where(fits, 2 * (4 + ndigits), 0)
+    if not fits.all():
+        # Values too large or too precise for int64 are encoded one by one
+        # and spliced in between the vectorised ones
+        misfits = np.flatnonzero(~fits)
+        encoded = [
+            _numeric_bytes(value) for value in present.to_numpy()[misfits].tolist()
+        ]
+        field_lengths[misfits] = [len(value) for value in encoded]
+        starts = np.cumsum(field_lengths) - field_lengths
+        spliced = np.empty(int(field_lengths.sum()), dtype=np.uint8)
+        spliced[_ragged_positions(starts[fits], field_lengths[fits])] = data
+        spliced[_ragged_positions(starts[misfits], field_lengths[misfits])] = (
+            np.frombuffer(b"".join(encoded), dtype=np.uint8)
+        )
+        data = spliced
+
+    lengths = np.full(len(nulls), -1, dtype="int64")
+    lengths[~nulls] = field_lengths
+    return EncodedColumn(lengths, data)
+
+
+def _ragged_positions(starts, lengths):
+    # Positions of every byte of values laid out at starts, in order
+    offsets = np.arange(lengths.sum()) - np.repeat(
+        np.cumsum(lengths) - lengths, lengths
+    )
+    return np.repeat(starts, lengths) + offsets
+
+
+def _shortest_decimals(values):
+    """(integers, scales, fits): the fewest decimals, at least one like repr
+    prints and up to 15, that still read back as each float, as
+    integers * 10 ** -scales; fits is False where there are none within
+    int64's exact range."""
+    integers = np.zeros(len(values), dtype="int64")
+    scales = np.zeros(len(values), dtype="int64")
+    found = ~np.isfinite(values)
+    for scale in range(1, _NUMERIC_MAX_SCALE + 1):
+        power = 10.0**scale
+        scaled = values * power
+        candidate = np.rint(scaled)
+        usable = ~found & (np.abs(scaled) < _NUMERIC_EXACT_LIMIT)
+        # The rounding of values * power may land one off the decimal
+        for step in (0, -1, 1):
+            exact = usable & ((candidate + step) / power == values)
+            integers[exact] = (candidate + step)[exact]
+            scales[exact] = scale
+            found |= exact
+            usable &= ~exact
+    return integers, scales, found & np.isfinite(values)
+
+
+def _repr_decimals(values, integers, scales, fits):
+    # Floats with more significant digits than float64 holds exactly, such
+    # as differences of amounts, taken from their repr where it is positional
+    # and fits int64 with at most _NUMERIC_FRACTION_DIGITS * 4 decimals
+    finite = np.isfinite(values)
+    for i in np.flatnonzero(~fits & finite):
+        text = repr(float(values[i]))
+        whole, _, decimals = text.partition(".")
+        if "e" in text or len(decimals) > 4 * _NUMERIC_FRACTION_DIGITS:
+            continue
+        number = int(whole + decimals)
+        if abs(number) < 2**63:
+            integers[i], scales[i], fits[i] = number, len(decimals), True
+
+
+def _texts(nulls, present):
+    # A column of str is joined and encoded in one go; the byte length of
+    # every value comes from its code points unless it is all ASCII
+    values = present.tolist()
+    if pd.api.types.infer_dtype(values, skipna=False) != "string":
+        encoded = [_text(value).encode("utf-8") for value in values]
+        return _variable_width(nulls, encoded)
+
+    data = "".join(values).encode("utf-8")
+    field_lengths = np.fromiter(map(len, values), dtype="int64", count=len(values))
+    if len(data) != field_lengths.sum():
+        points = np.array(values, dtype=str)
+        points = points.view(np.uint32).reshape(len(values), -1)
+        field_lengths = (
+            (points > 0).astype("int64")
+            + (points >= 0x80)
+            + (points >= 0x800)
+            + (points >= 0x10000)
+        ).sum(axis=1)
+
+    lengths = np.full(len(nulls), -1, dtype="int64")
+    lengths[~nulls] = field_lengths
+    return EncodedColumn(lengths, np.frombuffer(data, dtype=np.uint8))
+
+
+def _variable_width(nulls, encoded):
+    lengths = np.full(len(nulls), -1, dtype="int64")
+    lengths[~nulls] = [len(value) for value in encoded]
+    data = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+    return EncodedColumn(lengths, data)
+
+
+def _text(value):
+    if isinstance(value, pd.Timestamp):
+        return value.isoformat(sep=" ")
+    return str(value)
+
+
+def _numeric_bytes(value):
+    value = Decimal(repr(value)) if isinstance(value, float) else Decimal(value)
+    if value.is_nan():
+        return _int16s(0, 0, _NUMERIC_NAN, 0)
+
+    sign, _, exponent = value.as_tuple()
+    dscale = max(0, -exponent)
+    integer, _, fraction = f"{abs(value):f}".partition(".")
+
+    integer = integer.zfill((len(integer) + 3) // 4 * 4)
+    fraction = fraction.ljust((len(fraction) + 3) // 4 * 4, "0")
+    digits = [int(integer[i : i + 4]) for i in range(0, len(integer), 4)]
+    weight = len(digits) - 1
+    digits += [int(fraction[i : i + 4]) for i in range(0, len(fraction), 4)]
+
+    while digits and digits[0] == 0:
+        digits.pop(0)
+        weight -= 1
+    while digits and digits[-1] == 0:
+        digits.pop()
+    if not digits:
+        weight, sign = 0, 0
+    return _int16s(len(digits), weight, _NUMERIC_SIGN[sign], dscale, *digits)
+
+
+def _int16s(*values):
+    return np.array(values, dtype=">i2").tobytes()
+
+
+def encode_rows(columns):
+    """Lays out the encoded columns of a block of rows as binary COPY tuples.
+
+    Every field is scattered into one preallocated buffer with NumPy fancy
+    indexing, so there is no per-row Python work.
+    """
+    rows = len(columns[0].lengths)
+    sizes = [4 + np.maximum(column.lengths, 0) for column in columns]
+    row_sizes = 2 + np.sum(sizes, axis=0)
+    row_starts = np.cumsum(row_sizes) - row_sizes
+    buffer = np.empty(int(row_sizes.sum()), dtype=np.uint8)
+
+    field_count = np.frombuffer(len(columns).to_bytes(2, "big"), dtype=np.uint8)
+    buffer[row_starts[:, None] + np.arange(2)] = field_count
+
+    field_starts = row_starts + 2
+    for column, size in zip(columns, sizes):
+        lengths = column.lengths.astype(">i4").view(np.uint8).reshape(rows, 4)
+        buffer[field_starts[:, None] + np.arange(4)] = lengths
+
+        present = column.lengths > 0
+        value_lengths = column.lengths[present]
+        value_starts = np.repeat(field_starts[present] + 4, value_lengths)
+        # Ragged arange: position of each byte within its own value
+        offsets = np.arange(len(column.data)) - np.repeat(
+            np.cumsum(value_lengths) - value_lengths, value_lengths
+        )
+        buffer[value_starts + offsets] = column.data
+
+        field_starts = field_starts + size
+    return buffer
+
+
+class BinaryCopyStream(io.RawIOBase):
+    """File-like object that encodes a DataFrame in binary COPY format as
+    cursor.copy_expert reads it, block_rows rows at a time."""
+
+    def __init__(self, frame, pg_types, block_rows=50000):
+        super().__init__()
+        self.frame = frame
+        self.pg_types = pg_types
+        self.block_rows = block_rows
+        self.bytes_written = 0
+        self._blocks = self._encode_blocks()
+        self._pending = memoryview(b"")
+
+    def readable(self):
+        return True
+
+    def _encode_blocks(self):
+        yield HEADER
+        for start in range(0, len(self.frame), self.block_rows):
+            block = self.frame.iloc[start : start + self.block_rows]
+            columns = [
+                encode_column(block.iloc[:, i], pg_type)
+                for i, pg_type in enumerate(self.pg_types)
+            ]
+            yield encode_rows(columns).tobytes()
+        yield TRAILER
+
+    def readinto(self, buffer):
+        while not self._pending:
+            block = next(self._blocks, None)
+            if block is None:
+                return 0
+            self._pending = memoryview(block)
+        size = min(len(buffer), len(self._pending))
+        buffer[:size] = self._pending[:size]
+        self._pending = self._pending[size:]
+        self.bytes_written += size
+        return size
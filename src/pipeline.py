@@ -0,0 +1,179 @@
+import logging
+import queue
+import threading
+import time
+
+_END = object()
+
+
+class StageStats:
+    def __init__(self, name):
+        self.name = name
+        self.items = 0
+        self.rows = 0
+        self.busy_seconds = 0.0
+        self.waiting_seconds = 0.0
+
+    @property
+    def rows_per_second(self):
+        if self.busy_seconds == 0:
+            return 0.0
+        return self.rows / self.busy_seconds
+
+    def as_dict(self):
+        return {
+            "stage": self.name,
+            "items": self.items,
+            "rows": self.rows,
+            "busy_seconds": round(self.busy_seconds, 3),
+            "waiting_seconds": round(self.waiting_seconds, 3),
+            "rows_per_second": round(self.rows_per_second, 1),
+        }
+
+    def __str__(self):
+        return (
+            f"{self.name}: {self.items} chunks, {self.rows} rows, "
+            f"busy {self.busy_seconds:.2f}s ({self.rows_per_second:.0f} rows/s), "
+            f"waiting {self.waiting_seconds:.2f}s"
+        )
+
+
+class Pipeline:
+    """Runs a source iterator and a chain of stages in their own threads.
+
+    Stages are connected by bounded queues, so while one chunk is being
+    written the next one is transformed and the one after that is read, and
+    no stage can run more than queue_size chunks ahead of the next one. The
+    first error in any stage stops the others and is raised from run().
+    """
+
+    def __init__(self, queue_size=2, logger=None):
+        self.queue_size = queue_size
+        self.logger = logger or logging.getLogger("Pipeline")
+        self.stats = []
+        self._source = None
+        self._stages = []
+        self._stop = threading.Event()
+        self._errors = []
+
+    def source(self, name, iterable, count=len):
+        self._source = (StageStats(name), iterable, count)
+        return self
+
+    def stage(self, name, func, count=len):
+        """func is called with each item of the previous stage; its return
+        value goes to the next stage."""
+        self._stages.append((StageStats(name), func, count))
+        return self
+
+    def run(self):
+        queues = [queue.Queue(self.queue_size) for _ in self._stages]
+        stats, iterable, count = self._source
+        threads = [
+            threading.Thread(
+                target=self._run_source,
+                args=(stats, iterable, count, queues[0]),
+                name=f"pipeline-{stats.name}",
+                daemon=True,
+            )
+        ]
+        for i, (stats, func, count) in enumerate(self._stages):
+            outbox = queues[i + 1] if i + 1 < len(queues) else None
+            threads.append(
+                threading.Thread(
+                    target=self._run_stage,
+                    args=(stats, func, count, queues[i], outbox),
+                    name=f"pipeline-{stats.name}",
+                    daemon=True,
+                )
+            )
+
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.stats = [self._source[0]] + [stage[0] for stage in self._stages]
+        for stats in self.stats:
+            self.logger.info(f"Pipeline stage {stats}")
+        if self._errors:
+            raise self._errors[0]
+
+        self.logger.info(f"Pipeline bottleneck: {self.bottleneck().name}")
+        return self.stats
+
+    def bottleneck(self):
+        """The stage that spent the most time working."""
+        return max(self.stats, key=lambda stats: stats.busy_seconds)
+
+    def _run_source(self, stats, iterable, count, outbox):
+        try:
+            iterator = iter(iterable)
+            while not self._stop.is_set():
+                started = time.perf_counter()
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    break
+                self._record(stats, item, count, started)
+                self._put(stats, outbox, item)
+        except Exception as ex:
+            self._fail(ex)
+        finally:
+            self._put(stats, outbox, _END, force=True)
+
+    def _run_stage(self, stats, func, count, inbox, outbox):
+        try:
+            while not self._stop.is_set():
+                item = self._get(stats, inbox)
+                if item is _END:
+                    break
+                started = time.perf_counter()
+                result = func(item)
+                self._record(stats, item, count, started)
+                if outbox is not None:
+                    self._put(stats, outbox, result)
+        except Exception as ex:
+            self._fail(ex)
+        finally:
+            if outbox is not None:
+                self._put(stats, outbox, _END, force=True)
+
+    def _record(self, stats, item, count, started):
+        stats.busy_seconds += time.perf_counter() - started
+        stats.items += 1
+        stats.rows += count(item)
+
+    def _put(self, stats, outbox, item, force=False):
+        started = time.perf_counter()
+        while True:
+            if self._stop.is_set() and not force:
+                return
+            try:
+                outbox.put(item, timeout=0.1)
+                break
+            except queue.Full:
+                if force and self._stop.is_set():
+                    # Nobody is reading any more, make room for the end marker
+                    try:
+                        outbox.get_nowait()
+                    except queue.Empty:
+                        pass
+        stats.waiting_seconds += time.perf_counter() - started
+
+    def _get(self, stats, inbox):
+        started = time.perf_counter()
+        while True:
+            try:
+                item = inbox.get(timeout=0.1)
+                break
+            except queue.Empty:
+                if self._stop.is_set():
+                    item = _END
+                    break
+        stats.waiting_seconds += time.perf_counter() - started
+        return item
+
+    def _fail(self, ex):
+        self._errors.append(ex)
+        self._stop.set()
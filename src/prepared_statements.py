@@ -0,0 +1,28 @@
+import hashlib
+import re
+import weakref
+
+# Names of the statements already prepared on each (pooled) connection
+_prepared = weakref.WeakKeyDictionary()
+
+
+def execute_prepared(conn, cursor, query, params=()):
+    """Runs query, written with %s placeholders, as a server-side prepared
+    statement.
+
+    The statement is PREPAREd the first time a connection runs it and only
+    EXECUTEd after that, so Postgres plans it once per connection instead of
+    parsing and planning it on every call.
+    """
+    name = "ps_" + hashlib.sha1(query.encode("utf-8")).hexdigest()[:16]
+    prepared = _prepared.setdefault(conn, set())
+    if name not in prepared:
+        numbers = iter(range(1, len(params) + 1))
+        statement = re.sub("%s", lambda match: f"${next(numbers)}", query)
+        cursor.execute(f"PREPARE {name} AS {statement}")
+        prepared.add(name)
+
+    if params:
+        cursor.execute(f"EXECUTE {name} ({', '.join(['%s'] * len(params))})", params)
+    else:
+        cursor.execute(f"EXECUTE {name}")
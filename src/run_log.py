@@ -0,0 +1,141 @@
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+import psycopg2
+
+from .connection_pool import ConnectionPool, get_pool, select_one
+from .log import Log
+from .metrics import metrics
+from .pipeline import StageStats
+
+
+def log_pool():
+    """One connection of its own for the run log, so writing it never waits
+    for (or holds) a connection of the data load."""
+
+    def create():
+        connection_string = os.getenv("AbacusConStr")
+        return ConnectionPool(
+            lambda: psycopg2.connect(connection_string),
+            max_size=1,
+            is_healthy=lambda conn: conn.closed == 0,
+            ping=select_one,
+        )
+
+    return get_pool("abacus-log", create)
+
+
+class RunLog:
+    """Buffers the timings of a run's stages and writes them to
+    l01_logabacus in one multi-row INSERT when flush() is called, at the end
+    of the run whether it succeeded or not.
+
+    stage() is safe to use from several threads at once; a stage run more
+    than once (one per chunk) adds up to a single log entry covering its
+    first start to its last end. If the database can't be written the
+    entries are appended to file_name instead.
+    """
+
+    def __init__(self, schema_used, load_date=None, pool=None, file_name=None):
+        self.schema_used = schema_used
+        self.load_date = load_date
+        self.enabled = schema_used is not None
+        self.file_name = file_name or os.getenv("RunLogFile", "cc_run_log.txt")
+        self._pool = pool
+        self._stages = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def disabled(cls):
+        """A RunLog that times nothing and writes nothing."""
+        return cls(None)
+
+    @contextmanager
+    def stage(self, name, rows=0):
+        """Times the with block as one run of stage name (not recorded if
+        name is None), also as the "stage.<name>" timer of the run's metrics.
+        The yielded Sample's rows (and bytes) can be set inside the block
+        when they aren't known beforehand."""
+        started = datetime.now()
+        counter = time.perf_counter()
+        with metrics.timer(None if name is None else f"stage.{name}", rows) as run:
+            try:
+                yield run
+            except Exception as ex:
+                self._add(name, run, started, time.perf_counter() - counter, str(ex))
+                raise
+            self._add(name, run, started, time.perf_counter() - counter, None)
+
+    def _add(self, name, run, started, seconds, error):
+        if not self.enabled or name is None:
+            return
+        with self._lock:
+            entry = self._stages.get(name)
+            if entry is None:
+                entry = self._stages[name] = {
+                    "stats": StageStats(name),
+                    "start": started,
+                    "error": None,
+                }
+            entry["stats"].items += 1
+            entry["stats"].rows += int(run.rows or 0)
+            entry["stats"].busy_seconds += seconds
+            entry["end"] = datetime.now()
+            if error is not None and entry["error"] is None:
+                entry["error"] = error
+
+    @property
+    def stats(self):
+        with self._lock:
+            return [entry["stats"] for entry in self._stages.values()]
+
+    def logs(self, clear=False):
+        """One Log per stage timed so far, status "0" if any of its runs
+        failed."""
+        with self._lock:
+            entries = list(self._stages.values())
+            if clear:
+                self._stages.clear()
+
+        logs = []
+        for entry in entries:
+            log = Log()
+            log.LOAD_DATE = self.load_date
+            # CC_EXTRACT, CC_TRANSFORM, ...; never the CC module itself, whose
+            # entries decide whether a working day is done
+            log.MODULE = f"CC_{entry['stats'].name.upper()}"
+            log.START = entry["start"]
+            log.END = entry["end"]
+            log.NO_RECORDS = entry["stats"].rows
+            log.STATUS = "0" if entry["error"] else "1"
+            log.ERROR = entry["error"]
+            logs.append(log)
+        return logs
+
+    def flush(self):
+        """Writes the buffered entries and empties the buffer. Never raises,
+        a run log that can't be written must not fail the run."""
+        logs = self.logs(clear=True)
+        if not logs:
+            return 0
+
+        try:
+            pool = self._pool or log_pool()
+            with pool.connection() as conn:
+                return Log.write_many(conn, self.schema_used, logs)
+        except Exception as ex:
+            logging.warning(
+                f"Writing the run log failed, appending it to {self.file_name}: {ex}"
+            )
+
+        for log in logs:
+            try:
+                log.write_to_file(self.file_name, mode="a")
+            except Exception as ex:
+                logging.error(str(ex))
+                break
+        return 0
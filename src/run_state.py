@@ -0,0 +1,103 @@
+import threading
+from datetime import date, datetime
+
+from .prepared_statements import execute_prepared
+
+
+def _day(value):
+    if value is None or value == "":
+        return None
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return date.fromisoformat(str(value)[:10])
+
+
+class RunState:
+    """Everything a run checks before moving any data: the Abacus working
+    day, the next working day and the latest FIN and CC load logs."""
+
+    def __init__(
+        self,
+        working_day,
+        next_working_day,
+        fin_load_date=None,
+        fin_status=None,
+        cc_load_date=None,
+        cc_status=None,
+    ):
+        self.working_day = working_day
+        self.next_working_day = next_working_day
+        self.fin_load_date = _day(fin_load_date)
+        self.fin_status = fin_status
+        self.cc_load_date = _day(cc_load_date)
+        self.cc_status = cc_status
+
+    @staticmethod
+    def query(schema_used):
+        return f"""
+            SELECT w.working_day, w.next_working_day,
+                fin.load_date, fin.status, cc.load_date, cc.status
+            FROM (SELECT 1) AS probe
+            LEFT JOIN LATERAL (
+                SELECT working_day, next_working_day FROM {schema_used}.W01_WORKING_DAY
+                ORDER BY working_day DESC LIMIT 1
+            ) w ON true
+            LEFT JOIN LATERAL (
+                SELECT load_date, status FROM {schema_used}.l01_logabacus
+                WHERE module = %s ORDER BY autoid DESC LIMIT 1
+            ) fin ON true
+            LEFT JOIN LATERAL (
+                SELECT load_date, status FROM {schema_used}.l01_logabacus
+                WHERE module = %s ORDER BY autoid DESC LIMIT 1
+            ) cc ON true
+        """
+
+    @classmethod
+    def probe(cls, conn, schema_used):
+        with conn.cursor() as cursor:
+            execute_prepared(conn, cursor, cls.query(schema_used), ("FIN", "CC"))
+            working_day, next_working_day, *logs = cursor.fetchone()
+        if working_day is not None:
+            # assuming date format is Y-m-d
+            working_day = datetime.strptime(working_day, "%Y-%m-%d")
+            next_working_day = datetime.strptime(next_working_day, "%Y-%m-%d")
+        return cls(working_day, next_working_day, *logs)
+
+    def is_load_fin(self):
+        """Whether the latest FIN log entry is a success for the working
+        day."""
+        return (
+            self.working_day is not None
+            and self.fin_load_date == self.working_day.date()
+            and self.fin_status == "1"
+        )
+
+    def is_finished_cc(self, cc_working_day):
+        """Whether the latest CC log entry is for cc_working_day, whatever
+        its status."""
+        return (
+            cc_working_day is not None
+            and self.cc_load_date == _day(cc_working_day)
+            and self.cc_status is not None
+        )
+
+
+_run_states = {}
+_run_states_lock = threading.Lock()
+
+
+def get_run_state(schema_used, connection):
+    """RunState of schema_used, probed once per run through connection()."""
+    with _run_states_lock:
+        if schema_used not in _run_states:
+            with connection() as conn:
+                _run_states[schema_used] = RunState.probe(conn, schema_used)
+        return _run_states[schema_used]
+
+
+def clear_run_state():
+    """Forgets the probed state; called when a new run starts."""
+    with _run_states_lock:
+        _run_states.clear()
@@ -0,0 +1,185 @@
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, wait
+
+import numpy as np
+import pandas as pd
+
+from .cc_abacus_transform import (
+    ATMP_T18_COLUMNS,
+    T17_DERIVED_COLUMNS,
+    T18PreviousIndex,
+    build_atmp_t17_t18,
+    build_atmp_t17_t18_with_cards,
+)
+from .parallel_copy import partition_by_product
+from .shared_frame import (
+    SharedFrame,
+    read_shared_frame,
+    shared_memory_free,
+    unlink_shared_frame,
+)
+
+_executors = {}
+_executors_lock = threading.Lock()
+
+
+def default_workers():
+    """CPUs this process may run on, which in a pod can be fewer than the
+    node has."""
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def transform_executor(workers):
+    """Process pool of workers processes, started once and kept for the
+    following chunks and runs.
+
+    Workers are started from a fork server (or spawned) rather than forked
+    from this process, which has pool, pipeline and SOAP threads running.
+    """
+    with _executors_lock:
+        if workers not in _executors:
+            methods = multiprocessing.get_all_start_methods()
+            context = multiprocessing.get_context(
+                "forkserver" if "forkserver" in methods else "spawn"
+            )
+            _executors[workers] = ProcessPoolExecutor(workers, mp_context=context)
+        return _executors[workers]
+
+
+def shutdown_transform_executors():
+    with _executors_lock:
+        for executor in _executors.values():
+            executor.shutdown()
+        _executors.clear()
+
+
+def _transform_shard(t17_spec, t18_spec, working_day):
+    # Runs in a worker process: the shard comes in and goes back out through
+    # shared memory, which the parent frees once it has read the results
+    atmp_t17 = read_shared_frame(t17_spec)
+    t18_previous = read_shared_frame(t18_spec)
+    positions = atmp_t17.pop("_POSITION").to_numpy()
+
+    schedule, cards = build_atmp_t17_t18_with_cards(atmp_t17, t18_previous, working_day)
+
+    columns = [column for column in T17_DERIVED_COLUMNS if column in atmp_t17]
+    derived = atmp_t17[columns].assign(_POSITION=positions)
+    schedule = schedule.assign(_POSITION=positions[cards])
+    results = []
+    for frame in (derived, schedule):
+        shared = SharedFrame(frame)
+        shared.close()
+        results.append(shared.spec)
+    return results
+
+
+def build_atmp_t17_t18_sharded(atmp_t17, t18_previous, working_day, workers):
+    """build_atmp_t17_t18 spread over workers processes.
+
+    ATMP_T17 and the history rows of its products are split into shards by
+    a hash of ID_PRODUCT, so every product's T17 row and T18 history land in
+    the same shard, and each shard is transformed in its own process. The
+    results are put back in ATMP_T17 order (and snapshot order within a
+    card), so the output is the same as build_atmp_t17_t18's.
+    """
+    if workers <= 1 or len(atmp_t17) == 0:
+        return build_atmp_t17_t18(atmp_t17, t18_previous, working_day)
+    if not isinstance(t18_previous, T18PreviousIndex):
+        t18_previous = T18PreviousIndex(t18_previous)
+
+    # Only the history of this chunk's products leaves the process
+    _, rows = t18_previous.take(atmp_t17["ID_PRODUCT"].to_numpy())
+    history = t18_previous.frame.iloc[np.unique(rows)].reset_index(drop=True)
+    t17 = atmp_t17.reset_index(drop=True).assign(_POSITION=np.arange(len(atmp_t17)))
+
+    # The shards and the results they send back are all in shared memory at
+    # once, roughly twice the input; a pod's /dev/shm is 64 MiB unless a
+    # memory-backed emptyDir is mounted over it
+    needed = 2 * int(
+        t17.memory_usage(deep=True).sum() + history.memory_usage(deep=True).sum()
+    )
+    free = shared_memory_free()
+    if free is not None and needed > free:
+        logging.warning(
+            f"Sharded transform needs about {needed} bytes of shared memory, "
+            f"{free} are free; transforming the chunk in this process"
+        )
+        return build_atmp_t17_t18(atmp_t17, t18_previous, working_day)
+
+    t17_shards = partition_by_product(t17, workers)
+    # An empty frame comes back as a single partition
+    t18_shards = (
+        partition_by_product(history, workers)
+        if not history.empty
+        else [history] * len(t17_shards)
+    )
+
+    executor = transform_executor(workers)
+    shared = []
+    futures = []
+    # Futures whose result blocks this process has taken over
+    consumed = set()
+    derived = []
+    schedules = []
+    try:
+        for t17_shard, t18_shard in zip(t17_shards, t18_shards):
+            if t17_shard.empty:
+                continue
+            t17_shared = SharedFrame(t17_shard)
+            t18_shared = SharedFrame(t18_shard)
+            shared += [t17_shared, t18_shared]
+            futures.append(
+                executor.submit(
+                    _transform_shard,
+                    t17_shared.spec,
+                    t18_shared.spec,
+                    pd.Timestamp(working_day),
+                )
+            )
+        # Read in shard order, whichever finishes first
+        for future in futures:
+            derived_spec, schedule_spec = future.result()
+            consumed.add(future)
+            try:
+                derived.append(read_shared_frame(derived_spec))
+                schedule = read_shared_frame(schedule_spec)
+            finally:
+                # Both blocks, also when reading the first one fails
+                unlink_shared_frame(derived_spec)
+                unlink_shared_frame(schedule_spec)
+            if not schedule.empty:
+                schedules.append(schedule)
+    except Exception:
+        # Free what the other shards send back before giving up
+        for future in futures:
+            future.cancel()
+        wait(futures)
+        for future in futures:
+            if (
+                future not in consumed
+                and not future.cancelled()
+                and future.exception() is None
+            ):
+                for spec in future.result():
+                    unlink_shared_frame(spec)
+        raise
+    finally:
+        for block in shared:
+            block.unlink()
+
+    derived = pd.concat(derived, ignore_index=True).sort_values(
+        "_POSITION", kind="stable"
+    )
+    for column in derived.columns.drop("_POSITION"):
+        atmp_t17[column] = derived[column].to_numpy()
+
+    if not schedules:
+        return pd.DataFrame(columns=ATMP_T18_COLUMNS)
+    schedule = pd.concat(schedules, ignore_index=True)
+    schedule = schedule.sort_values("_POSITION", kind="stable")
+    return schedule[ATMP_T18_COLUMNS].reset_index(drop=True)
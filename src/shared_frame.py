@@ -0,0 +1,98 @@
+import os
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+from .columnar import decode_column, encode_column
+
+_ALIGNMENT = 8
+# Where POSIX shared memory blocks live on Linux
+SHM_DIRECTORY = "/dev/shm"
+
+
+class SharedFrame:
+    """A DataFrame's columns laid out in one block of shared memory.
+
+    spec is a small picklable description another process passes to
+    read_shared_frame to rebuild the frame, so the column data itself never
+    goes through pickle (except for columns with no fixed-width layout, e.g.
+    Decimal objects, which travel inside spec). The index is not kept.
+
+    The creator owns the block: it must call unlink() once every reader is
+    done, or close() to hand the block over to a process that will.
+    """
+
+    def __init__(self, frame):
+        columns = []
+        size = 0
+        for name in frame.columns:
+            layout, arrays = encode_column(frame[name])
+            placed = []
+            for array in arrays:
+                array = np.ascontiguousarray(array)
+                size = -(-size // _ALIGNMENT) * _ALIGNMENT
+                placed.append((array, size))
+                size += array.nbytes
+            columns.append((name, layout, placed))
+
+        self._shm = shared_memory.SharedMemory(create=True, size=max(size, 1))
+        specs = []
+        for name, layout, placed in columns:
+            buffers = []
+            for array, offset in placed:
+                target = np.ndarray(
+                    array.shape, array.dtype, buffer=self._shm.buf, offset=offset
+                )
+                target[...] = array
+                del target
+                buffers.append((array.dtype.str, offset))
+            specs.append((name, layout, buffers))
+        self.spec = {"name": self._shm.name, "rows": len(frame), "columns": specs}
+
+    def close(self):
+        self._shm.close()
+
+    def unlink(self):
+        self._shm.close()
+        self._shm.unlink()
+
+
+def read_shared_frame(spec, unlink=False):
+    """Copies the frame described by spec out of shared memory; with unlink
+    the block is freed afterwards."""
+    shm = shared_memory.SharedMemory(name=spec["name"])
+    try:
+        rows = spec["rows"]
+        data = {}
+        for name, layout, buffers in spec["columns"]:
+            arrays = [
+                np.frombuffer(shm.buf, np.dtype(dtype), rows, offset).copy()
+                for dtype, offset in buffers
+            ]
+            data[name] = decode_column(layout, arrays)
+        return pd.DataFrame(data, index=pd.RangeIndex(rows))
+    finally:
+        shm.close()
+        if unlink:
+            shm.unlink()
+
+
+def unlink_shared_frame(spec):
+    """Frees the block of spec unless that has been done already."""
+    try:
+        shm = shared_memory.SharedMemory(name=spec["name"])
+    except FileNotFoundError:
+        return
+    shm.close()
+    shm.unlink()
+
+
+def shared_memory_free():
+    """Bytes free for new shared memory blocks, None where they aren't
+    backed by SHM_DIRECTORY (e.g. macOS)."""
+    try:
+        stats = os.statvfs(SHM_DIRECTORY)
+    except (AttributeError, OSError):
+        return None
+    return stats.f_bavail * stats.f_frsize
@@ -0,0 +1,131 @@
+import logging
+import os
+import pickle
+import shutil
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from .columnar import decode_column, encode_column
+
+_META = "meta.pkl"
+# A store's temp directory older than this was left behind by a crash
+_STALE_TEMP_SECONDS = 3600
+
+
+def memory_mappable(frame):
+    """frame as the cache stores it: stable-sorted by ID_PRODUCT like
+    T18PreviousIndex sorts it, so the index uses it without a copy, and with
+    Decimal and datetime.date columns, which have no fixed-width layout and
+    would be pickled, cast to float64 and datetime64."""
+    frame = frame.sort_values("ID_PRODUCT", kind="stable", ignore_index=True)
+    for name in frame.columns:
+        if frame[name].dtype != object:
+            continue
+        kind = pd.api.types.infer_dtype(frame[name], skipna=True)
+        if kind == "decimal":
+            frame[name] = pd.to_numeric(frame[name]).astype("float64")
+        elif kind == "date":
+            frame[name] = pd.to_datetime(frame[name])
+    return frame
+
+
+class T18SnapshotCache:
+    """Previous-day T18 snapshots of a schema kept on local disk, one
+    directory per previous working day.
+
+    Every column is stored as .npy files and memory-mapped when loaded, so
+    only the pages the load touches are read. An entry is only used while
+    the probe it was stored with (row count and max AUTOID of the slice)
+    still matches the database, and entries of other days are removed once
+    the working day rolls over.
+    """
+
+    def __init__(self, directory, schema_used):
+        self.directory = directory
+        self.schema_used = schema_used
+
+    def path(self, previous_day):
+        return os.path.join(self.directory, f"{self.schema_used}-{previous_day}")
+
+    def load(self, previous_day, probe):
+        """The cached snapshot of previous_day, None if there is none or it
+        was stored with a different probe."""
+        self.evict(keep=previous_day)
+        path = self.path(previous_day)
+        try:
+            with open(os.path.join(path, _META), "rb") as file:
+                meta = pickle.load(file)
+        except FileNotFoundError:
+            return None
+        if meta["probe"] != tuple(probe):
+            return None
+
+        data = {}
+        for i, (name, layout, count) in enumerate(meta["columns"]):
+            # Plain ndarray views of the mapped files
+            arrays = [
+                np.load(os.path.join(path, f"{i}_{j}.npy"), mmap_mode="r").view(
+                    np.ndarray
+                )
+                for j in range(count)
+            ]
+            data[name] = decode_column(layout, arrays)
+        return pd.DataFrame(data, index=pd.RangeIndex(meta["rows"]), copy=False)
+
+    def store(self, previous_day, probe, frame):
+        """Writes frame as the snapshot of previous_day and returns it as
+        stored, see memory_mappable. The entry appears at once, complete,
+        or not at all."""
+        frame = memory_mappable(frame)
+        os.makedirs(self.directory, exist_ok=True)
+        temp = tempfile.mkdtemp(dir=self.directory, prefix=self.temp_prefix())
+        try:
+            columns = []
+            for i, name in enumerate(frame.columns):
+                layout, arrays = encode_column(frame[name])
+                for j, array in enumerate(arrays):
+                    np.save(os.path.join(temp, f"{i}_{j}.npy"), array)
+                columns.append((name, layout, len(arrays)))
+            meta = {"probe": tuple(probe), "rows": len(frame), "columns": columns}
+            with open(os.path.join(temp, _META), "wb") as file:
+                pickle.dump(meta, file)
+
+            path = self.path(previous_day)
+            shutil.rmtree(path, ignore_errors=True)
+            os.rename(temp, path)
+        except BaseException:
+            shutil.rmtree(temp, ignore_errors=True)
+            raise
+        self.evict(keep=previous_day)
+        return frame
+
+    def temp_prefix(self):
+        return f".tmp-{self.schema_used}-"
+
+    def evict(self, keep):
+        """Removes the schema's entries of every day but keep, and the temp
+        directories of its stores that crashed."""
+        prefix = f"{self.schema_used}-"
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return
+        for name in names:
+            path = os.path.join(self.directory, name)
+            if name.startswith(prefix) and name != f"{prefix}{keep}":
+                logging.info(f"Evicting T18 snapshot cache {name}")
+                shutil.rmtree(path, ignore_errors=True)
+            elif name.startswith(self.temp_prefix()) and self.is_stale(path):
+                logging.info(f"Removing unfinished T18 snapshot cache {name}")
+                shutil.rmtree(path, ignore_errors=True)
+
+    @staticmethod
+    def is_stale(path):
+        # Not one a store of another process is still writing
+        try:
+            return time.time() - os.path.getmtime(path) > _STALE_TEMP_SECONDS
+        except FileNotFoundError:
+            return False
@@ -0,0 +1,132 @@
+import pandas as pd
+import pytest
+
+from src import connection_pool
+from src.connection_pool import close_pools
+from src.run_state import clear_run_state
+
+# What the run-state probe of a CC_AbacusDA finds: a working day, no logs
+WORKING_DAYS = [("2024-10-14", "2024-10-15")]
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+        self.rows = []
+        self.rowcount = 0
+        self.description = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def execute(self, query, params=None):
+        query = " ".join(query.split())
+        self.conn.statements.append(query)
+        self.conn.params.append(params)
+        self.rows = []
+        if query.startswith("PREPARE"):
+            self.conn.prepared[query.split()[1]] = query
+            return
+        if query.startswith("EXECUTE"):
+            query = self.conn.prepared[query.split()[1]]
+        rows = self.conn.respond(query, params)
+        if isinstance(rows, pd.DataFrame):
+            self.description = [(column,) for column in rows.columns]
+            rows = rows.itertuples(index=False, name=None)
+        self.rows = list(rows)
+        self.rowcount = len(self.rows)
+
+    def fetchone(self):
+        return self.rows.pop(0) if self.rows else None
+
+    def fetchall(self):
+        rows, self.rows = self.rows, []
+        return rows
+
+    def fetchmany(self, size):
+        self.conn.fetch_sizes.append(size)
+        batch, self.rows = self.rows[:size], self.rows[size:]
+        return batch
+
+    def copy_expert(self, command, stream, size=8192):
+        self.conn.statements.append(command.split(" (")[0])
+        self.conn.copied.append(stream.read())
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    """Local stand-in for a psycopg2 or pymssql connection.
+
+    Every statement (whitespace collapsed, COPYs up to their column list),
+    COMMIT and ROLLBACK is recorded in statements, which connections may
+    share. A query is answered with the rows of the first key of results
+    found in it, either a list, a DataFrame (which also sets the cursor's
+    description) or a function of the query's params, and with
+    default_rows if none is. PREPAREd statements are remembered, so an
+    EXECUTE is answered like the query it runs.
+    """
+
+    def __init__(self, results=None, default_rows=(), statements=None):
+        self.results = dict(results or {})
+        self.default_rows = list(default_rows)
+        self.statements = [] if statements is None else statements
+        self.params = []
+        self.prepared = {}
+        self.fetch_sizes = []
+        self.copied = []
+        self.closed = 0
+
+    def respond(self, query, params):
+        for marker, rows in self.results.items():
+            if marker in query:
+                return rows(params) if callable(rows) else rows
+        return self.default_rows
+
+    def executed(self, prefix):
+        return [query for query in self.statements if query.startswith(prefix)]
+
+    def cursor(self, as_dict=False):
+        return FakeCursor(self)
+
+    def commit(self):
+        self.statements.append("COMMIT")
+
+    def rollback(self):
+        self.statements.append("ROLLBACK")
+
+    def xid(self, format_id, gtrid, bqual):
+        return (gtrid, bqual)
+
+    def tpc_begin(self, xid):
+        self.statements.append("TPC BEGIN")
+
+    def tpc_prepare(self):
+        self.statements.append("TPC PREPARE")
+
+    def tpc_commit(self):
+        self.statements.append("TPC COMMIT")
+
+    def tpc_rollback(self):
+        self.statements.append("TPC ROLLBACK")
+
+    def close(self):
+        self.closed = 1
+
+
+@pytest.fixture
+def abacus_connection(monkeypatch):
+    """The connection every CC_AbacusDA of the test gets, on schema "s",
+    with the pools and the run state reset around the test."""
+    conn = FakeConnection({"W01_WORKING_DAY": WORKING_DAYS})
+    close_pools()
+    clear_run_state()
+    monkeypatch.setattr(connection_pool.psycopg2, "connect", lambda dsn: conn)
+    monkeypatch.setenv("SchemaUsed", "s")
+    yield conn
+    close_pools()
+    clear_run_state()
@@ -0,0 +1,175 @@
+import warnings
+
+import pandas as pd
+
+from src.abacus_cc_loader_from_centaur import AbacusCCLoaderFromCentaur
+from src.run_log import RunLog
+
+
+class FakeCentaur:
+    def __init__(self, chunks, chunk_size=2):
+        self.chunks = chunks
+        self.chunk_size = chunk_size
+        self.read = 0
+
+    def iter_cc_data(self):
+        for chunk in self.chunks:
+            self.read += 1
+            yield chunk.copy()
+
+
+class FakeAbacus:
+    def __init__(self):
+        self.loaded = []
+        self.quarantined = []
+        self.schema_used = None
+        self.run_log = RunLog.disabled()
+
+    def do_atmp_abacus_cc_job_chunked(self, chunks, is_service):
+        for chunk in chunks:
+            self.loaded.append(chunk)
+        return True
+
+    def do_atmp_abacus_cc_job(self, df, is_service):
+        self.loaded.append(df)
+        return True
+
+    def bulk_insert_err_atmp_t17(self, df):
+        self.quarantined.append(df)
+
+
+def make_chunk(products):
+    return pd.DataFrame({"ID_PRODUCT": products, "DAYS_PAST_DUE": 0})
+
+
+def test_chunked_load_adds_required_columns_to_every_chunk():
+    centaur = FakeCentaur([make_chunk(["P1", "P2"]), make_chunk(["P3"])])
+    abacus = FakeAbacus()
+
+    status = AbacusCCLoaderFromCentaur.clean_and_load_cc(centaur, abacus, True)
+
+    assert status == AbacusCCLoaderFromCentaur.LoadStatus.SUCCESS
+    assert centaur.read == 2
+    assert [chunk["ID_PRODUCT"].tolist() for chunk in abacus.loaded] == [
+        ["P1", "P2"],
+        ["P3"],
+    ]
+    for chunk in abacus.loaded:
+        assert {"NUMBER_OF_PAYMENTS_PAST_DUE", "CARD_BALANCE", "IS_JOINT"} <= set(
+            chunk.columns
+        )
+
+
+def test_load_reuses_a_prepared_centaur_and_abacus():
+    centaur = FakeCentaur([make_chunk(["P1"])])
+    centaur.centaur_working_day = pd.Timestamp("2024-10-15")
+    abacus = FakeAbacus()
+    abacus.is_finished_cc = lambda: False
+
+    status = AbacusCCLoaderFromCentaur.load(True, (centaur, abacus))
+
+    assert status == AbacusCCLoaderFromCentaur.LoadStatus.SUCCESS
+    assert abacus.WorkingDay == pd.Timestamp("2024-10-15")
+    assert [chunk["ID_PRODUCT"].tolist() for chunk in abacus.loaded] == [["P1"]]
+
+
+def test_clean_centaur_cc_data_splits_off_every_duplicate_row():
+    df = make_chunk(["P1", "P2", "P1", "P3", "P2", "P1"])
+
+    clean, duplicates = AbacusCCLoaderFromCentaur.clean_centaur_cc_data(df)
+
+    assert clean["ID_PRODUCT"].tolist() == ["P3"]
+    assert duplicates["ID_PRODUCT"].tolist() == ["P1", "P2", "P1", "P2", "P1"]
+
+
+def test_load_quarantines_duplicates():
+    centaur = FakeCentaur([], chunk_size=0)
+    centaur.get_cc_data = lambda: make_chunk(["P1", "P2", "P1"])
+    abacus = FakeAbacus()
+
+    status = AbacusCCLoaderFromCentaur.clean_and_load_cc(centaur, abacus, True)
+
+    assert status == AbacusCCLoaderFromCentaur.LoadStatus.SUCCESS
+    assert abacus.loaded[0]["ID_PRODUCT"].tolist() == ["P2"]
+    (quarantined,) = abacus.quarantined
+    assert quarantined["ID_PRODUCT"].tolist() == ["P1", "P1"]
+    # The error table's sequence numbers them
+    assert "AUTOID" not in quarantined
+
+
+def test_a_failed_load_leaves_the_quarantine_alone():
+    centaur = FakeCentaur([], chunk_size=0)
+    centaur.get_cc_data = lambda: make_chunk(["P1", "P2", "P1"])
+    abacus = FakeAbacus()
+    abacus.do_atmp_abacus_cc_job = lambda df, is_service: False
+
+    status = AbacusCCLoaderFromCentaur.clean_and_load_cc(centaur, abacus, True)
+
+    assert status == AbacusCCLoaderFromCentaur.LoadStatus.ERROR
+    assert abacus.quarantined == []
+
+
+def test_clean_centaur_cc_data_returns_frames_of_their_own():
+    df = make_chunk(["P1", "P2", "P1"])
+
+    clean, duplicates = AbacusCCLoaderFromCentaur.clean_centaur_cc_data(df)
+    with warnings.catch_warnings():
+        warnings.simplefilter("error", pd.errors.SettingWithCopyWarning)
+        clean["DAYS_PAST_DUE"] = 1
+        duplicates["AUTOID"] = range(len(duplicates))
+
+    assert df["DAYS_PAST_DUE"].tolist() == [0, 0, 0]
+
+
+def test_a_run_without_duplicates_clears_the_quarantine():
+    centaur = FakeCentaur([make_chunk(["P1"]), make_chunk(["P2"])])
+    abacus = FakeAbacus()
+
+    status = AbacusCCLoaderFromCentaur.clean_and_load_cc(centaur, abacus, True)
+
+    assert status == AbacusCCLoaderFromCentaur.LoadStatus.SUCCESS
+    (quarantined,) = abacus.quarantined
+    assert quarantined.empty
+
+
+def test_a_failed_quarantine_does_not_fail_the_load(caplog):
+    centaur = FakeCentaur([], chunk_size=0)
+    centaur.get_cc_data = lambda: make_chunk(["P1", "P2", "P1"])
+    abacus = FakeAbacus()
+
+    def missing_table(df):
+        raise Exception('relation "s.err_atmp_t17_dpd_credit_cards" does not exist')
+
+    abacus.bulk_insert_err_atmp_t17 = missing_table
+
+    status = AbacusCCLoaderFromCentaur.clean_and_load_cc(centaur, abacus, True)
+
+    assert status == AbacusCCLoaderFromCentaur.LoadStatus.SUCCESS
+    assert abacus.loaded[0]["ID_PRODUCT"].tolist() == ["P2"]
+    assert "Quarantining duplicate rows failed" in caplog.text
+
+
+def test_chunked_load_finds_duplicates_across_chunk_boundaries():
+    centaur = FakeCentaur(
+        [make_chunk(["P1", "P2"]), make_chunk(["P2", "P2"]), make_chunk(["P2", "P3"])]
+    )
+    abacus = FakeAbacus()
+
+    status = AbacusCCLoaderFromCentaur.clean_and_load_cc(centaur, abacus, True)
+
+    assert status == AbacusCCLoaderFromCentaur.LoadStatus.SUCCESS
+    loaded = pd.concat(abacus.loaded)["ID_PRODUCT"].tolist()
+    assert loaded == ["P1", "P3"]
+    (quarantined,) = abacus.quarantined
+    assert quarantined["ID_PRODUCT"].tolist() == ["P2"] * 4
+
+
+def test_regroup_keeps_chunks_that_do_not_split_a_product():
+    chunks = [make_chunk(["P1", "P2"]), make_chunk(["P3"])]
+
+    regrouped = list(AbacusCCLoaderFromCentaur.regroup_by_product(iter(chunks)))
+
+    assert [chunk["ID_PRODUCT"].tolist() for chunk in regrouped] == [
+        ["P1", "P2"],
+        ["P3"],
+    ]
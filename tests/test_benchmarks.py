@@ -0,0 +1,82 @@
+import pandas as pd
+
+from benchmarks.generator import generate_cc_data, generate_t18_history
+from benchmarks.load_stages import WORKING_DAY, compare, load_stages, run_benchmark
+from benchmarks.log_status_lookup import index_lookups, migration_statements
+from src.cc_abacus_da import ATMP_T17_TABLE, ATMP_T18_TABLE
+
+
+def test_generator_is_seeded():
+    first = generate_cc_data(500, WORKING_DAY, seed=7)
+    pd.testing.assert_frame_equal(first, generate_cc_data(500, WORKING_DAY, seed=7))
+    pd.testing.assert_frame_equal(
+        generate_t18_history(first, WORKING_DAY, seed=7),
+        generate_t18_history(first, WORKING_DAY, seed=7),
+    )
+    assert not first.equals(generate_cc_data(500, WORKING_DAY, seed=8))
+
+
+def test_every_stage_runs_offline():
+    results = run_benchmark(cards=[300], repeat=1, report=lambda line: None)
+
+    stages = {result["stage"]: result for result in results["results"]}
+    assert list(stages) == [
+        "extract",
+        "clean",
+        "t18_index",
+        "transform[vectorized]",
+        "copy_t17[csv]",
+        "copy_t18[csv]",
+        "copy_t17[binary]",
+        "copy_t18[binary]",
+    ]
+    assert stages["extract"]["rows"] == 300
+    assert all(stages[name]["bytes"] > 0 for name in stages if name.startswith("copy"))
+    assert all(result["peak_traced_bytes"] > 0 for result in results["results"])
+
+
+def test_binary_copy_is_timed_with_the_atmp_column_types():
+    cc_data = generate_cc_data(50, WORKING_DAY)
+    abacus, _ = load_stages(
+        cc_data, generate_t18_history(cc_data, WORKING_DAY), [], [], 1
+    )
+
+    t17_types = abacus.column_types[ATMP_T17_TABLE]
+    t18_types = abacus.column_types[ATMP_T18_TABLE]
+    assert t17_types["card_balance"] == t17_types["minimum_payment"] == "numeric"
+    assert t18_types["principal_payment_amount"] == "numeric"
+    assert "float8" not in {*t17_types.values(), *t18_types.values()}
+
+
+def test_compare_flags_slower_stages():
+    def results(**medians):
+        return {
+            "results": [
+                {"cards": 10, "stage": stage, "median_seconds": seconds}
+                for stage, seconds in medians.items()
+            ]
+        }
+
+    lines, regressions = compare(
+        results(extract=1.0, clean=1.5, copy=1.0),
+        results(extract=1.0, clean=1.0, transform=1.0),
+        threshold=0.10,
+    )
+
+    assert [result["stage"] for result in regressions] == ["clean"]
+    assert len(lines) == 2
+    assert lines[1].endswith("SLOWER")
+
+
+def test_log_benchmark_applies_the_migration_and_reads_its_plan():
+    statements = migration_statements("bench")
+
+    assert statements[0].startswith("CREATE INDEX CONCURRENTLY IF NOT EXISTS")
+    assert 'ON "bench".l01_logabacus (module, autoid DESC)' in statements[0]
+    assert statements[1] == 'VACUUM (ANALYZE) "bench".l01_logabacus'
+    plan = [
+        "Nested Loop Left Join",
+        "  -> Index Only Scan using l01_logabacus_module_autoid_idx on l01_logabacus",
+        "  -> Seq Scan on l01_logabacus l01_logabacus_1",
+    ]
+    assert len(index_lookups(plan)) == 1
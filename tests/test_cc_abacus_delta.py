@@ -0,0 +1,164 @@
+import pandas as pd
+
+from src.cc_abacus_da import CC_AbacusDA
+from src.cc_abacus_delta import (
+    changed_products,
+    fingerprint_products,
+    removed_products,
+)
+from tests.test_cc_abacus_transform import (
+    make_abacus,
+    make_atmp_t17,
+    make_t18_previous,
+)
+
+
+def build(t17=None, products=("P2", "P5")):
+    abacus = make_abacus(make_t18_previous(products=products), "vectorized")
+    t17 = make_atmp_t17() if t17 is None else t17
+    t18 = abacus.build_atmp_t18_data_table(t17)
+    CC_AbacusDA.drop_atmp_t17_work_columns(t17)
+    return t17, t18
+
+
+def test_fingerprints_are_stable_per_product():
+    t17, t18 = build()
+
+    fingerprints = fingerprint_products(t17, t18)
+
+    assert fingerprints.index.tolist() == ["P1", "P2", "P3", "P4", "P5"]
+    assert fingerprints.dtype == "int64"
+    pd.testing.assert_series_equal(fingerprints, fingerprint_products(*build()))
+    # Products are fingerprinted independently of the rest of the load
+    subset = fingerprint_products(
+        t17[t17["ID_PRODUCT"] == "P5"], t18[t18["ID_PRODUCT"] == "P5"]
+    )
+    assert subset["P5"] == fingerprints["P5"]
+
+
+def test_only_changed_and_new_products_are_rewritten():
+    previous = fingerprint_products(*build())
+    t17 = make_atmp_t17()
+    t17.loc[t17["ID_PRODUCT"] == "P1", "SUM_OF_PAYMENTS"] = 25.0
+    t17 = pd.concat(
+        [
+            t17[t17["ID_PRODUCT"] != "P4"],
+            make_atmp_t17().iloc[[0]].assign(ID_PRODUCT="P6"),
+        ]
+    )
+
+    current = fingerprint_products(*build(t17))
+
+    assert changed_products(previous, current).tolist() == ["P1", "P6"]
+    assert removed_products(previous, current.index).tolist() == ["P4"]
+
+
+def test_payment_schedule_changes_change_the_fingerprint():
+    previous = fingerprint_products(*build(products=("P2", "P5")))
+    current = fingerprint_products(*build(products=("P2",)))
+
+    assert changed_products(previous, current).tolist() == ["P5"]
+
+
+def test_first_incremental_run_writes_everything():
+    current = fingerprint_products(*build())
+    empty = current.iloc[0:0]
+
+    assert changed_products(empty, current).tolist() == current.index.tolist()
+
+
+def test_incremental_job_replaces_only_changed_products():
+    abacus = make_abacus(make_t18_previous(), "vectorized")
+    abacus.load_mode = "incremental"
+    abacus._atmp_fingerprints = fingerprint_products(*build()).drop("P3")
+    abacus._atmp_seen = []
+    replaced = []
+    abacus.replace_atmp_products = lambda products, *frames: replaced.append(
+        (list(products), frames)
+    )
+
+    t17 = make_atmp_t17()
+    t17 = t17[t17["ID_PRODUCT"] != "P1"].reset_index(drop=True)
+    abacus.insert_atmp_chunk(t17, abacus.build_atmp_t18_data_table(t17))
+    abacus.finish_atmp_load()
+
+    (upserted, (t17_rows, t18_rows, fingerprints)), (removed, ()) = replaced
+    assert upserted == ["P3"]
+    assert t17_rows["ID_PRODUCT"].tolist() == ["P3"]
+    assert t18_rows.empty
+    assert fingerprints.columns.tolist() == ["ID_PRODUCT", "FINGERPRINT", "WORKING_DAY"]
+    assert (fingerprints["WORKING_DAY"] == abacus.WorkingDay).all()
+    assert removed == ["P1"]
+
+
+class StoredFingerprints:
+    """Answers the fingerprint check like a table holding fingerprints of
+    every ATMP_T17 product, written on working_day."""
+
+    def __init__(self, working_day, products=5):
+        self.working_day = working_day
+        self.products = products
+
+    def __call__(self, params):
+        (working_day,) = params
+        other_days = 0 if working_day == self.working_day else self.products
+        return [(self.products, self.products, other_days)]
+
+
+def incremental_run(abacus_connection, stored, working_day):
+    """begin_atmp_load and one chunk of an incremental run on working_day,
+    with ATMP_T17 holding the rows (and fingerprints) of stored's day."""
+    abacus_connection.results["working_day IS DISTINCT FROM"] = stored
+    abacus = CC_AbacusDA()
+    abacus.load_mode = "incremental"
+    abacus.WorkingDay = working_day
+    abacus.get_t18_previous_values = make_t18_previous
+    previous = make_abacus(make_t18_previous(), "vectorized")
+    previous.WorkingDay = stored.working_day
+    stored_t17 = make_atmp_t17().assign(WORKING_DAY=stored.working_day)
+    stored_t18 = previous.build_atmp_t18_data_table(stored_t17)
+    CC_AbacusDA.drop_atmp_t17_work_columns(stored_t17)
+    stored_fingerprints = fingerprint_products(stored_t17, stored_t18)
+
+    def get_atmp_fingerprints():
+        # A full reload has emptied the table by the time it reads it
+        if abacus_connection.executed("TRUNCATE"):
+            return stored_fingerprints.iloc[0:0]
+        return stored_fingerprints
+
+    abacus.get_atmp_fingerprints = get_atmp_fingerprints
+    replaced = []
+    abacus.replace_atmp_products = lambda products, *frames: replaced.append(
+        list(products)
+    )
+    abacus_connection.statements.clear()
+
+    abacus.begin_atmp_load(True)
+    t17 = make_atmp_t17().assign(WORKING_DAY=working_day)
+    abacus.insert_atmp_chunk(t17, abacus.build_atmp_t18_data_table(t17))
+    return abacus_connection.statements, replaced
+
+
+def test_rerun_on_the_same_day_writes_nothing(abacus_connection):
+    day = pd.Timestamp("2024-10-14")
+
+    statements, replaced = incremental_run(
+        abacus_connection, StoredFingerprints(day), day
+    )
+
+    assert not any("TRUNCATE" in statement for statement in statements)
+    assert replaced == []
+
+
+def test_new_working_day_reloads_everything(abacus_connection):
+    # Every row of ATMP_T17/T18 carries the working day, so a delta would
+    # rewrite the whole book; the table is reloaded instead
+    statements, replaced = incremental_run(
+        abacus_connection,
+        StoredFingerprints(pd.Timestamp("2024-10-11")),
+        pd.Timestamp("2024-10-14"),
+    )
+
+    truncated = [statement for statement in statements if "TRUNCATE" in statement]
+    assert len(truncated) == 2
+    assert replaced == [["P1", "P2", "P3", "P4", "P5"]]
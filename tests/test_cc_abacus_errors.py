@@ -0,0 +1,159 @@
+import pandas as pd
+import pytest
+
+from src.cc_abacus_da import (
+    ATMP_T17_TABLE,
+    ATMP_T18_TABLE,
+    ERR_ATMP_T17_TABLE,
+    CC_AbacusDA,
+)
+from src.cc_abacus_transform import T18PreviousIndex, build_atmp_t17_t18
+from tests.test_cc_abacus_swap import CATALOG
+from tests.test_cc_abacus_transform import (
+    WORKING_DAY,
+    make_atmp_t17,
+    make_t18_previous,
+)
+
+
+@pytest.fixture
+def abacus(abacus_connection):
+    abacus_connection.results.update(CATALOG)
+    abacus = CC_AbacusDA()
+    abacus_connection.statements.clear()
+    return abacus, abacus_connection.statements
+
+
+def make_errors(autoids):
+    return pd.DataFrame({"ID_PRODUCT": "P1", "AUTOID": list(autoids)})
+
+
+def test_error_records_are_read_in_keyset_pages(abacus):
+    abacus, _ = abacus
+    table = make_errors(range(7))
+    pages = []
+
+    def get_page(after_autoid, page_size):
+        pages.append((after_autoid, page_size))
+        start = 0 if after_autoid is None else after_autoid + 1
+        return table[table["AUTOID"] >= start].head(page_size).reset_index(drop=True)
+
+    abacus.get_error_records_page = get_page
+
+    assert abacus.get_error_records(page_size=3)["AUTOID"].tolist() == [0, 1, 2]
+    abacus.error_page_size = 3
+    assert abacus.get_error_records()["AUTOID"].tolist() == list(range(7))
+    assert pages[1:] == [(None, 3), (2, 3), (5, 3)]
+
+
+def test_fixed_errors_are_copied_and_applied_in_one_transaction(abacus):
+    abacus, statements = abacus
+
+    abacus.save_fixed_errors(make_errors([3, 4]))
+
+    work = statements[: statements.index("COMMIT")]
+    assert work[0].startswith("CREATE TEMP TABLE fixed_err_atmp_t17")
+    assert work[1] == "COPY fixed_err_atmp_t17"
+    assert work[2].startswith(f"DELETE FROM s.{ERR_ATMP_T17_TABLE} e")
+    assert work[3] == (
+        f"INSERT INTO s.{ERR_ATMP_T17_TABLE} (ID_PRODUCT, AUTOID, edited) "
+        "SELECT ID_PRODUCT, AUTOID, true FROM fixed_err_atmp_t17"
+    )
+
+
+def test_saving_rows_read_back_does_not_write_edited_twice(abacus):
+    abacus, statements = abacus
+    errors = make_errors([3])
+    errors["EDITED"] = False
+
+    abacus.save_fixed_errors(errors)
+
+    assert statements[3].startswith(
+        f"INSERT INTO s.{ERR_ATMP_T17_TABLE} (ID_PRODUCT, AUTOID, edited)"
+    )
+
+
+def test_fixed_errors_are_transformed_into_t17_and_t18(abacus_connection, abacus):
+    abacus, statements = abacus
+    abacus.WorkingDay = WORKING_DAY
+    abacus._t18_previous_index = (WORKING_DAY, T18PreviousIndex(make_t18_previous()))
+    # As quarantined: straight from Centaur, work columns included
+    quarantined = make_atmp_t17()
+    quarantined.columns = quarantined.columns.str.lower()
+    quarantined["autoid"] = range(len(quarantined))
+    quarantined["edited"] = True
+    abacus_connection.results[f"FROM s.{ERR_ATMP_T17_TABLE} ORDER BY"] = quarantined
+
+    assert abacus.commit_fixed_errors_into_t17(True) == 5
+
+    work = statements[: statements.index("COMMIT")]
+    assert work[:2] == [
+        f"LOCK TABLE s.{ERR_ATMP_T17_TABLE} IN EXCLUSIVE MODE",
+        f"LOCK TABLE s.{ATMP_T17_TABLE} IN SHARE MODE",
+    ]
+    assert work[3].startswith(f"SELECT DISTINCT id_product FROM s.{ATMP_T17_TABLE}")
+    assert work[4:] == [
+        f"COPY s.{ATMP_T17_TABLE}",
+        f"COPY s.{ATMP_T18_TABLE}",
+        f"TRUNCATE TABLE s.{ERR_ATMP_T17_TABLE}",
+    ]
+    atmp_t18 = build_atmp_t17_t18(
+        make_atmp_t17(), T18PreviousIndex(make_t18_previous()), WORKING_DAY
+    )
+    t17_copy, t18_copy = abacus_connection.copied
+    assert t17_copy.splitlines()[1].split("\t")[:2] == ["P2", "-250.5"]
+    assert len(t17_copy.splitlines()) == 5
+    assert "20241001" not in t17_copy
+    assert len(t18_copy.splitlines()) == len(atmp_t18) > 0
+
+
+@pytest.mark.parametrize(
+    "quarantined_products, loaded_products, refused",
+    [(["P1", "P1"], [], ["P1"]), (["P1", "P2"], [("P2",)], ["P2"])],
+)
+def test_fixed_errors_with_duplicates_are_not_committed(
+    abacus_connection, abacus, quarantined_products, loaded_products, refused, caplog
+):
+    abacus, statements = abacus
+    abacus.WorkingDay = WORKING_DAY
+    abacus._t18_previous_index = (WORKING_DAY, T18PreviousIndex(make_t18_previous()))
+    quarantined = make_atmp_t17().head(2)
+    quarantined.columns = quarantined.columns.str.lower()
+    quarantined["id_product"] = quarantined_products
+    quarantined["autoid"] = [1, 2]
+    quarantined["edited"] = True
+    abacus_connection.results[f"FROM s.{ERR_ATMP_T17_TABLE} ORDER BY"] = quarantined
+    abacus_connection.results[f"SELECT DISTINCT id_product FROM s.{ATMP_T17_TABLE}"] = (
+        loaded_products
+    )
+
+    assert abacus.commit_fixed_errors_into_t17(True) is None
+
+    assert "COMMIT" not in statements
+    assert not any(statement.startswith("COPY") for statement in statements)
+    assert f"duplicate products: {', '.join(refused)}" in caplog.text
+
+
+def test_an_empty_quarantine_only_clears_the_rows_nobody_edited(abacus):
+    abacus, statements = abacus
+
+    abacus.bulk_insert_err_atmp_t17(pd.DataFrame())
+
+    assert statements[: statements.index("COMMIT")] == [
+        f"DELETE FROM s.{ERR_ATMP_T17_TABLE} WHERE NOT edited"
+    ]
+
+
+def test_products_being_fixed_are_not_quarantined_again(abacus_connection, abacus):
+    abacus, statements = abacus
+    abacus_connection.results[
+        f"SELECT DISTINCT id_product FROM s.{ERR_ATMP_T17_TABLE}"
+    ] = [("P1",)]
+    duplicates = pd.DataFrame({"ID_PRODUCT": ["P1", "P2", "P1", "P2"]})
+
+    abacus.bulk_insert_err_atmp_t17(duplicates)
+
+    # AUTOID is left to the table's sequence
+    assert f"COPY s.{ERR_ATMP_T17_TABLE}" in statements
+    (copied,) = abacus_connection.copied
+    assert copied.split() == ["P2", "P2"]
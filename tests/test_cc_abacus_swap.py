@@ -0,0 +1,202 @@
+import pandas as pd
+import pytest
+
+from src.cc_abacus_da import (
+    ATMP_T17_TABLE,
+    ATMP_T18_TABLE,
+    ERR_ATMP_T17_TABLE,
+    CC_AbacusDA,
+)
+
+INDEXES = {
+    f"s.{ATMP_T17_TABLE}": [
+        (
+            "atmp_t17_pkey",
+            f"CREATE UNIQUE INDEX atmp_t17_pkey ON s.{ATMP_T17_TABLE} USING btree (id_product)",
+            "atmp_t17_pkey",
+            "p",
+        )
+    ],
+    f"s.{ATMP_T18_TABLE}": [
+        (
+            "ix_atmp_t18_product",
+            f"CREATE INDEX ix_atmp_t18_product ON s.{ATMP_T18_TABLE} USING btree (id_product)",
+            None,
+            None,
+        )
+    ],
+}
+
+
+COLUMNS = {
+    ATMP_T17_TABLE: [("id_product", "varchar"), ("days_past_due", "int4")],
+    ERR_ATMP_T17_TABLE: [
+        ("id_product", "varchar"),
+        ("days_past_due", "int4"),
+        ("autoid", "int4"),
+    ],
+}
+
+
+# What the DA reads about the ATMP tables while it swaps them
+CATALOG = {
+    "pg_index": lambda params: INDEXES[params[0]],
+    "role_table_grants": [("reporting", "SELECT")],
+    "information_schema.columns": lambda params: COLUMNS[params[1]],
+}
+
+
+@pytest.fixture
+def abacus(abacus_connection, monkeypatch):
+    abacus_connection.results.update(CATALOG)
+    monkeypatch.setenv("LoadMode", "swap")
+    abacus = CC_AbacusDA()
+    abacus_connection.statements.clear()
+    return abacus, abacus_connection.statements
+
+
+def test_swap_load_copies_into_shadow_tables_and_renames_them(abacus):
+    abacus, statements = abacus
+
+    abacus.begin_atmp_load(True)
+    abacus.insert_atmp_chunk(
+        pd.DataFrame({"ID_PRODUCT": ["P1"], "PERIOD": [1]}),
+        pd.DataFrame({"ID_PRODUCT": ["P1"]}),
+    )
+    abacus.finish_atmp_load()
+
+    assert not any("TRUNCATE" in statement for statement in statements)
+    copies = [statement for statement in statements if statement.startswith("COPY")]
+    assert copies == [f"COPY s.{ATMP_T17_TABLE}_new", f"COPY s.{ATMP_T18_TABLE}_new"]
+    assert f"CREATE UNLOGGED TABLE s.{ATMP_T17_TABLE}_new" in " ".join(statements)
+    assert (
+        f"CREATE UNIQUE INDEX atmp_t17_pkey_new ON s.{ATMP_T17_TABLE}_new "
+        "USING btree (id_product)"
+    ) in statements
+    assert f'GRANT SELECT ON s.{ATMP_T18_TABLE}_new TO "reporting"' in statements
+
+    # The renames are the only statements of the swap transaction
+    swap = statements.index("SET LOCAL lock_timeout = '30s'")
+    for table in (ATMP_T17_TABLE, ATMP_T18_TABLE):
+        assert statements.index(f"ANALYZE s.{table}_new") < swap
+    assert statements[swap - 1] == "COMMIT"
+    end = statements.index("COMMIT", swap)
+    renames = [
+        statement
+        for statement in statements[swap + 1 : end]
+        if not statement.startswith("SELECT")
+    ]
+    assert renames == [
+        f"ALTER TABLE s.{ATMP_T17_TABLE} RENAME TO {ATMP_T17_TABLE}_old",
+        f"ALTER TABLE s.{ATMP_T17_TABLE}_new RENAME TO {ATMP_T17_TABLE}",
+        f"ALTER TABLE s.{ATMP_T18_TABLE} RENAME TO {ATMP_T18_TABLE}_old",
+        f"ALTER TABLE s.{ATMP_T18_TABLE}_new RENAME TO {ATMP_T18_TABLE}",
+        f"ALTER TABLE s.{ATMP_T17_TABLE}_old RENAME CONSTRAINT atmp_t17_pkey "
+        "TO atmp_t17_pkey_old",
+        f"ALTER TABLE s.{ATMP_T17_TABLE} RENAME CONSTRAINT atmp_t17_pkey_new "
+        "TO atmp_t17_pkey",
+        "ALTER INDEX s.ix_atmp_t18_product RENAME TO ix_atmp_t18_product_old",
+        "ALTER INDEX s.ix_atmp_t18_product_new RENAME TO ix_atmp_t18_product",
+    ]
+    assert statements[end + 1].startswith(f"DROP TABLE s.{ATMP_T17_TABLE}_old")
+    assert abacus.atmp_t17_table == ATMP_T17_TABLE
+
+
+def test_failed_swap_load_only_drops_the_shadow_tables(abacus):
+    abacus, statements = abacus
+
+    abacus.begin_atmp_load(True)
+    del statements[:]
+    abacus.abort_atmp_load()
+
+    assert statements[:2] == [
+        f"DROP TABLE IF EXISTS s.{ATMP_T17_TABLE}_new, s.{ATMP_T18_TABLE}_new",
+        "COMMIT",
+    ]
+    assert not any(statement.startswith("ALTER") for statement in statements)
+    assert abacus.atmp_t18_table == ATMP_T18_TABLE
+
+
+def test_swap_keeps_serial_and_identity_sequences(abacus, abacus_connection):
+    abacus, statements = abacus
+    # ATMP_T17 has a serial AUTOID, ATMP_T18 an identity one
+    abacus_connection.results["pg_depend"] = lambda params: (
+        [(f"s.{ATMP_T17_TABLE}_autoid_seq", "autoid")]
+        if params[0] == f"s.{ATMP_T17_TABLE}_old"
+        else []
+    )
+    abacus_connection.results["attidentity"] = lambda params: (
+        [("autoid",)] if params[0] == f"s.{ATMP_T18_TABLE}" else []
+    )
+
+    abacus.begin_atmp_load(True)
+    abacus.finish_atmp_load()
+
+    assert "INCLUDING IDENTITY" in " ".join(statements)
+    (setval,) = [statement for statement in statements if "setval" in statement]
+    index = statements.index(setval)
+    assert abacus_connection.params[index] == (
+        f"s.{ATMP_T18_TABLE}_new",
+        "autoid",
+        f"s.{ATMP_T18_TABLE}",
+        "autoid",
+    )
+    # Owned by the live table before the old one is dropped
+    owned = statements.index(
+        f"ALTER SEQUENCE s.{ATMP_T17_TABLE}_autoid_seq "
+        f"OWNED BY s.{ATMP_T17_TABLE}.autoid"
+    )
+    assert owned < statements.index(
+        f"DROP TABLE s.{ATMP_T17_TABLE}_old, s.{ATMP_T18_TABLE}_old"
+    )
+
+
+def test_failed_drop_of_the_old_tables_is_not_a_failed_load(
+    abacus, abacus_connection, caplog
+):
+    abacus, statements = abacus
+
+    def drop_fails(params):
+        raise Exception("cannot drop table because other objects depend on it")
+
+    abacus.begin_atmp_load(True)
+    abacus_connection.results["_old, s."] = drop_fails
+
+    assert abacus.finish_atmp_load() is True
+    (drop,) = [
+        i for i, query in enumerate(statements) if query.startswith("DROP TABLE s.")
+    ]
+    assert statements[drop + 1] == "ROLLBACK"
+    assert "Dropping the old ATMP tables failed" in caplog.text
+
+
+def test_swap_load_refuses_tables_with_foreign_keys_or_triggers(
+    abacus, abacus_connection
+):
+    abacus, statements = abacus
+    abacus_connection.results["pg_trigger"] = lambda params: (
+        [("atmp_t18_audit",)] if params[0] == f"s.{ATMP_T18_TABLE}" else []
+    )
+
+    with pytest.raises(Exception, match="foreign keys or triggers atmp_t18_audit"):
+        abacus.begin_atmp_load(True)
+
+    assert not any("CREATE UNLOGGED" in statement for statement in statements)
+    assert abacus.atmp_t17_table == ATMP_T17_TABLE
+
+
+@pytest.mark.parametrize("chunked", [False, True])
+def test_failed_load_is_logged(abacus, chunked, caplog):
+    abacus, _ = abacus
+
+    def handle_working_day(working_day):
+        raise Exception("w02_ccworking_day is locked")
+
+    abacus.handle_working_day = handle_working_day
+    frame = pd.DataFrame({"ID_PRODUCT": ["P1"]})
+
+    if chunked:
+        assert abacus.do_atmp_abacus_cc_job_chunked([frame], False) is False
+    else:
+        assert abacus.do_atmp_abacus_cc_job(frame, False) is False
+    assert "w02_ccworking_day is locked" in caplog.text
@@ -0,0 +1,199 @@
+from datetime import datetime
+
+import pandas as pd
+import pytest
+
+from src.cc_abacus_da import ATMP_T17_TABLE, ATMP_T18_TABLE, CC_AbacusDA
+from src.cc_abacus_transform import (
+    ATMP_T18_COLUMNS,
+    ATMPT18Accumulator,
+    T18PreviousIndex,
+    build_atmp_t17_t18,
+)
+from src.run_log import RunLog
+
+WORKING_DAY = datetime(2024, 10, 15)
+
+
+def make_atmp_t17():
+    df = pd.DataFrame(
+        {
+            "ID_PRODUCT": ["P1", "P2", "P3", "P4", "P5"],
+            "LAST_STATEMENT_BALANCE": [100.0, 250.5, "n/a", 80.0, 40.0],
+            "SUM_OF_PAYMENTS": [20.0, 0.0, 5.0, "bad", 10.0],
+            "LAST_BALANCE_SIGN": ["0", "1", "0", "1", "0"],
+            "DAYS_PAST_DUE": [0, 12, 3, 0, 45],
+            "PERIOD": [20241001, 20241001, 20241001, 20241001, 20241001],
+        }
+    )
+    # Columns added by AbacusCCLoaderFromCentaur.clean_and_load_cc
+    df["NUMBER_OF_PAYMENTS_PAST_DUE"] = 0
+    df["DATE_SINCE_PAST_DUE"] = pd.NaT
+    df["CARD_BALANCE"] = 0.0
+    df["DPD_HO"] = 0
+    df["IS_JOINT"] = 0
+    return df
+
+
+def make_t18_previous(products=("P2", "P5")):
+    rows = []
+    for product in products:
+        for period, principal_date in (
+            (20240801, "2024-08-25"),
+            (20240901, "2024-09-25"),
+            (20241001, "2024-10-25"),
+        ):
+            rows.append(
+                {
+                    "ID_PRODUCT": product,
+                    "PRINCIPAL_PAYMENT_AMOUNT": 15.0,
+                    "PRINCIPAL_PAYMENT_DATE": pd.Timestamp(principal_date),
+                    "INTEREST_PAYMENT_DATE": pd.Timestamp(principal_date),
+                    "INTEREST_PAYMENT_AMOUNT": 1.5,
+                    "CUSTOMER_NUMBER": f"C-{product}",
+                    "MINIMUM_PAYMENT": 16.5,
+                    "PENALTY_INTEREST_RATE": 0.02,
+                    "PENALTY_INTEREST_AMOUNT": 0.0,
+                    "PERIOD": period,
+                    "DUE_DATE_DLQ": pd.Timestamp(principal_date),
+                    "LAST_SUM_OF_PAYMENT": 3.0,
+                }
+            )
+    columns = ATMP_T18_COLUMNS[1:-1]
+    return pd.DataFrame(rows, columns=columns).sort_values("PERIOD", kind="stable")
+
+
+def make_abacus(t18_previous, engine):
+    abacus = CC_AbacusDA.__new__(CC_AbacusDA)
+    abacus.WorkingDay = WORKING_DAY
+    abacus.transform_engine = engine
+    abacus._t18_previous_index = None
+    abacus.atmp_t17_table = ATMP_T17_TABLE
+    abacus.atmp_t18_table = ATMP_T18_TABLE
+    abacus.run_log = RunLog.disabled()
+    abacus.get_t18_previous_values = lambda: t18_previous.copy()
+    abacus.get_atmp_t18 = lambda: pd.DataFrame(columns=ATMP_T18_COLUMNS)
+    return abacus
+
+
+@pytest.mark.parametrize("products", [(), ("P2", "P5"), ("P5", "P4", "P2", "P3")])
+def test_vectorized_engine_matches_row_path(products):
+    t18_previous = make_t18_previous(products=products)
+    by_rows = make_atmp_t17()
+    vectorized = make_atmp_t17()
+
+    t18_by_rows = make_abacus(t18_previous, "rows").build_atmp_t18_data_table(by_rows)
+    t18_vectorized = make_abacus(t18_previous, "vectorized").build_atmp_t18_data_table(
+        vectorized
+    )
+
+    pd.testing.assert_frame_equal(
+        vectorized, by_rows, check_dtype=False, check_exact=True
+    )
+    assert t18_vectorized.columns.tolist() == t18_by_rows.columns.tolist()
+    if not t18_by_rows.empty:
+        pd.testing.assert_frame_equal(
+            t18_vectorized, t18_by_rows, check_dtype=False, check_exact=True
+        )
+    assert len(t18_vectorized) == len(t18_by_rows)
+
+
+def test_nullable_integer_columns():
+    atmp_t17 = make_atmp_t17()
+    atmp_t17 = atmp_t17.astype({"DAYS_PAST_DUE": "Int64", "PERIOD": "Int64"})
+    atmp_t18 = build_atmp_t17_t18(atmp_t17, make_t18_previous(), WORKING_DAY)
+
+    assert atmp_t17["NUMBER_OF_PAYMENTS_PAST_DUE"].tolist() == [0, 2, 0, 0, 2]
+    assert atmp_t18["IS_PASTDUE"].tolist() == ["1", "1", "0"] * 2
+
+
+def test_t17_derived_values():
+    atmp_t17 = make_atmp_t17()
+    build_atmp_t17_t18(atmp_t17, make_t18_previous(), WORKING_DAY)
+
+    assert atmp_t17["LAST_STATEMENT_BALANCE"].tolist() == [
+        100.0,
+        -250.5,
+        0.0,
+        -80.0,
+        40.0,
+    ]
+    assert atmp_t17["CARD_BALANCE"].tolist() == [80.0, -250.5, -5.0, -80.0, 30.0]
+    assert atmp_t17["DATE_SINCE_PAST_DUE"].tolist()[1:3] == [
+        pd.Timestamp("2024-10-03"),
+        pd.Timestamp("2024-10-12"),
+    ]
+    assert pd.isna(atmp_t17.loc[0, "DATE_SINCE_PAST_DUE"])
+    # two older periods plus the current one, whose principal date has not passed
+    assert atmp_t17["NUMBER_OF_PAYMENTS_PAST_DUE"].tolist() == [0, 2, 0, 0, 2]
+
+
+def test_t18_schedule():
+    atmp_t17 = make_atmp_t17()
+    atmp_t18 = build_atmp_t17_t18(atmp_t17, make_t18_previous(), WORKING_DAY)
+
+    assert atmp_t18.columns.tolist() == ATMP_T18_COLUMNS
+    assert atmp_t18["ID_PRODUCT"].tolist() == ["P2"] * 3 + ["P5"] * 3
+    assert atmp_t18["PERIOD"].tolist() == [20240801, 20240901, 20241001] * 2
+    assert atmp_t18["IS_PASTDUE"].tolist() == ["1", "1", "0"] * 2
+    assert atmp_t18["LAST_SUM_OF_PAYMENT"].tolist() == [3.0, 3.0, 0.0, 3.0, 3.0, 10.0]
+    assert (atmp_t18["WORKING_DAY"] == pd.Timestamp(WORKING_DAY)).all()
+
+
+def test_no_delinquent_cards_gives_empty_schedule():
+    atmp_t17 = make_atmp_t17()
+    atmp_t17["DAYS_PAST_DUE"] = 0
+    atmp_t18 = build_atmp_t17_t18(atmp_t17, make_t18_previous(), WORKING_DAY)
+
+    assert atmp_t18.empty
+    assert atmp_t18.columns.tolist() == ATMP_T18_COLUMNS
+
+
+def test_engine_errors_are_wrapped():
+    abacus = make_abacus(make_t18_previous(), "vectorized")
+    atmp_t17 = make_atmp_t17().drop(columns=["PERIOD"])
+
+    with pytest.raises(Exception, match="BuildATMP_T18 failed"):
+        abacus.build_atmp_t18_data_table(atmp_t17)
+
+
+def test_t18_previous_index_lookups():
+    t18_previous = make_t18_previous(products=("P5", "P2", "P9"))
+    index = T18PreviousIndex(t18_previous)
+
+    assert len(index) == 9
+    assert "P2" in index and "P1" not in index
+    assert index.get("P2")["PERIOD"].tolist() == [20240801, 20240901, 20241001]
+    assert index.get("P1").empty
+
+    owner, rows = index.take(["P9", "P1", "P2"])
+    assert owner.tolist() == [0, 0, 0, 2, 2, 2]
+    assert index.frame["ID_PRODUCT"].iloc[rows].tolist() == ["P9"] * 3 + ["P2"] * 3
+    assert (
+        index.frame["PERIOD"].iloc[rows].tolist() == [20240801, 20240901, 20241001] * 2
+    )
+
+
+def test_t18_previous_index_is_loaded_once_per_working_day():
+    abacus = make_abacus(make_t18_previous(), "vectorized")
+    loads = []
+    abacus.get_t18_previous_values = lambda: loads.append(1) or make_t18_previous()
+
+    first = abacus.get_t18_previous_index()
+    assert abacus.get_t18_previous_index() is first
+    abacus.WorkingDay = datetime(2024, 10, 16)
+    assert abacus.get_t18_previous_index() is not first
+    assert len(loads) == 2
+
+
+def test_accumulator_builds_one_frame():
+    atmp_t18 = ATMPT18Accumulator()
+    assert atmp_t18.to_frame().columns.tolist() == ATMP_T18_COLUMNS
+
+    atmp_t18.append({"ID_PRODUCT": "P1", "PERIOD": 20241001, "IS_PASTDUE": "1"})
+    atmp_t18.append({"ID_PRODUCT": "P2", "PERIOD": 20240901})
+    frame = atmp_t18.to_frame()
+
+    assert len(atmp_t18) == 2
+    assert frame["ID_PRODUCT"].tolist() == ["P1", "P2"]
+    assert frame["IS_PASTDUE"].tolist() == ["1", None]
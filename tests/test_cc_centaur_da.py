@@ -0,0 +1,140 @@
+from decimal import Decimal
+
+import pandas as pd
+import pytest
+
+from src.cc_centaur_da import CC_DATA_COLUMNS, CCCentaurDA, conform_cc_data
+from src.connection_pool import close_pools
+from tests.conftest import FakeConnection
+
+
+def centaur_connection(cc_rows):
+    return FakeConnection(
+        {
+            "vw_CC_LastDLQ": [{"FILE_DATE": "20241015"}],
+            "vw_CC_AbacusData": lambda params: list(cc_rows),
+        },
+        default_rows=[(1,)],
+    )
+
+
+def make_row(product, days_past_due):
+    values = dict.fromkeys(CC_DATA_COLUMNS)
+    values.update(
+        ID_PRODUCT=product,
+        DAYS_PAST_DUE=days_past_due,
+        SUM_OF_PAYMENTS=Decimal("10.50"),
+        LAST_STATEMENT_BALANCE=None,
+        PERIOD=20241001,
+    )
+    return tuple(values[column] for column in CC_DATA_COLUMNS)
+
+
+@pytest.fixture
+def connections(monkeypatch):
+    rows = [make_row(f"P{i}", i % 3) for i in range(7)]
+    opened = []
+    calls = []
+
+    def connect(*args, **kwargs):
+        calls.append(kwargs)
+        opened.append(centaur_connection(rows))
+        return opened[-1]
+
+    close_pools()
+    monkeypatch.setenv("CentaurLoginTimeout", "15")
+    monkeypatch.setattr("pymssql.connect", connect)
+    yield opened
+    close_pools()
+    assert calls == [{"login_timeout": 15, "timeout": 0}] * len(opened)
+
+
+def test_iter_cc_data_yields_fixed_size_chunks(connections):
+    chunks = list(CCCentaurDA().iter_cc_data(chunk_size=3))
+
+    assert [len(chunk) for chunk in chunks] == [3, 3, 1]
+    assert connections[0].fetch_sizes == [3, 3, 3, 3]
+    assert pd.concat(chunks)["ID_PRODUCT"].tolist() == [f"P{i}" for i in range(7)]
+
+
+def test_iter_cc_data_applies_explicit_dtypes(connections):
+    chunk = next(CCCentaurDA().iter_cc_data(chunk_size=5))
+
+    assert chunk.columns.tolist() == CC_DATA_COLUMNS
+    assert chunk["SUM_OF_PAYMENTS"].dtype == "float64"
+    assert chunk["LAST_STATEMENT_BALANCE"].dtype == "float64"
+    assert chunk["DAYS_PAST_DUE"].dtype == "Int32"
+    assert chunk["PERIOD"].dtype == "Int32"
+    assert chunk["ACCOUNT_CURRENCY"].dtype == "category"
+    assert chunk["WORKING_DAY"].dtype == "datetime64[ns]"
+
+
+def test_schema_violations_are_reported_together():
+    df = pd.DataFrame(
+        {
+            "ID_PRODUCT": ["P1", "P2", "P3", "P4"],
+            "WORKING_DAY": ["20241015", "20241015", "not a day", None],
+            "DAYS_PAST_DUE": [3, "12", 4.5, 2**40],
+            "SUM_OF_PAYMENTS": [Decimal("10.50"), "n/a", None, 1],
+            "ACCOUNT_CURRENCY": ["EUR", "ALL", "EUR", None],
+            "PERIOD": [20241001, 20241001, None, 20241001],
+        }
+    )
+
+    conformed, violations = conform_cc_data(df)
+
+    assert conformed["WORKING_DAY"].tolist()[:2] == [pd.Timestamp("2024-10-15")] * 2
+    assert conformed["DAYS_PAST_DUE"].tolist()[:2] == [3, 12]
+    assert conformed["DAYS_PAST_DUE"].isna().tolist() == [False, False, True, True]
+    assert conformed["SUM_OF_PAYMENTS"].tolist()[0] == 10.5
+    assert conformed["ACCOUNT_CURRENCY"].cat.categories.tolist() == ["ALL", "EUR"]
+    assert conformed["PERIOD"].isna().tolist() == [False, False, True, False]
+    assert violations[["COLUMN", "ID_PRODUCT"]].values.tolist() == [
+        ["WORKING_DAY", "P3"],
+        ["DAYS_PAST_DUE", "P3"],
+        ["DAYS_PAST_DUE", "P4"],
+        ["SUM_OF_PAYMENTS", "P2"],
+    ]
+    assert violations["VALUE"].tolist() == ["not a day", 4.5, 2**40, "n/a"]
+
+
+def test_reads_collect_schema_violations(connections):
+    rows = [make_row("P1", 1), make_row("P2", "soon")]
+    centaur = CCCentaurDA()
+    df = centaur.apply_cc_data_dtypes(
+        pd.DataFrame.from_records(rows, columns=CC_DATA_COLUMNS)
+    )
+
+    assert df["DAYS_PAST_DUE"].isna().tolist() == [False, True]
+    (violations,) = centaur.schema_violations
+    assert violations["ID_PRODUCT"].tolist() == ["P2"]
+
+
+def test_iter_cc_data_needs_a_chunk_size(monkeypatch):
+    monkeypatch.delenv("CentaurChunkSize", raising=False)
+    with pytest.raises(ValueError):
+        next(CCCentaurDA().iter_cc_data())
+
+
+def test_run_shares_one_session_and_closes_it(connections):
+    centaur = CCCentaurDA()
+
+    assert centaur.centaur_working_day.strftime("%Y-%m-%d") == "2024-10-15"
+    assert sum(len(chunk) for chunk in centaur.iter_cc_data(chunk_size=4)) == 7
+    assert CCCentaurDA().get_delinquency_working_day() is not None
+
+    assert len(connections) == 1
+    assert len(connections[0].executed("SELECT")) == 3
+    assert connections[0].closed == 0
+    close_pools()
+    assert connections[0].closed == 1
+
+
+def test_abandoned_stream_returns_its_connection(connections):
+    centaur = CCCentaurDA()
+    chunks = centaur.iter_cc_data(chunk_size=2)
+    next(chunks)
+    chunks.close()
+
+    assert centaur.pool._size == 1
+    assert [conn for conn, _ in centaur.pool._idle] == connections
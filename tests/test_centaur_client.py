@@ -0,0 +1,225 @@
+import threading
+
+import pytest
+from requests import Response
+from zeep.transports import Transport
+
+from src import centaur_client as centaur_client_module
+from src import load_gate
+from src.abacus_cc_loader_from_centaur import AbacusCCLoaderFromCentaur
+from src.centaur_client import (
+    PROCESS_DELIQUENCY_TIMEOUT,
+    TRANSFER_PAYLINK_TIMEOUT,
+    centaur_client,
+    clear_centaur_clients,
+)
+from src.credit_card_abacus_service import CreditCardAbacusService
+
+OPERATIONS = ["TransferPaylinkFile", "ProcessDeliquency"]
+
+WSDL = """<?xml version="1.0" encoding="utf-8"?>
+<wsdl:definitions xmlns:wsdl="http://schemas.xmlsoap.org/wsdl/"
+    xmlns:soap="http://schemas.xmlsoap.org/wsdl/soap/"
+    xmlns:s="http://www.w3.org/2001/XMLSchema"
+    xmlns:tns="http://tempuri.org/" targetNamespace="http://tempuri.org/">
+  <wsdl:types>
+    <s:schema elementFormDefault="qualified" targetNamespace="http://tempuri.org/">
+      {elements}
+    </s:schema>
+  </wsdl:types>
+  {messages}
+  <wsdl:portType name="CentaurServiceSoap">{port_operations}</wsdl:portType>
+  <wsdl:binding name="CentaurServiceSoap" type="tns:CentaurServiceSoap">
+    <soap:binding transport="http://schemas.xmlsoap.org/soap/http"/>
+    {binding_operations}
+  </wsdl:binding>
+  <wsdl:service name="CentaurService">
+    <wsdl:port name="CentaurServiceSoap" binding="tns:CentaurServiceSoap">
+      <soap:address location="http://centaur.local/CentaurService.asmx"/>
+    </wsdl:port>
+  </wsdl:service>
+</wsdl:definitions>
+"""
+
+RESPONSE = """<?xml version="1.0" encoding="utf-8"?>
+<soap:Envelope xmlns:soap="http://schemas.xmlsoap.org/soap/envelope/">
+  <soap:Body>
+    <{op}Response xmlns="http://tempuri.org/"><{op}Result>true</{op}Result></{op}Response>
+  </soap:Body>
+</soap:Envelope>
+"""
+
+
+def write_wsdl(path):
+    elements = messages = port_operations = binding_operations = ""
+    for op in OPERATIONS:
+        elements += f"""
+      <s:element name="{op}"><s:complexType/></s:element>
+      <s:element name="{op}Response"><s:complexType><s:sequence>
+        <s:element minOccurs="1" maxOccurs="1" name="{op}Result" type="s:boolean"/>
+      </s:sequence></s:complexType></s:element>"""
+        messages += f"""
+  <wsdl:message name="{op}SoapIn"><wsdl:part name="parameters" element="tns:{op}"/></wsdl:message>
+  <wsdl:message name="{op}SoapOut"><wsdl:part name="parameters" element="tns:{op}Response"/></wsdl:message>"""
+        port_operations += f"""
+    <wsdl:operation name="{op}">
+      <wsdl:input message="tns:{op}SoapIn"/><wsdl:output message="tns:{op}SoapOut"/>
+    </wsdl:operation>"""
+        binding_operations += f"""
+    <wsdl:operation name="{op}">
+      <soap:operation soapAction="http://tempuri.org/{op}" style="document"/>
+      <wsdl:input><soap:body use="literal"/></wsdl:input>
+      <wsdl:output><soap:body use="literal"/></wsdl:output>
+    </wsdl:operation>"""
+    path.write_text(
+        WSDL.format(
+            elements=elements,
+            messages=messages,
+            port_operations=port_operations,
+            binding_operations=binding_operations,
+        )
+    )
+    return str(path)
+
+
+@pytest.fixture
+def wsdl(tmp_path, monkeypatch):
+    monkeypatch.delenv("CentaurWsdlCache", raising=False)
+    monkeypatch.delenv("CentaurWsdlFile", raising=False)
+    clear_centaur_clients()
+    yield write_wsdl(tmp_path / "CentaurService.wsdl")
+    clear_centaur_clients()
+
+
+@pytest.fixture
+def calls(monkeypatch):
+    """Answers every SOAP call locally, recording (operation, timeout)."""
+    calls = []
+
+    def post(transport, address, message, headers):
+        op = headers["SOAPAction"].strip('"').rsplit("/", 1)[-1]
+        calls.append((op, transport.operation_timeout))
+        response = Response()
+        response.status_code = 200
+        response.headers["Content-Type"] = "text/xml; charset=utf-8"
+        response._content = RESPONSE.format(op=op).encode("utf-8")
+        return response
+
+    monkeypatch.setattr("zeep.transports.Transport.post", post)
+    return calls
+
+
+def test_client_is_created_once_per_wsdl(wsdl, monkeypatch):
+    created = []
+    create = centaur_client_module.create_centaur_client
+    monkeypatch.setattr(
+        centaur_client_module,
+        "create_centaur_client",
+        lambda url: created.append(url) or create(url),
+    )
+
+    client = centaur_client(wsdl)
+
+    assert centaur_client(wsdl) is client
+    assert created == [wsdl]
+
+
+def test_operations_use_their_own_timeout(wsdl, calls):
+    client = centaur_client(wsdl)
+
+    with client.transport.settings(timeout=TRANSFER_PAYLINK_TIMEOUT):
+        assert client.service.TransferPaylinkFile() is True
+    with client.transport.settings(timeout=PROCESS_DELIQUENCY_TIMEOUT):
+        assert client.service.ProcessDeliquency() is True
+
+    assert calls == [
+        ("TransferPaylinkFile", TRANSFER_PAYLINK_TIMEOUT),
+        ("ProcessDeliquency", PROCESS_DELIQUENCY_TIMEOUT),
+    ]
+    assert client.transport.operation_timeout is None
+
+
+def test_wsdl_cache_is_shared_across_clients(wsdl, tmp_path, monkeypatch):
+    monkeypatch.setenv("CentaurWsdlCache", str(tmp_path / "wsdl-cache.db"))
+    url = "http://centaur.local/CentaurService.asmx?WSDL"
+    downloads = []
+
+    def load(transport, address):
+        downloads.append(address)
+        with open(wsdl, "rb") as f:
+            return f.read()
+
+    monkeypatch.setattr("zeep.transports.Transport._load_remote_data", load)
+
+    centaur_client(url)
+    clear_centaur_clients()
+    centaur_client(url)
+
+    assert downloads == [url]
+
+
+def test_service_reuses_the_client(wsdl, calls, monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+    service = CreditCardAbacusService()
+    service.centaur_url = wsdl
+
+    service.transfer_paylink_file()
+    service.transfer_paylink_file()
+
+    assert calls == [("TransferPaylinkFile", TRANSFER_PAYLINK_TIMEOUT)] * 2
+
+
+@pytest.fixture
+def service(wsdl, monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+    service = CreditCardAbacusService()
+    service.centaur_url = wsdl
+    monkeypatch.setattr(load_gate, "is_load_fin", lambda: True)
+    monkeypatch.setattr(load_gate, "is_ok_to_call_deliquency", lambda: True)
+    return service
+
+
+def test_async_delinquency_prepares_the_load_meanwhile(service, calls, monkeypatch):
+    service.delinquency_mode = "async"
+    service.delinquency_poll_interval = 0.01
+    prepared = ("centaur", "abacus")
+    load_prepared = threading.Event()
+    loads = []
+
+    def prepare_load():
+        load_prepared.set()
+        return prepared
+
+    # Delinquency only finishes once the load has been prepared
+    post = Transport.post
+    monkeypatch.setattr(
+        "zeep.transports.Transport.post",
+        lambda *args: load_prepared.wait(5) and post(*args),
+    )
+    monkeypatch.setattr(AbacusCCLoaderFromCentaur, "prepare_load", prepare_load)
+    monkeypatch.setattr(
+        AbacusCCLoaderFromCentaur,
+        "load",
+        lambda is_service, prepared=None: loads.append(prepared)
+        or AbacusCCLoaderFromCentaur.LoadStatus.SUCCESS,
+    )
+
+    service.do_load()
+
+    assert calls == [("ProcessDeliquency", PROCESS_DELIQUENCY_TIMEOUT)]
+    assert loads == [prepared]
+
+
+def test_sync_delinquency_loads_without_preparing(service, calls, monkeypatch):
+    loads = []
+    monkeypatch.setattr(
+        AbacusCCLoaderFromCentaur,
+        "load",
+        lambda is_service, prepared=None: loads.append(prepared)
+        or AbacusCCLoaderFromCentaur.LoadStatus.SUCCESS,
+    )
+
+    service.do_load()
+
+    assert calls == [("ProcessDeliquency", PROCESS_DELIQUENCY_TIMEOUT)]
+    assert loads == [None]
@@ -0,0 +1,159 @@
+import threading
+
+import pytest
+
+from src import connection_pool
+from src.cc_abacus_da import CC_AbacusDA
+from src.connection_pool import ConnectionPool, PoolTimeout, close_pools
+from src.run_state import clear_run_state
+from tests.conftest import WORKING_DAYS, FakeConnection
+
+
+def make_pool(**kwargs):
+    connections = []
+
+    def connect():
+        connections.append(FakeConnection())
+        return connections[-1]
+
+    pool = ConnectionPool(connect, is_healthy=lambda conn: conn.closed == 0, **kwargs)
+    return pool, connections
+
+
+def test_sequential_checkouts_reuse_one_connection():
+    pool, connections = make_pool()
+
+    for _ in range(3):
+        with pool.connection() as conn:
+            assert conn is connections[0]
+
+    assert pool.connects == 1
+
+
+def test_nested_checkouts_share_the_outer_connection():
+    pool, connections = make_pool(max_size=1, checkout_timeout=0.1)
+
+    with pool.connection() as outer:
+        with pool.connection() as inner:
+            assert inner is outer
+        # still held by the outer block
+        assert pool._idle == []
+
+    assert [conn for conn, _ in pool._idle] == [outer]
+
+
+def test_returned_connections_are_rolled_back():
+    pool, _ = make_pool()
+
+    with pytest.raises(RuntimeError):
+        with pool.connection() as conn:
+            raise RuntimeError("query failed")
+
+    assert conn.statements == ["ROLLBACK"]
+    with pool.connection() as again:
+        assert again is conn
+
+
+def test_closed_connections_are_replaced():
+    pool, connections = make_pool()
+
+    with pool.connection() as conn:
+        conn.close()
+    with pool.connection() as conn:
+        assert conn is connections[1]
+
+    assert pool.connects == 2
+
+
+def test_concurrent_threads_get_their_own_connection():
+    pool, connections = make_pool(max_size=2)
+    barrier = threading.Barrier(2)
+    seen = []
+
+    def worker():
+        with pool.connection() as conn:
+            seen.append(conn)
+            barrier.wait(timeout=5)
+
+    threads = [threading.Thread(target=worker) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(set(map(id, seen))) == 2
+
+
+def test_checkout_times_out_when_pool_is_exhausted():
+    pool, _ = make_pool(max_size=1, checkout_timeout=0.05)
+    held = threading.Event()
+    release = threading.Event()
+
+    def hold():
+        with pool.connection():
+            held.set()
+            release.wait(timeout=5)
+
+    thread = threading.Thread(target=hold)
+    thread.start()
+    held.wait(timeout=5)
+    with pytest.raises(PoolTimeout):
+        with pool.connection():
+            pass
+    release.set()
+    thread.join()
+
+
+def test_idle_connections_are_pinged_before_reuse():
+    pings = []
+
+    def ping(conn):
+        pings.append(conn)
+        if len(pings) > 1:
+            raise OSError("server went away")
+
+    pool, connections = make_pool(ping=ping, ping_interval=0)
+
+    with pool.connection():
+        pass
+    with pool.connection() as conn:
+        assert conn is connections[0]
+    with pool.connection() as conn:
+        assert conn is connections[1]
+
+    assert connections[0].closed == 1
+    assert len(pings) == 2
+
+
+def test_close_all_closes_idle_and_returned_connections():
+    pool, connections = make_pool()
+
+    with pool.connection():
+        with pool.connection():
+            pass
+    with pool.connection() as conn:
+        pool.close_all()
+
+    assert conn.closed == 1
+
+
+def test_abacus_run_makes_a_single_connection(monkeypatch):
+    connects = []
+
+    def connect(dsn):
+        connects.append(FakeConnection({"W01_WORKING_DAY": WORKING_DAYS}))
+        return connects[-1]
+
+    close_pools()
+    clear_run_state()
+    monkeypatch.setattr(connection_pool.psycopg2, "connect", connect)
+    try:
+        for _ in range(3):
+            abacus = CC_AbacusDA()
+            abacus.is_load_fin()
+            abacus.truncate_atmp_t17_dpd_credit_cards(True)
+        assert len(connects) == 1
+        assert connects[0].closed == 0
+    finally:
+        close_pools()
+    clear_run_state()
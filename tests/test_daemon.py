@@ -0,0 +1,107 @@
+import os
+import signal
+import threading
+import time
+
+from src import credit_card_abacus_service
+from src.credit_card_abacus_service import CreditCardAbacusService
+from src.daemon import Daemon
+
+
+class FakeService:
+    def __init__(self, on_run=None):
+        self.runs = 0
+        self.on_run = on_run
+
+    def run(self):
+        self.runs += 1
+        if self.on_run:
+            self.on_run(self.runs)
+
+
+def test_runs_every_interval_until_stopped():
+    service = FakeService()
+    daemon = Daemon(service, interval=0.01, jitter=0)
+    service.on_run = lambda runs: runs == 3 and daemon.stop()
+
+    daemon.serve()
+
+    assert service.runs == daemon.runs == 3
+
+
+def test_stop_interrupts_the_wait():
+    service = FakeService()
+    daemon = Daemon(service, interval=60, jitter=0)
+    threading.Timer(0.05, daemon.stop).start()
+
+    started = time.monotonic()
+    daemon.serve()
+
+    assert service.runs == 1
+    assert time.monotonic() - started < 5
+
+
+def test_failed_run_does_not_stop_the_daemon():
+    daemon = Daemon(None, interval=0.01, jitter=0)
+
+    def run(runs):
+        if runs == 2:
+            daemon.stop()
+        raise Exception("Centaur down")
+
+    daemon.service = FakeService(run)
+    daemon.serve()
+
+    assert daemon.runs == 2
+
+
+def test_overrun_skips_missed_ticks():
+    now = [100.0]
+    daemon = Daemon(FakeService(), interval=30, jitter=0, clock=lambda: now[0])
+
+    # A run started at 0 took until 100: the ticks at 30, 60 and 90 are gone
+    assert daemon.next_tick(0.0) == 120.0
+    now[0] = 10.0
+    assert daemon.next_tick(0.0) == 30.0
+
+
+def test_sigterm_stops_after_the_current_run():
+    previous = signal.getsignal(signal.SIGTERM)
+    service = FakeService(lambda runs: os.kill(os.getpid(), signal.SIGTERM))
+    daemon = Daemon(service, interval=0.01, jitter=0)
+
+    daemon.run()
+
+    assert service.runs == 1
+    assert daemon.stopping
+    assert signal.getsignal(signal.SIGTERM) is previous
+
+
+def test_stopping_shuts_the_transform_workers_down(monkeypatch):
+    from src import sharded_transform
+
+    shutdowns = []
+    monkeypatch.setattr(
+        sharded_transform, "shutdown_transform_executors", lambda: shutdowns.append(1)
+    )
+    daemon = Daemon(FakeService(), interval=0.01, jitter=0)
+    daemon.service.on_run = lambda runs: daemon.stop()
+
+    daemon.run()
+
+    assert shutdowns == [1]
+
+
+def test_run_is_skipped_while_another_is_going(monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+    service = CreditCardAbacusService()
+    calls = []
+    monkeypatch.setattr(service, "transfer_paylink_file", lambda: calls.append(1))
+    monkeypatch.setattr(service, "do_load", lambda: None)
+
+    with credit_card_abacus_service._run_lock:
+        assert service.run() is False
+    assert calls == []
+
+    assert service.run() is True
+    assert calls == [1]
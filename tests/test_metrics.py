@@ -0,0 +1,137 @@
+import json
+import logging
+import threading
+
+import pandas as pd
+import pytest
+
+from src.cc_abacus_da import ATMP_T17_TABLE, CC_AbacusDA
+from src.metrics import Metrics, emit_run_metrics, instrumented, metrics
+from src.run_log import RunLog
+
+
+@pytest.fixture(autouse=True)
+def fresh_metrics():
+    metrics.reset()
+    yield
+    metrics.reset()
+
+
+def timer(name):
+    (stats,) = [stats for stats in metrics.timers() if stats.name == name]
+    return stats
+
+
+@instrumented("fake", exclude=("per_row",))
+class FakeDA:
+    def read(self, rows):
+        return pd.DataFrame({"ID_PRODUCT": range(rows)})
+
+    def fail(self):
+        raise ValueError("no connection")
+
+    def per_row(self):
+        return 1
+
+    @staticmethod
+    def chunks():
+        yield pd.DataFrame({"ID_PRODUCT": [1, 2]})
+        yield pd.DataFrame({"ID_PRODUCT": [3]})
+
+    @property
+    def working_day(self):
+        return "2024-10-15"
+
+
+def test_timers_add_up_calls_rows_and_bytes_across_threads():
+    registry = Metrics()
+
+    def copy():
+        for _ in range(100):
+            with registry.timer("copy", rows=10) as sample:
+                sample.bytes = 100
+
+    threads = [threading.Thread(target=copy) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    registry.count("duplicates", 3)
+    registry.count("duplicates")
+
+    (stats,) = registry.timers()
+    assert (stats.calls, stats.rows, stats.bytes, stats.errors) == (400, 4000, 40000, 0)
+    assert stats.rows_per_second > 0 and stats.bytes_per_second > 0
+    assert registry.counters() == {"duplicates": 4}
+
+
+def test_instrumented_times_public_methods():
+    da = FakeDA()
+
+    da.read(5)
+    da.read(2)
+    assert [len(chunk) for chunk in FakeDA.chunks()] == [2, 1]
+    assert da.working_day == "2024-10-15"
+    da.per_row()
+    with pytest.raises(ValueError):
+        da.fail()
+
+    assert (timer("fake.read").calls, timer("fake.read").rows) == (2, 7)
+    # A generator is timed per step, the last one finding it exhausted
+    assert (timer("fake.chunks").calls, timer("fake.chunks").rows) == (3, 3)
+    assert timer("fake.working_day").calls == 1
+    assert timer("fake.fail").errors == 1
+    assert "fake.per_row" not in [stats.name for stats in metrics.timers()]
+
+
+def test_copy_reports_rows_and_bytes_of_its_stage():
+    class Cursor:
+        def copy_expert(self, command, stream):
+            self.sent = stream.read()
+
+    abacus = CC_AbacusDA.__new__(CC_AbacusDA)
+    abacus.schema_used = "s"
+    abacus.copy_format = "csv"
+    abacus.run_log = RunLog.disabled()
+    cursor = Cursor()
+
+    frame = pd.DataFrame({"ID_PRODUCT": ["P1", "P2", "P3"], "DAYS_PAST_DUE": 1})
+    abacus.copy_frame(cursor, frame, ATMP_T17_TABLE, frame.columns.tolist())
+
+    stats = timer("stage.copy_t17")
+    assert (stats.rows, stats.bytes) == (3, len(cursor.sent))
+    assert timer("abacus.copy_frame").calls == 1
+
+
+def test_summary_and_prometheus_textfile(tmp_path):
+    with metrics.timer("stage.extract", rows=5):
+        pass
+    metrics.count('loader "quarantined" rows', 2)
+
+    summary = metrics.summary()
+    assert summary["peak_rss_bytes"] > 0
+    assert summary["timers"][0]["timer"] == "stage.extract"
+
+    file_name = tmp_path / "cc_abacus.prom"
+    metrics.write_prometheus(file_name)
+    text = file_name.read_text()
+    assert "# TYPE cc_abacus_timer_seconds gauge" in text
+    assert 'cc_abacus_timer_rows{timer="stage.extract"} 5' in text
+    assert 'cc_abacus_counter{counter="loader \\"quarantined\\" rows"} 2' in text
+    assert "cc_abacus_peak_rss_bytes " in text
+    assert [path.name for path in tmp_path.iterdir()] == ["cc_abacus.prom"]
+
+
+def test_emit_run_metrics_writes_the_configured_files(tmp_path, monkeypatch, caplog):
+    monkeypatch.setenv("MetricsFile", str(tmp_path / "run.json"))
+    monkeypatch.setenv("MetricsTextfile", str(tmp_path / "run.prom"))
+    with metrics.timer("service.do_load"):
+        pass
+
+    with caplog.at_level(logging.INFO):
+        emit_run_metrics(logging.getLogger("test"))
+
+    summary = json.loads((tmp_path / "run.json").read_text())
+    assert summary["timers"][0]["timer"] == "service.do_load"
+    assert "cc_abacus_run_duration_seconds" in (tmp_path / "run.prom").read_text()
+    assert "Run metrics: {" in caplog.text
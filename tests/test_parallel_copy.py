@@ -0,0 +1,132 @@
+import threading
+
+import pandas as pd
+import pytest
+
+from src.cc_abacus_da import ATMP_T17_TABLE, ATMP_T18_TABLE, CC_AbacusDA
+from src.connection_pool import ConnectionPool
+from src.parallel_copy import ParallelCopy, partition_by_product
+from tests.conftest import FakeConnection
+
+
+def make_pool(size=4):
+    """A pool whose connections share one statement log, and the list of
+    connections it opened."""
+    statements = []
+    connections = []
+
+    def connect():
+        connections.append(FakeConnection(statements=statements))
+        return connections[-1]
+
+    return ConnectionPool(connect, max_size=size), connections
+
+
+def make_frame(products):
+    return pd.DataFrame({"ID_PRODUCT": products, "ROW": range(len(products))})
+
+
+def test_partitions_keep_every_product_together():
+    frame = make_frame([f"P{i % 7}" for i in range(50)])
+
+    partitions = partition_by_product(frame, 3)
+
+    assert len(partitions) == 3
+    assert sum(len(partition) for partition in partitions) == 50
+    owners = {}
+    for i, partition in enumerate(partitions):
+        for product in partition["ID_PRODUCT"]:
+            assert owners.setdefault(product, i) == i
+        assert partition["ROW"].is_monotonic_increasing
+    assert partition_by_product(frame, 1)[0] is frame
+
+
+def copy_recording(copied, started=None):
+    def copy(cursor, frame, table, columns):
+        if started is not None:
+            started.wait(5)
+        copied.append((table, len(frame), threading.current_thread().name))
+
+    return copy
+
+
+def test_partitions_are_copied_concurrently_and_committed_together():
+    pool, connections = make_pool()
+    copied = []
+    # Every worker must be copying at the same time to get past this
+    started = threading.Barrier(4)
+    tasks = [
+        (make_frame(["P1", "P2"]), f"t{i}", ["ID_PRODUCT", "ROW"]) for i in range(4)
+    ]
+
+    ParallelCopy(pool, copy_recording(copied, started), workers=4).run(tasks)
+
+    assert sorted(table for table, _, _ in copied) == ["t0", "t1", "t2", "t3"]
+    assert len({thread for _, _, thread in copied}) == 4
+    # One commit per connection, on the statement log they share
+    assert connections[0].statements.count("COMMIT") == 4
+    assert pool.connects == 4
+
+
+def test_one_failed_partition_rolls_back_all_of_them():
+    pool, connections = make_pool()
+
+    def copy(cursor, frame, table, columns):
+        if table == "t1":
+            raise RuntimeError("COPY failed")
+
+    tasks = [(make_frame(["P1"]), f"t{i}", ["ID_PRODUCT", "ROW"]) for i in range(3)]
+
+    with pytest.raises(RuntimeError, match="COPY failed"):
+        ParallelCopy(pool, copy, workers=3).run(tasks)
+
+    assert "COMMIT" not in connections[0].statements
+
+
+def test_two_phase_prepares_everything_before_committing():
+    pool, connections = make_pool()
+    tasks = [(make_frame(["P1"]), f"t{i}", ["ID_PRODUCT", "ROW"]) for i in range(3)]
+
+    ParallelCopy(pool, copy_recording([]), workers=3, two_phase=True).run(tasks)
+
+    names = connections[0].executed("TPC")
+    assert names.count("TPC BEGIN") == names.count("TPC PREPARE") == 3
+    assert names.count("TPC COMMIT") == 3
+    last_prepare = max(i for i, name in enumerate(names) if name == "TPC PREPARE")
+    assert names.index("TPC COMMIT") > last_prepare
+
+
+def test_empty_partitions_are_skipped():
+    pool, _ = make_pool()
+    copied = []
+    tasks = [(make_frame([]), "t0", []), (make_frame(["P1"]), "t1", [])]
+
+    ParallelCopy(pool, copy_recording(copied), workers=4).run(tasks)
+
+    assert [table for table, _, _ in copied] == ["t1"]
+    assert pool.connects == 1
+
+
+def test_abacus_copies_t17_and_t18_partitions_in_parallel():
+    pool, _ = make_pool(size=2)
+    abacus = CC_AbacusDA.__new__(CC_AbacusDA)
+    abacus.pool = pool
+    abacus.copy_concurrency = 8
+    abacus.copy_commit = "single"
+    abacus.atmp_t17_table = ATMP_T17_TABLE
+    abacus.atmp_t18_table = ATMP_T18_TABLE
+    abacus._atmp_fingerprints = None
+    copied = []
+    abacus.copy_frame = copy_recording(copied)
+
+    t17 = make_frame([f"P{i}" for i in range(20)]).assign(PERIOD=1)
+    t18 = make_frame([f"P{i}" for i in range(0, 20, 2)])
+    abacus.insert_atmp_chunk(t17, t18)
+
+    rows = {ATMP_T17_TABLE: 0, ATMP_T18_TABLE: 0}
+    for table, count, _ in copied:
+        rows[table] += count
+    assert rows == {ATMP_T17_TABLE: 20, ATMP_T18_TABLE: 10}
+    # Capped by the pool size
+    assert pool.connects == 2
+    assert "PERIOD" not in t17.columns
@@ -0,0 +1,234 @@
+import io
+import struct
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.pg_binary_copy import HEADER, BinaryCopyStream, encode_column
+
+
+def decode_numeric(data):
+    ndigits, weight, sign, dscale = struct.unpack(">hhHh", data[:8])
+    if sign == 0xC000:
+        return Decimal("NaN")
+    digits = struct.unpack(f">{ndigits}h", data[8:])
+    value = sum(
+        Decimal(d) * Decimal(10000) ** (weight - i) for i, d in enumerate(digits)
+    ) + Decimal(0)
+    value = -value if sign == 0x4000 else value
+    return value.quantize(Decimal(1).scaleb(-dscale))
+
+
+DECODERS = {
+    "int4": lambda data: struct.unpack(">i", data)[0],
+    "int8": lambda data: struct.unpack(">q", data)[0],
+    "float8": lambda data: struct.unpack(">d", data)[0],
+    "bool": lambda data: data == b"\x01",
+    "varchar": lambda data: data.decode("utf-8"),
+    "numeric": decode_numeric,
+    "date": lambda data: date(2000, 1, 1)
+    + timedelta(days=struct.unpack(">i", data)[0]),
+    "timestamp": lambda data: datetime(2000, 1, 1)
+    + timedelta(microseconds=struct.unpack(">q", data)[0]),
+}
+
+
+def decode(payload, pg_types):
+    """Minimal binary COPY reader, enough to check what the encoder wrote."""
+    assert payload.startswith(HEADER)
+    position = len(HEADER)
+    rows = []
+    while True:
+        (fields,) = struct.unpack(">h", payload[position : position + 2])
+        position += 2
+        if fields == -1:
+            break
+        row = []
+        for pg_type in pg_types[:fields]:
+            (length,) = struct.unpack(">i", payload[position : position + 4])
+            position += 4
+            if length == -1:
+                row.append(None)
+                continue
+            row.append(DECODERS[pg_type](payload[position : position + length]))
+            position += length
+        rows.append(row)
+    assert position == len(payload)
+    return rows
+
+
+def read_all(stream, size=7):
+    chunks = []
+    while chunk := stream.read(size):
+        chunks.append(chunk)
+    return b"".join(chunks)
+
+
+def test_round_trip_of_every_supported_type():
+    frame = pd.DataFrame(
+        {
+            "ID_PRODUCT": ["P1", None, "Çelës"],
+            "PERIOD": pd.array([20241001, None, 20240901], dtype="Int64"),
+            "CARD_BALANCE": [-250.5, np.nan, 0.1],
+            "AMOUNT": [Decimal("12345.678"), None, 0.5],
+            "IS_ACTIVE": [True, False, True],
+            "WORKING_DAY": pd.to_datetime(["2024-10-15", None, "1999-12-31"]),
+            "UPDATED_AT": pd.to_datetime(
+                ["2024-10-15 13:45:01.250", "2000-01-01 00:00:00.000", None]
+            ),
+            "NUMBER_OF_PAYMENTS_PAST_DUE": [2, 0, 5],
+        }
+    )
+    pg_types = [
+        "varchar",
+        "int4",
+        "float8",
+        "numeric",
+        "bool",
+        "date",
+        "timestamp",
+        "int8",
+    ]
+
+    rows = decode(read_all(BinaryCopyStream(frame, pg_types, block_rows=2)), pg_types)
+
+    assert rows == [
+        [
+            "P1",
+            20241001,
+            -250.5,
+            Decimal("12345.678"),
+            True,
+            date(2024, 10, 15),
+            datetime(2024, 10, 15, 13, 45, 1, 250000),
+            2,
+        ],
+        [None, None, None, None, False, None, datetime(2000, 1, 1), 0],
+        ["Çelës", 20240901, 0.1, Decimal("0.5"), True, date(1999, 12, 31), None, 5],
+    ]
+
+
+@pytest.mark.parametrize(
+    "value",
+    ["0", "-0.00", "1", "-1", "10000", "0.0001", "123456789.987654321", "-0.5", "1E+5"],
+)
+def test_numeric_encoding(value):
+    column = encode_column(pd.Series([Decimal(value)]), "numeric")
+
+    assert decode_numeric(column.data.tobytes()) == Decimal(value)
+
+
+def test_empty_frame_is_header_and_trailer():
+    stream = BinaryCopyStream(
+        pd.DataFrame({"A": pd.Series([], dtype="int64")}), ["int8"]
+    )
+
+    assert read_all(stream) == HEADER + b"\xff\xff"
+
+
+def test_unsupported_type_is_rejected():
+    with pytest.raises(ValueError, match="jsonb"):
+        encode_column(pd.Series(["{}"]), "jsonb")
+
+
+def postgres_text_input(text, pg_type):
+    """How Postgres reads one field of the CSV path (None if it rejects it)."""
+    text = text.strip()
+    if pg_type == "bool":
+        lowered = text.lower()
+        if lowered in ("t", "true", "y", "yes", "on", "1"):
+            return True
+        if lowered in ("f", "false", "n", "no", "off", "0"):
+            return False
+        return None
+    try:
+        value = int(text)
+    except ValueError:
+        return None
+    bits = {"int2": 16, "int4": 32, "int8": 64}[pg_type]
+    return value if -(2 ** (bits - 1)) <= value < 2 ** (bits - 1) else None
+
+
+def csv_fields(values):
+    # The text copy_csv sends for a column of values
+    output = io.StringIO()
+    pd.DataFrame({"A": values}).to_csv(output, sep="\t", header=False, index=False)
+    return output.getvalue().splitlines()
+
+
+@pytest.mark.parametrize(
+    "values, pg_type",
+    [
+        (["1", "0", "true", "f", " yes ", "OFF"], "bool"),
+        ([True, False], "bool"),
+        ([1, 0], "bool"),
+        ([1, -7, 2147483647], "int4"),
+        (["12", "-3"], "int4"),
+        ([20241001, 5], "int8"),
+    ],
+)
+def test_binary_loads_what_csv_loads(values, pg_type):
+    expected = [postgres_text_input(text, pg_type) for text in csv_fields(values)]
+    stream = BinaryCopyStream(pd.DataFrame({"A": values}), [pg_type])
+
+    assert [row[0] for row in decode(read_all(stream), [pg_type])] == expected
+
+
+@pytest.mark.parametrize(
+    "values, pg_type",
+    [
+        (["2"], "bool"),
+        (["maybe"], "bool"),
+        ([1.7], "int4"),
+        (["1.7"], "int8"),
+        ([2**31], "int4"),
+    ],
+)
+def test_binary_rejects_what_csv_rejects(values, pg_type):
+    assert postgres_text_input(csv_fields(values)[0], pg_type) is None
+    with pytest.raises(ValueError):
+        encode_column(pd.Series(values), pg_type)
+
+
+def test_whole_floats_load_as_integers():
+    column = encode_column(pd.Series([3.0, np.nan, -1.0]), "int4")
+
+    assert column.lengths.tolist() == [4, -1, 4]
+    assert np.frombuffer(column.data.tobytes(), ">i4").tolist() == [3, -1]
+
+
+@pytest.mark.parametrize(
+    "values",
+    [
+        [250.5, -0.0, 0.1, 0.1 + 0.2, 1.005, 537034.0, 1e-05, 99999999.99, np.nan],
+        [1e16, 1e20, 2.0**53, 123456789.12345679, -1234.5678],
+        [247.27999999999997, -(0.1 + 0.2), 2.0**60 + 0.5, 1e-17, 1214.18 - 966.9],
+        [7, -20241001, 0, 10**17],
+    ],
+)
+def test_numeric_columns_load_what_csv_loads(values):
+    stream = BinaryCopyStream(pd.DataFrame({"A": values}), ["numeric"])
+
+    # Same value and same scale as Postgres reads from the CSV text, where
+    # a lone NULL field is written as ""
+    expected = [
+        None if text in ("", '""') else scaled(Decimal(text))
+        for text in csv_fields(values)
+    ]
+    rows = decode(read_all(stream), ["numeric"])
+    assert [None if row[0] is None else scaled(row[0]) for row in rows] == expected
+
+
+def scaled(value):
+    # A numeric's value and its display scale
+    return value, max(0, -value.as_tuple().exponent)
+
+
+def test_text_columns_are_encoded_as_utf8():
+    column = encode_column(pd.Series(["P1", "Çelës", "", None, "x😀z"]), "varchar")
+
+    assert column.lengths.tolist() == [2, 7, 0, -1, 6]
+    assert column.data.tobytes() == "P1Çelësx😀z".encode("utf-8")
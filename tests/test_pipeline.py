@@ -0,0 +1,88 @@
+import threading
+import time
+
+import pytest
+
+from src.pipeline import Pipeline
+
+
+def test_stages_run_in_order_and_count_rows():
+    written = []
+    pipeline = Pipeline(queue_size=1)
+    pipeline.source("extract", ([i] * 3 for i in range(4)))
+    pipeline.stage("transform", lambda chunk: [value * 10 for value in chunk])
+    pipeline.stage("copy", written.append)
+
+    stats = pipeline.run()
+
+    assert written == [[0] * 3, [10] * 3, [20] * 3, [30] * 3]
+    assert [(s.name, s.items, s.rows) for s in stats] == [
+        ("extract", 4, 12),
+        ("transform", 4, 12),
+        ("copy", 4, 12),
+    ]
+
+
+def test_stages_overlap():
+    running = set()
+    overlapped = threading.Event()
+    lock = threading.Lock()
+
+    def work(name):
+        def stage(chunk):
+            with lock:
+                running.add(name)
+                if len(running) > 1:
+                    overlapped.set()
+            time.sleep(0.02)
+            with lock:
+                running.discard(name)
+            return chunk
+
+        return stage
+
+    def chunks():
+        for i in range(5):
+            work("extract")(None)
+            yield [i]
+
+    pipeline = Pipeline(queue_size=1)
+    pipeline.source("extract", chunks())
+    pipeline.stage("transform", work("transform"))
+    pipeline.stage("copy", work("copy"))
+    pipeline.run()
+
+    assert overlapped.is_set()
+
+
+def test_bottleneck_is_the_busiest_stage():
+    pipeline = Pipeline(queue_size=2)
+    pipeline.source("extract", ([i] for i in range(3)))
+    pipeline.stage("transform", lambda chunk: time.sleep(0.03) or chunk)
+    pipeline.stage("copy", lambda chunk: None)
+
+    pipeline.run()
+
+    assert pipeline.bottleneck().name == "transform"
+
+
+def test_error_in_a_stage_stops_the_pipeline():
+    extracted = []
+
+    def chunks():
+        for i in range(1000):
+            extracted.append(i)
+            yield [i]
+
+    def copy(chunk):
+        if chunk == [2]:
+            raise RuntimeError("COPY failed")
+
+    pipeline = Pipeline(queue_size=1)
+    pipeline.source("extract", chunks())
+    pipeline.stage("transform", lambda chunk: chunk)
+    pipeline.stage("copy", copy)
+
+    with pytest.raises(RuntimeError, match="COPY failed"):
+        pipeline.run()
+    assert len(extracted) < 10
@@ -0,0 +1,173 @@
+import threading
+from datetime import datetime
+
+import pytest
+
+import src.log
+from src.abacus_cc_loader_from_centaur import AbacusCCLoaderFromCentaur
+from src.connection_pool import ConnectionPool
+from src.log import Log
+from src.run_log import RunLog
+from tests.test_abacus_cc_loader import FakeAbacus, FakeCentaur, make_chunk
+from tests.conftest import FakeConnection
+
+DAY = datetime(2024, 10, 15)
+
+
+@pytest.fixture
+def inserts(monkeypatch):
+    calls = []
+
+    def execute_values(cursor, sql, argslist, template=None, page_size=100):
+        calls.append((sql, list(argslist), template, page_size))
+        cursor.rowcount = len(argslist)
+
+    monkeypatch.setattr(src.log, "execute_values", execute_values)
+    return calls
+
+
+def make_pool(conns):
+    def connect():
+        conn = FakeConnection()
+        conns.append(conn)
+        return conn
+
+    return ConnectionPool(connect, max_size=1)
+
+
+def test_stages_add_up_across_chunks_and_threads():
+    run_log = RunLog("s", DAY)
+
+    def copy():
+        for _ in range(50):
+            with run_log.stage("copy_t17", 10):
+                pass
+
+    threads = [threading.Thread(target=copy) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    with run_log.stage("extract") as extract:
+        extract.rows = 7
+
+    (copied,) = [stats for stats in run_log.stats if stats.name == "copy_t17"]
+    assert copied.items == 200 and copied.rows == 2000
+    logs = {log.MODULE: log for log in run_log.logs()}
+    assert set(logs) == {"CC_COPY_T17", "CC_EXTRACT"}
+    assert logs["CC_EXTRACT"].NO_RECORDS == 7
+    assert logs["CC_COPY_T17"].STATUS == "1"
+    assert logs["CC_COPY_T17"].LOAD_DATE == DAY
+    assert logs["CC_COPY_T17"].START <= logs["CC_COPY_T17"].END
+
+
+def test_failed_stage_is_logged_with_its_error():
+    run_log = RunLog("s", DAY)
+
+    with run_log.stage("transform", 3):
+        pass
+    with pytest.raises(ValueError):
+        with run_log.stage("transform", 4):
+            raise ValueError("bad chunk")
+
+    (log,) = run_log.logs()
+    assert (log.STATUS, log.ERROR, log.NO_RECORDS) == ("0", "bad chunk", 7)
+
+
+def test_flush_writes_every_stage_in_one_insert_on_its_own_connection(inserts):
+    conns = []
+    run_log = RunLog("s", DAY, pool=make_pool(conns))
+    for stage in ("extract", "transform", "copy_t17", "copy_t18"):
+        with run_log.stage(stage, 1):
+            pass
+
+    assert run_log.flush() == 4
+
+    ((sql, rows, template, page_size),) = inserts
+    assert "INSERT INTO s.l01_logabacus" in sql
+    assert "nextval('s.logabacus_seq')" in template
+    assert page_size == 4
+    assert [row[1] for row in rows] == [
+        "CC_EXTRACT",
+        "CC_TRANSFORM",
+        "CC_COPY_T17",
+        "CC_COPY_T18",
+    ]
+    (conn,) = conns
+    assert "COMMIT" in conn.statements
+    # Flushed entries are not written twice
+    assert run_log.flush() == 0 and len(inserts) == 1
+
+
+def test_log_autoid_comes_from_the_sequence_the_column_owns(inserts, monkeypatch):
+    conns = []
+    run_log = RunLog("s", DAY, pool=make_pool(conns))
+    with run_log.stage("extract", 1):
+        pass
+    monkeypatch.setattr(
+        FakeConnection,
+        "respond",
+        lambda self, query, params: (
+            [("s.l01_logabacus_autoid_seq",)]
+            if "pg_get_serial_sequence" in query
+            else []
+        ),
+    )
+
+    run_log.flush()
+
+    ((_, _, template, _),) = inserts
+    assert "nextval('s.l01_logabacus_autoid_seq')" in template
+    (conn,) = conns
+    assert conn.params[0] == ("s.l01_logabacus",)
+
+
+def test_log_sequence_setting_is_read_when_the_log_is_written(inserts, monkeypatch):
+    run_log = RunLog("s", DAY, pool=make_pool([]))
+    with run_log.stage("extract", 1):
+        pass
+    monkeypatch.setenv("LogSequence", "l01_seq")
+
+    run_log.flush()
+
+    ((_, _, template, _),) = inserts
+    assert "nextval('s.l01_seq')" in template
+
+
+def test_flush_falls_back_to_the_file(tmp_path, monkeypatch):
+    def fail(con, schema_used, logs):
+        raise Exception("Failed to write logs: server closed the connection")
+
+    monkeypatch.setattr(Log, "write_many", fail)
+    file_name = tmp_path / "run.log"
+    run_log = RunLog("s", DAY, pool=make_pool([]), file_name=file_name)
+    for stage in ("extract", "transform"):
+        with run_log.stage(stage, 1):
+            pass
+
+    assert run_log.flush() == 0
+
+    text = file_name.read_text()
+    assert text.count("Log:") == 2
+    assert "Module: CC_EXTRACT" in text and "Module: CC_TRANSFORM" in text
+
+
+def test_disabled_run_log_records_nothing():
+    run_log = RunLog.disabled()
+    with run_log.stage("extract", 1):
+        pass
+
+    assert run_log.logs() == [] and run_log.flush() == 0
+
+
+def test_chunked_load_times_every_read_as_extract():
+    centaur = FakeCentaur([make_chunk(["P1", "P2"]), make_chunk(["P3"])])
+    abacus = FakeAbacus()
+    abacus.run_log = RunLog("s", DAY)
+
+    AbacusCCLoaderFromCentaur.clean_and_load_cc(centaur, abacus, True)
+
+    (extract,) = abacus.run_log.stats
+    assert extract.name == "extract"
+    # Two chunks and the read that found there were no more
+    assert (extract.items, extract.rows) == (3, 3)
@@ -0,0 +1,99 @@
+from datetime import date, datetime
+
+import pytest
+
+from src.abacus_cc_loader_from_centaur import AbacusCCLoaderFromCentaur
+from src.cc_abacus_da import CC_AbacusDA
+from src.run_state import RunState, clear_run_state
+
+
+@pytest.fixture
+def probe(abacus_connection):
+    abacus_connection.results["W01_WORKING_DAY"] = [
+        ("2024-10-14", "2024-10-15", date(2024, 10, 14), "1", date(2024, 10, 11), "1")
+    ]
+    return abacus_connection
+
+
+def test_gating_checks_share_one_query(probe):
+    assert AbacusCCLoaderFromCentaur.is_load_fin() is True
+    AbacusCCLoaderFromCentaur.is_ok_to_call_deliquency()
+    abacus = CC_AbacusDA()
+    abacus.WorkingDay = datetime(2024, 10, 14)
+
+    assert abacus.is_finished_cc() is False
+    assert abacus.NotCCNextWorkingDay == datetime(2024, 10, 15)
+    assert executed(probe) == 1
+
+    clear_run_state()
+    CC_AbacusDA()
+    assert executed(probe) == 2
+    # Planned once per connection
+    assert len(probe.executed("PREPARE")) == 1
+
+
+def test_calls_outside_a_service_run_probe_again(probe, monkeypatch):
+    class Centaur:
+        centaur_working_day = datetime(2024, 10, 14)
+
+    monkeypatch.setattr(
+        "src.abacus_cc_loader_from_centaur.CCCentaurDA", lambda: Centaur()
+    )
+    probe.results["W01_WORKING_DAY"] = [
+        ("2024-10-14", "2024-10-15", None, None, None, None)
+    ]
+    assert AbacusCCLoaderFromCentaur.load(False) == "WAITING_FOR_FIN"
+
+    # FIN finishes between two manual loads
+    probe.results["W01_WORKING_DAY"] = [
+        ("2024-10-14", "2024-10-15", date(2024, 10, 14), "1", None, None)
+    ]
+    monkeypatch.setattr(
+        AbacusCCLoaderFromCentaur, "clean_and_load_cc", lambda *args: "SUCCESS"
+    )
+    assert AbacusCCLoaderFromCentaur.load(False) == "SUCCESS"
+    assert executed(probe) == 2
+
+
+def test_a_service_load_reuses_the_state_probed_for_its_run(probe, monkeypatch):
+    class Centaur:
+        centaur_working_day = datetime(2024, 10, 14)
+
+    monkeypatch.setattr(
+        "src.abacus_cc_loader_from_centaur.CCCentaurDA", lambda: Centaur()
+    )
+    monkeypatch.setattr(
+        AbacusCCLoaderFromCentaur, "clean_and_load_cc", lambda *args: "SUCCESS"
+    )
+    # The gating checks of the run, then a load without a prepared side
+    assert AbacusCCLoaderFromCentaur.is_load_fin() is True
+
+    assert AbacusCCLoaderFromCentaur.load(True) == "SUCCESS"
+    assert executed(probe) == 1
+
+
+def executed(conn):
+    return len(conn.executed("EXECUTE"))
+
+
+def test_fin_needs_a_successful_log_for_the_working_day():
+    state = RunState("2024-10-14", None)
+    state.working_day = datetime(2024, 10, 14)
+
+    assert not state.is_load_fin()
+    for load_date, status, fin in (
+        ("2024-10-14", "1", True),
+        ("2024-10-14 00:00:00", "1", True),
+        (datetime(2024, 10, 14), "0", False),
+        (date(2024, 10, 11), "1", False),
+    ):
+        state = RunState(datetime(2024, 10, 14), None, load_date, status)
+        assert state.is_load_fin() is fin
+
+
+def test_cc_is_finished_by_any_status_for_that_day():
+    state = RunState(None, None, cc_load_date=date(2024, 10, 14), cc_status="0")
+
+    assert state.is_finished_cc(datetime(2024, 10, 14))
+    assert not state.is_finished_cc(datetime(2024, 10, 15))
+    assert not RunState(None, None).is_finished_cc(datetime(2024, 10, 14))
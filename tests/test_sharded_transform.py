@@ -0,0 +1,166 @@
+from datetime import date
+from decimal import Decimal
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.cc_abacus_transform import ATMP_T18_COLUMNS, build_atmp_t17_t18
+from src.shared_frame import SharedFrame, read_shared_frame, unlink_shared_frame
+from src import sharded_transform
+from src.sharded_transform import (
+    build_atmp_t17_t18_sharded,
+    shutdown_transform_executors,
+)
+from tests.test_cc_abacus_transform import (
+    WORKING_DAY,
+    make_abacus,
+    make_atmp_t17,
+    make_t18_previous,
+)
+
+
+@pytest.fixture(scope="module", autouse=True)
+def executors():
+    yield
+    shutdown_transform_executors()
+
+
+def make_book(products=300, seed=7):
+    rng = np.random.default_rng(seed)
+    ids = [f"P{i:05d}" for i in rng.permutation(products)]
+    atmp_t17 = pd.DataFrame(
+        {
+            "ID_PRODUCT": ids,
+            "LAST_STATEMENT_BALANCE": rng.uniform(0, 1000, products).round(2),
+            "SUM_OF_PAYMENTS": rng.uniform(0, 100, products).round(2),
+            "LAST_BALANCE_SIGN": rng.choice(["0", "1"], products),
+            "DAYS_PAST_DUE": pd.array(
+                rng.choice([0, 0, 5, 30, 90], products), dtype="Int32"
+            ),
+            "PERIOD": pd.array([20241001] * products, dtype="Int32"),
+        }
+    )
+    atmp_t17["NUMBER_OF_PAYMENTS_PAST_DUE"] = 0
+    atmp_t17["DATE_SINCE_PAST_DUE"] = pd.NaT
+    atmp_t17["CARD_BALANCE"] = 0.0
+    atmp_t17["DPD_HO"] = 0
+    atmp_t17["IS_JOINT"] = 0
+    # Most products have history, some have none
+    t18_previous = make_t18_previous(products=ids[: products * 3 // 4])
+    return atmp_t17, t18_previous
+
+
+def assert_block_freed(spec):
+    with pytest.raises(FileNotFoundError):
+        shared_memory.SharedMemory(name=spec["name"])
+
+
+def test_shared_frame_round_trip_keeps_values_and_dtypes():
+    frame = pd.DataFrame(
+        {
+            "FLOAT": [1.5, np.nan, -2.0],
+            "INT": np.array([1, 2, 3], dtype="int64"),
+            "DAY": pd.to_datetime(["2024-10-15", None, "2024-10-01"]),
+            "NULLABLE": pd.array([1, None, 3], dtype="Int32"),
+            "CATEGORY": pd.Categorical(["ALL", "EUR", "ALL"]),
+            "TEXT": ["P1", None, "Ç-ë"],
+            "TEXT_NAN": ["P1", np.nan, ""],
+            "MIXED": ["n/a", 1.0, None],
+            "DECIMAL": [Decimal("12.50"), None, Decimal("0")],
+            "DATE": [date(2024, 10, 15), None, date(2024, 1, 1)],
+            "FLAG": [True, False, True],
+        }
+    )
+    shared = SharedFrame(frame)
+
+    read = read_shared_frame(shared.spec, unlink=True)
+
+    pd.testing.assert_frame_equal(read, frame, check_exact=True)
+    assert read["TEXT"].tolist()[1] is None
+    assert np.isnan(read["TEXT_NAN"].tolist()[1])
+    assert_block_freed(shared.spec)
+
+
+def test_shared_frame_of_an_empty_frame():
+    frame = make_t18_previous(products=()).reset_index(drop=True)
+    shared = SharedFrame(frame)
+
+    read = read_shared_frame(shared.spec, unlink=True)
+
+    assert read.columns.tolist() == frame.columns.tolist() and read.empty
+
+
+def test_sharded_transform_matches_the_single_process_one():
+    single, t18_previous = make_book()
+    sharded = single.copy()
+
+    t18_single = build_atmp_t17_t18(single, t18_previous, WORKING_DAY)
+    t18_sharded = build_atmp_t17_t18_sharded(sharded, t18_previous, WORKING_DAY, 3)
+
+    pd.testing.assert_frame_equal(sharded, single, check_exact=True)
+    pd.testing.assert_frame_equal(t18_sharded, t18_single, check_exact=True)
+    assert len(t18_sharded) > 0
+
+
+def test_sharded_transform_of_cards_without_history():
+    single = make_atmp_t17()
+    sharded = make_atmp_t17()
+    t18_previous = make_t18_previous(products=())
+
+    t18_single = build_atmp_t17_t18(single, t18_previous, WORKING_DAY)
+    t18_sharded = build_atmp_t17_t18_sharded(sharded, t18_previous, WORKING_DAY, 2)
+
+    pd.testing.assert_frame_equal(sharded, single, check_exact=True)
+    assert t18_sharded.empty and t18_single.empty
+    assert t18_sharded.columns.tolist() == ATMP_T18_COLUMNS
+
+
+def test_abacus_sharded_engine():
+    t18_previous = make_t18_previous()
+    abacus = make_abacus(t18_previous, "sharded")
+    abacus.transform_workers = 2
+    atmp_t17 = make_atmp_t17()
+
+    atmp_t18 = abacus.build_atmp_t18_data_table(atmp_t17)
+
+    assert atmp_t17["NUMBER_OF_PAYMENTS_PAST_DUE"].tolist() == [0, 2, 0, 0, 2]
+    assert atmp_t18["ID_PRODUCT"].tolist() == ["P2"] * 3 + ["P5"] * 3
+
+
+def test_failed_read_frees_the_results_of_every_shard(monkeypatch):
+    atmp_t17, t18_previous = make_book()
+    freed = []
+
+    def fail(spec, unlink=False):
+        # The first shard's T17 rows can't be read, nor its T18 rows then
+        raise MemoryError("out of memory")
+
+    def unlink(spec):
+        freed.append(spec)
+        unlink_shared_frame(spec)
+
+    monkeypatch.setattr(sharded_transform, "read_shared_frame", fail)
+    monkeypatch.setattr(sharded_transform, "unlink_shared_frame", unlink)
+
+    with pytest.raises(MemoryError):
+        build_atmp_t17_t18_sharded(atmp_t17, t18_previous, WORKING_DAY, 3)
+
+    # Both result blocks of the failed shard and of the two others
+    assert len({spec["name"] for spec in freed}) == 6
+    for spec in freed:
+        assert_block_freed(spec)
+
+
+def test_sharded_transform_falls_back_when_shared_memory_is_short(monkeypatch):
+    single, t18_previous = make_book()
+    sharded = single.copy()
+    monkeypatch.setattr(sharded_transform, "shared_memory_free", lambda: 64 * 1024)
+    monkeypatch.setattr(sharded_transform, "transform_executor", None)
+
+    t18_single = build_atmp_t17_t18(single, t18_previous, WORKING_DAY)
+    t18_sharded = build_atmp_t17_t18_sharded(sharded, t18_previous, WORKING_DAY, 3)
+
+    pd.testing.assert_frame_equal(sharded, single, check_exact=True)
+    pd.testing.assert_frame_equal(t18_sharded, t18_single, check_exact=True)
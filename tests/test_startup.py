@@ -0,0 +1,76 @@
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Only needed once a load actually runs. zeep and requests are not listed:
+# every tick makes the TransferPaylinkFile SOAP call, so they are imported
+# on idle ticks too (once per process in daemon mode)
+HEAVY_MODULES = [
+    "numpy",
+    "pandas",
+    "pymssql",
+    "src.abacus_cc_loader_from_centaur",
+    "src.cc_abacus_da",
+    "src.cc_centaur_da",
+    "src.cc_abacus_transform",
+    "src.sharded_transform",
+    "src.pg_binary_copy",
+]
+
+IDLE_TICK = """
+import contextlib
+import sys
+import main
+from src import credit_card_abacus_service, load_gate
+from src.credit_card_abacus_service import CreditCardAbacusService
+from src.run_state import RunState
+
+
+class Client:
+    # Stands in for the zeep client of the Centaur service
+    class transport:
+        settings = staticmethod(lambda timeout: contextlib.nullcontext())
+
+    class service:
+        TransferPaylinkFile = staticmethod(lambda: True)
+
+
+credit_card_abacus_service.centaur_client = lambda wsdl: Client
+# Abacus hasn't finished FIN yet
+load_gate.abacus_run_state = lambda: RunState(None, None)
+assert CreditCardAbacusService().run()
+print(" ".join(sorted(name for name in HEAVY_MODULES if name in sys.modules)))
+"""
+
+
+def run_python(code, *options, cwd=ROOT):
+    return subprocess.run(
+        [sys.executable, *options, "-c", code],
+        cwd=cwd,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+
+def test_idle_tick_does_not_import_the_load(tmp_path):
+    # The service logs to a file in the working directory
+    code = (
+        f"import sys; sys.path.insert(0, {ROOT!r}); HEAVY_MODULES = {HEAVY_MODULES!r}"
+    )
+    result = run_python(code + IDLE_TICK, cwd=tmp_path)
+
+    assert result.stdout.split() == []
+
+
+def test_main_imports_neither_the_load_nor_the_soap_client():
+    # How long the import takes is measured by benchmarks/startup.py
+    not_at_import = HEAVY_MODULES + ["zeep", "requests"]
+    code = (
+        "import sys, main; "
+        f"print(' '.join(sorted(set({not_at_import!r}) & set(sys.modules))))"
+    )
+
+    assert run_python(code).stdout.split() == []
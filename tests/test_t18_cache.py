@@ -0,0 +1,143 @@
+import os
+from decimal import Decimal
+
+import numpy as np
+import pandas as pd
+
+from src.cc_abacus_transform import T18PreviousIndex, build_atmp_t17_t18
+from src.t18_cache import T18SnapshotCache
+from tests.test_cc_abacus_transform import (
+    WORKING_DAY,
+    make_abacus,
+    make_atmp_t17,
+    make_t18_previous,
+)
+
+
+def make_snapshot():
+    # As psycopg2 returns it: numeric as Decimal, date as datetime.date
+    snapshot = make_t18_previous().reset_index(drop=True)
+    snapshot["MINIMUM_PAYMENT"] = [Decimal("16.50")] * (len(snapshot) - 1) + [None]
+    snapshot["DUE_DATE_DLQ"] = [day.date() for day in snapshot["DUE_DATE_DLQ"]]
+    return snapshot
+
+
+def make_cached_abacus(directory):
+    abacus = make_abacus(make_t18_previous(), "vectorized")
+    # Use the real method, not make_abacus' stand-in
+    del abacus.get_t18_previous_values
+    abacus.t18_cache = T18SnapshotCache(directory, "s")
+    return abacus
+
+
+def is_memory_mapped(array):
+    while array is not None:
+        if isinstance(array, np.memmap):
+            return True
+        array = array.base
+    return False
+
+
+def test_round_trip_is_memory_mapped(tmp_path):
+    cache = T18SnapshotCache(tmp_path, "s")
+    snapshot = make_snapshot()
+
+    stored = cache.store("2024-10-14", (6, 120), snapshot)
+    cached = cache.load("2024-10-14", (6, 120))
+
+    pd.testing.assert_frame_equal(cached, stored, check_exact=True)
+    assert cached["ID_PRODUCT"].tolist() == ["P2"] * 3 + ["P5"] * 3
+    assert cached["MINIMUM_PAYMENT"].dtype == "float64"
+    assert cached["MINIMUM_PAYMENT"].isna().tolist() == [False] * 5 + [True]
+    assert cached["DUE_DATE_DLQ"].dtype == "datetime64[ns]"
+    for name in ("PRINCIPAL_PAYMENT_AMOUNT", "MINIMUM_PAYMENT", "DUE_DATE_DLQ"):
+        assert is_memory_mapped(cached[name].to_numpy())
+    # Already sorted, so the index keeps the mapped columns
+    index = T18PreviousIndex(cached)
+    assert is_memory_mapped(index.frame["MINIMUM_PAYMENT"].to_numpy())
+    # The transform gives the same values as on the snapshot as read
+    single = make_atmp_t17()
+    from_cache = make_atmp_t17()
+    expected = build_atmp_t17_t18(single, snapshot, WORKING_DAY)
+    expected["MINIMUM_PAYMENT"] = expected["MINIMUM_PAYMENT"].astype("float64")
+    expected["DUE_DATE_DLQ"] = pd.to_datetime(expected["DUE_DATE_DLQ"])
+    pd.testing.assert_frame_equal(
+        build_atmp_t17_t18(from_cache, cached, WORKING_DAY),
+        expected,
+        check_exact=True,
+    )
+    pd.testing.assert_frame_equal(from_cache, single, check_exact=True)
+
+
+def test_stale_temp_directories_are_removed(tmp_path):
+    cache = T18SnapshotCache(tmp_path, "s")
+    crashed = tmp_path / ".tmp-s-crashed"
+    crashed.mkdir()
+    os.utime(crashed, (0, 0))
+    writing = tmp_path / ".tmp-s-writing"
+    writing.mkdir()
+    other_schema = tmp_path / ".tmp-test-crashed"
+    other_schema.mkdir()
+    os.utime(other_schema, (0, 0))
+
+    cache.store("2024-10-14", (6, 120), make_snapshot())
+
+    assert sorted(path.name for path in tmp_path.iterdir()) == [
+        ".tmp-s-writing",
+        ".tmp-test-crashed",
+        "s-2024-10-14",
+    ]
+
+
+def test_changed_probe_misses(tmp_path):
+    cache = T18SnapshotCache(tmp_path, "s")
+    cache.store("2024-10-14", (6, 120), make_snapshot())
+
+    assert cache.load("2024-10-14", (7, 121)) is None
+    assert cache.load("2024-10-11", (6, 120)) is None
+
+
+def test_new_working_day_evicts_the_old_one(tmp_path):
+    cache = T18SnapshotCache(tmp_path, "s")
+    other_schema = T18SnapshotCache(tmp_path, "test")
+    cache.store("2024-10-11", (6, 120), make_snapshot())
+    other_schema.store("2024-10-11", (6, 120), make_snapshot())
+
+    cache.store("2024-10-14", (6, 126), make_snapshot())
+
+    assert sorted(path.name for path in tmp_path.iterdir()) == [
+        "s-2024-10-14",
+        "test-2024-10-11",
+    ]
+
+
+def test_retries_of_a_working_day_skip_the_snapshot_read(tmp_path):
+    reads = []
+
+    def attempt(probe):
+        abacus = make_cached_abacus(tmp_path)
+        abacus.probe_t18_previous = lambda: probe
+        abacus.read_t18_previous_values = lambda: reads.append(1) or make_snapshot()
+        return abacus.get_t18_previous_values()
+
+    first = attempt(("2024-10-14", 6, 120))
+    retry = attempt(("2024-10-14", 6, 120))
+    assert len(reads) == 1
+    pd.testing.assert_frame_equal(retry, first, check_exact=True)
+
+    # Rows were added to the slice since, so it is read again
+    attempt(("2024-10-14", 7, 127))
+    assert len(reads) == 2
+
+
+def test_failed_probe_reads_from_the_database(tmp_path):
+    abacus = make_cached_abacus(tmp_path)
+
+    def probe():
+        raise Exception("column t.autoid does not exist")
+
+    abacus.probe_t18_previous = probe
+    abacus.read_t18_previous_values = make_snapshot
+
+    assert len(abacus.get_t18_previous_values()) == 6
+    assert list(tmp_path.iterdir()) == []